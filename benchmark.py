@@ -0,0 +1,444 @@
+# benchmark.py - Offline performance benchmarks for the vision and decision code
+
+import contextlib
+import io
+import itertools
+import math
+import sys
+import time
+
+import cv2
+import numpy as np
+from config import GAME_REGION, SAFE_DISTANCE_FROM_ENEMIES, COLLECTION_DISTANCE
+from spatial_index import non_max_suppression, dedupe_points
+from detections import Detections
+from test_helpers import synthetic_frame
+
+
+def _time_call(func, *args, repeats=5):
+    """Best-of-N wall time of func(*args) in milliseconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _random_enemy_boxes(count, rng, width=GAME_REGION['width'], height=GAME_REGION['height']):
+    """Enemy-sized x1, y1, x2, y2 boxes, a third of them jittered copies to give NMS work"""
+    base = max(1, count * 2 // 3)
+    x = rng.integers(0, width - 40, base)
+    y = rng.integers(0, height - 40, base)
+    size = rng.integers(12, 32, base)
+    boxes = np.column_stack((x, y, x + size, y + size))
+    duplicates = boxes[rng.integers(0, base, count - base)] + rng.integers(-4, 5, (count - base, 1))
+    return np.vstack((boxes, duplicates))
+
+
+def _reference_nms(boxes, overlapThresh):
+    """The original O(n^2) ScreenAnalyzer._non_max_suppression, kept for comparison"""
+    if len(boxes) == 0:
+        return []
+    boxes = boxes.astype("float")
+    pick = []
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    area = (x2 - x1 + 1) * (y2 - y1 + 1)
+    idxs = np.argsort(y2, kind='stable')
+    while len(idxs) > 0:
+        last = len(idxs) - 1
+        i = idxs[last]
+        pick.append(i)
+        xx1 = np.maximum(x1[i], x1[idxs[:last]])
+        yy1 = np.maximum(y1[i], y1[idxs[:last]])
+        xx2 = np.minimum(x2[i], x2[idxs[:last]])
+        yy2 = np.minimum(y2[i], y2[idxs[:last]])
+        w = np.maximum(0, xx2 - xx1 + 1)
+        h = np.maximum(0, yy2 - yy1 + 1)
+        overlap = (w * h) / area[idxs[:last]]
+        idxs = np.delete(idxs, np.concatenate(([last], np.where(overlap > overlapThresh)[0])))
+    return boxes[pick].astype("int")
+
+
+def _reference_dedupe(enemies):
+    """The original nested-loop duplicate filter from ScreenAnalyzer._detect_enemies"""
+    final_enemies = []
+    for enemy1 in enemies:
+        is_duplicate = False
+        for enemy2 in final_enemies:
+            if np.linalg.norm(np.array(enemy1[:2]) - np.array(enemy2[:2])) < 20:
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            final_enemies.append(enemy1)
+    return final_enemies
+
+
+def benchmark_enemy_dedupe(counts=(10, 50, 100, 250, 500, 1000, 2000)):
+    """Scaling of enemy NMS + dedupe: original O(n^2) loops vs the grid index"""
+    print("🧪 ENEMY NMS + DEDUPE SCALING")
+    print(f"{'enemies':>8} | {'nms old':>9} | {'nms grid':>9} | {'dedupe old':>10} | {'dedupe grid':>11} | same")
+    rng = np.random.default_rng(0)
+    for count in counts:
+        boxes = _random_enemy_boxes(count, rng)
+        nms_old = _time_call(_reference_nms, boxes, 0.3)
+        nms_new = _time_call(non_max_suppression, boxes, 0.3)
+
+        picked = non_max_suppression(boxes, 0.3)
+        enemies = [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in picked.tolist()]
+        dedupe_old = _time_call(_reference_dedupe, enemies, repeats=1 if count > 500 else 3)
+        dedupe_new = _time_call(dedupe_points, [e[:2] for e in enemies], 20)
+
+        same_nms = sorted(map(tuple, picked.tolist())) == sorted(map(tuple, _reference_nms(boxes, 0.3).tolist()))
+        kept = [enemies[i] for i in dedupe_points([e[:2] for e in enemies], 20)]
+        same = same_nms and kept == _reference_dedupe(enemies)
+        print(f"{count:>8} | {nms_old:>7.2f}ms | {nms_new:>7.2f}ms | {dedupe_old:>8.2f}ms | {dedupe_new:>9.2f}ms | {'✅' if same else '❌'}")
+
+
+def _reference_path_safe(start_pos, target_pos, enemies):
+    """The original sampled DecisionMakerEnhanced._is_path_safe: 6 points on the path, Python loops"""
+    for i in range(6):
+        t = i / 5
+        check_x = start_pos[0] + t * (target_pos[0] - start_pos[0])
+        check_y = start_pos[1] + t * (target_pos[1] - start_pos[1])
+        for enemy_x, enemy_y, enemy_w, enemy_h in enemies:
+            enemy_center = (enemy_x + enemy_w // 2, enemy_y + enemy_h // 2)
+            if math.hypot(enemy_center[0] - check_x, enemy_center[1] - check_y) < SAFE_DISTANCE_FROM_ENEMIES:
+                return False
+    return True
+
+
+def _reference_safe_shards(player_pos, shards, enemies):
+    """Shard centres the original code considered safe to collect"""
+    safe = []
+    for shard_x, shard_y, shard_w, shard_h in shards:
+        center = (shard_x + shard_w // 2, shard_y + shard_h // 2)
+        if math.hypot(center[0] - player_pos[0], center[1] - player_pos[1]) > COLLECTION_DISTANCE * 4:
+            continue
+        if _reference_path_safe(player_pos, center, enemies):
+            safe.append(center)
+    return safe
+
+
+def benchmark_threat_evaluation(counts=(10, 50, 100, 250, 500, 1000), shards=100):
+    """Shard path safety: original per-point loops vs exact batched distances vs the danger field"""
+    from decision_maker_enhanced import DecisionMakerEnhanced
+    print("🧪 THREAT EVALUATION SCALING")
+    print(f"{'enemies':>8} | {'loops':>9} | {'exact':>9} | {'field':>9} | {'decide':>9} | field = exact | exact ⊆ sampled")
+    rng = np.random.default_rng(0)
+    width, height = GAME_REGION['width'], GAME_REGION['height']
+    player = (width // 2 - 10, height // 2 - 10, 20, 20)
+    player_pos = (width // 2, height // 2)
+    shard_list = Detections.from_boxes(np.column_stack((
+        rng.integers(player_pos[0] - 250, player_pos[0] + 250, shards),
+        rng.integers(player_pos[1] - 250, player_pos[1] + 250, shards),
+        np.full(shards, 8), np.full(shards, 8))))
+    exact_maker = DecisionMakerEnhanced(use_danger_field=False)
+    field_maker = DecisionMakerEnhanced(use_danger_field=True)
+
+    def decide(enemies):
+        # Fresh field and stuck state every call, as on a new frame
+        field_maker._built_fields = []
+        field_maker.last_position = None
+        return field_maker.decide_movement(player, enemies, shard_list)
+
+    for count in counts:
+        # Keep the player's immediate surroundings clear so the shard search runs
+        angles = rng.uniform(0, 2 * np.pi, count)
+        radii = rng.uniform(SAFE_DISTANCE_FROM_ENEMIES, width / 2, count)
+        enemies = Detections.from_boxes(np.column_stack((
+            player_pos[0] + radii * np.cos(angles), player_pos[1] + radii * np.sin(angles),
+            np.full(count, 20), np.full(count, 20))).astype(int))
+        enemy_list, shard_tuples = enemies.tolist(), shard_list.tolist()
+
+        loops = _time_call(_reference_safe_shards, player_pos, shard_tuples, enemy_list, repeats=1 if count > 250 else 3)
+        exact = _time_call(exact_maker._paths_safe, player_pos, shard_list.centers, enemies)
+        field = _time_call(field_maker._paths_safe, player_pos, shard_list.centers, enemies)
+        with contextlib.redirect_stdout(io.StringIO()):
+            decide_time = _time_call(decide, enemies)
+
+        exact_safe = exact_maker._paths_safe(player_pos, shard_list.centers, enemies)
+        field_safe = field_maker._paths_safe(player_pos, shard_list.centers, enemies)
+        agreement = (exact_safe == field_safe).mean() * 100
+        # The exact segment test may reject paths the 6 samples missed, never the reverse
+        sampled = set(_reference_safe_shards(player_pos, shard_tuples, enemy_list))
+        in_range = {tuple(center) for center, safe in zip(shard_list.centers.tolist(), exact_safe)
+                    if safe and math.dist(center, player_pos) <= COLLECTION_DISTANCE * 4}
+        print(f"{count:>8} | {loops:>7.2f}ms | {exact:>7.2f}ms | {field:>7.2f}ms | {decide_time:>7.2f}ms | "
+              f"{agreement:>12.0f}% | {'✅' if in_range <= sampled else '❌'}")
+
+
+def benchmark_path_planner(enemy_counts=(50, 200, 500), frames=60):
+    """Per-frame flow field cost through a drifting swarm: D* Lite repairs vs searching from scratch"""
+    from danger_field import DangerField
+    from path_planner import PathPlanner
+    print("🧪 PATH PLANNER (flow field to shards, swarm drifting 2 px/frame)")
+    print(f"{'enemies':>8} | {'scratch mean':>12} | {'repair mean':>11} | {'repair max':>10} | {'restarts':>8} | same route")
+    width, height = GAME_REGION['width'], GAME_REGION['height']
+    for count in enemy_counts:
+        rng = np.random.default_rng(count)
+        enemies = rng.uniform((0, 0), (width, height), (count, 2))
+        headings = rng.uniform(-2, 2, (count, 2))
+        shards = [tuple(point) for point in rng.uniform((width / 2 - 350, height / 2 - 350),
+                                                        (width / 2 + 350, height / 2 + 350), (20, 2))]
+        field = DangerField()
+        incremental = PathPlanner(budget_ms=1000)
+        scratch_times, repair_times, same = [], [], 0
+        for frame in range(frames):
+            enemies += headings
+            player = (width / 2 + frame, height / 2)
+            # Shards are only chased when no enemy is close (otherwise the bot escapes)
+            clear = np.hypot(*(enemies - player).T) >= SAFE_DISTANCE_FROM_ENEMIES
+            field.update(enemies[clear])
+
+            start = time.perf_counter()
+            incremental.begin_frame(field)
+            waypoint = incremental.flow_waypoint(player, shards)
+            repair_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            scratch = PathPlanner(budget_ms=1000)
+            scratch.begin_frame(field)
+            reference = scratch.flow_waypoint(player, shards)
+            scratch_times.append(time.perf_counter() - start)
+            same += reference == waypoint
+        print(f"{count:>8} | {np.mean(scratch_times) * 1000:>10.2f}ms | {np.mean(repair_times[1:]) * 1000:>9.2f}ms | "
+              f"{np.max(repair_times[1:]) * 1000:>8.2f}ms | {incremental.full_replans - 1:>8} | {same}/{frames}")
+
+
+def _direction_vector(direction):
+    """Unit movement vector move_player() would produce for a decision ('circle' counted as standing still)"""
+    vectors = {'up': (0, -1), 'down': (0, 1), 'left': (-1, 0), 'right': (1, 0)}
+    if isinstance(direction, tuple):
+        vector = np.sign(np.asarray(direction, dtype=np.float64))
+        length = np.hypot(*vector)
+        return vector / length if length else vector
+    return np.asarray(vectors.get(direction, (0, 0)), dtype=np.float64)
+
+
+def _simulate_decisions(decide, rng, enemies=150, shards=40, frames=300, dt=0.1, enemy_speed=80, respawn_shards=True):
+    """Hits taken, shards collected and decision times for a player steered by decide() among chasing enemies"""
+    from config import ROLLOUT_PLAYER_SPEED, ROLLOUT_HIT_DISTANCE, ROLLOUT_PICKUP_DISTANCE
+    size = np.array([GAME_REGION['width'], GAME_REGION['height']], dtype=np.float64)
+    player = size / 2
+    enemy_positions = rng.uniform((0, 0), size, (enemies, 2))
+    enemy_positions[np.hypot(*(enemy_positions - player).T) < 2 * SAFE_DISTANCE_FROM_ENEMIES] = 0  # Spawn clear
+    shard_positions = rng.uniform((0, 0), size, (shards, 2))
+    hits = collected = 0
+    times = []
+    for _ in range(frames):
+        offsets = player - enemy_positions
+        velocities = offsets / np.maximum(np.hypot(*offsets.T), 1)[:, None] * enemy_speed
+        enemy_list = Detections.from_boxes(np.column_stack((enemy_positions - 10, np.full((enemies, 2), 20))).astype(int),
+                                           velocities=velocities)
+        shard_list = Detections.from_boxes(np.column_stack((shard_positions - 4, np.full((len(shard_positions), 2), 8)))
+                                           .astype(int))
+        start = time.perf_counter()
+        direction = decide((int(player[0]) - 10, int(player[1]) - 10, 20, 20), enemy_list, shard_list)
+        times.append(time.perf_counter() - start)
+
+        player = np.clip(player + _direction_vector(direction) * ROLLOUT_PLAYER_SPEED * dt, 0, size)
+        enemy_positions += velocities * dt
+        # Enemies that reach the player and shards it picks up respawn at a random edge / spot
+        hit = np.hypot(*(enemy_positions - player).T) < ROLLOUT_HIT_DISTANCE
+        hits += int(hit.sum())
+        edges = rng.integers(0, 2, (int(hit.sum()), 2)) * size
+        enemy_positions[hit] = np.where(rng.random((len(edges), 1)) < 0.5, edges * (1, 0) + rng.uniform(0, size) * (0, 1),
+                                        edges * (0, 1) + rng.uniform(0, size) * (1, 0))
+        picked = np.hypot(*(shard_positions - player).T) < ROLLOUT_PICKUP_DISTANCE
+        collected += int(picked.sum())
+        if respawn_shards:
+            shard_positions[picked] = rng.uniform((0, 0), size, (int(picked.sum()), 2))
+        else:
+            shard_positions = shard_positions[~picked]
+    return hits, collected, times
+
+
+def benchmark_rollout_planner(deadlines_ms=(1, 5, 15), episodes=5):
+    """Simulated play: the priority cascade vs the anytime rollout planner at several per-frame deadlines"""
+    from decision_maker_enhanced import DecisionMakerEnhanced
+    print("🧪 ROLLOUT PLANNER (150 enemies chasing at 80 px/s, 300 decisions of 0.1 s per episode)")
+    print(f"{'planner':>14} | {'hits':>5} | {'shards':>6} | {'decide mean':>11} | {'decide max':>10} | rollouts")
+    makers = [('cascade', DecisionMakerEnhanced(use_rollout_planner=False), None)]
+    for deadline in deadlines_ms:
+        maker = DecisionMakerEnhanced(use_rollout_planner=True)
+        maker.rollout_planner.budget = deadline / 1000
+        makers.append((f'rollout {deadline}ms', maker, deadline))
+    for name, maker, deadline in makers:
+        hits = collected = 0
+        times, rollouts = [], []
+
+        def decide(player, enemies, shards):
+            direction = maker.decide_movement(player, enemies, shards)
+            if maker.rollout_planner is not None:
+                rollouts.append(maker.rollout_planner.rollouts)
+            return direction
+
+        for episode in range(episodes):
+            with contextlib.redirect_stdout(io.StringIO()):
+                episode_hits, episode_shards, episode_times = _simulate_decisions(decide, np.random.default_rng(episode))
+            hits, collected = hits + episode_hits, collected + episode_shards
+            times += episode_times
+        print(f"{name:>14} | {hits:>5} | {collected:>6} | {np.mean(times) * 1000:>9.2f}ms | "
+              f"{np.max(times[1:]) * 1000:>8.2f}ms | {np.mean(rollouts) if rollouts else 0:>8.0f}")
+
+
+def benchmark_shard_routes(episodes=8, shards=60):
+    """Simulated play: nearest-safe-shard targeting vs the cached shard tour, plus tour repair vs rebuild cost"""
+    import random
+    from decision_maker_enhanced import DecisionMakerEnhanced
+    from route_planner import RoutePlanner
+    minutes = 300 * 0.1 / 60
+    print(f"🧪 SHARD ROUTES ({shards} scattered shards that do not respawn, {episodes} episodes of 300 decisions)")
+    print(f"{'enemies':>7} | {'targeting':>9} | {'shards/min':>10} | {'hits':>5} | {'decide mean':>11}")
+    for enemies in (0, 20):
+        for name, use_routes in (('nearest', False), ('tour', True)):
+            collected = hits = 0
+            times = []
+            for episode in range(episodes):
+                # Same random choices and unlimited planning time, so both runs see the same game
+                random.seed(episode)
+                maker = DecisionMakerEnhanced(use_route_planning=use_routes)
+                maker.path_planner.budget = float('inf')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    episode_hits, episode_shards, episode_times = _simulate_decisions(
+                        maker.decide_movement, np.random.default_rng(episode), enemies=enemies, shards=shards,
+                        respawn_shards=False)
+                collected, hits = collected + episode_shards, hits + episode_hits
+                times += episode_times
+            print(f"{enemies:>7} | {name:>9} | {collected / (episodes * minutes):>10.1f} | {hits:>5} | "
+                  f"{np.mean(times) * 1000:>9.2f}ms")
+    planner = maker.route_planner
+    print(f"   last tour episode: {planner.rebuilds} rebuilds, {planner.repairs} repairs, "
+          f"{planner.two_opt_moves} 2-opt moves")
+
+    # Keeping the tour vs building it from scratch every frame while the player walks and collects it
+    rng = np.random.default_rng(0)
+    size = np.array([GAME_REGION['width'], GAME_REGION['height']], dtype=np.float64)
+    points = rng.uniform((0, 0), size, (shards, 2))
+    track_ids = np.arange(shards)
+    player = size / 2
+    kept, repair_times, scratch_times, lengths = RoutePlanner(), [], [], []
+    for _ in range(100):
+        shard_list = Detections.from_boxes(np.column_stack((points - 4, np.full((len(points), 2), 8))).astype(int),
+                                           track_ids=track_ids)
+        start = time.perf_counter()
+        kept.observe(player, shard_list)
+        stops = kept.plan(player)
+        repair_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        scratch = RoutePlanner()
+        scratch.observe(player, shard_list)
+        scratch.plan(player)
+        scratch_times.append(time.perf_counter() - start)
+        lengths.append(kept.tour_length(player) / scratch.tour_length(player))
+        step = stops[0] - player
+        player = player + step * min(1.0, 20 / max(np.hypot(*step), 1e-9))
+        picked = np.hypot(*(points - player).T) < 30
+        points, track_ids = points[~picked], track_ids[~picked]
+    print(f"   {shards}-stop tour per frame: repair {np.mean(repair_times[1:]) * 1000:.2f}ms, "
+          f"rebuild {np.mean(scratch_times) * 1000:.2f}ms, repaired length {np.mean(lengths):.3f}x rebuilt")
+
+
+def benchmark_decision_cache(frames=300, enemies=150, shards=40):
+    """Decision cache hit rate, decide time and agreement with uncached decisions on near-static scenes"""
+    import random
+    from decision_maker_enhanced import DecisionMakerEnhanced
+    print(f"🧪 DECISION CACHE ({enemies} enemies, {shards} shards, {frames} frames, player standing still)")
+    print(f"{'planners':>8} | {'scene':>16} | {'hit rate':>8} | {'cached':>9} | {'uncached':>9} | same decision")
+    width, height = GAME_REGION['width'], GAME_REGION['height']
+    player = (width // 2 - 10, height // 2 - 10, 20, 20)
+    scenes = (('jitter 1 px', 1.0, 0.0), ('jitter 3 px', 3.0, 0.0), ('drift 2 px/frame', 1.0, 2.0))
+    # With the path or route planner every enemy is in the key; without, only those the shard checks reach
+    setups = (('on', {}), ('off', {'use_path_planning': False, 'use_route_planning': False}))
+    for (planners, options), (name, jitter, drift) in itertools.product(setups, scenes):
+        rng = np.random.default_rng(0)
+        centers = rng.uniform((0, 0), (width, height), (enemies, 2))
+        headings = rng.uniform(-1, 1, (enemies, 2)) * drift
+        shard_boxes = np.column_stack((rng.uniform((width / 2 - 400, height / 2 - 300),
+                                                   (width / 2 + 400, height / 2 + 300), (shards, 2)) - 4,
+                                       np.full((shards, 2), 8))).astype(int)
+        cached_maker = DecisionMakerEnhanced(use_decision_cache=True, **options)
+        plain_maker = DecisionMakerEnhanced(use_decision_cache=False, **options)
+        cached_times, plain_times, same = [], [], 0
+        for frame in range(frames):
+            centers += headings
+            observed = centers + rng.normal(0, jitter, centers.shape)
+            enemy_list = Detections.from_boxes(np.column_stack((observed - 10, np.full((enemies, 2), 20))).astype(int))
+            shard_list = Detections.from_boxes(shard_boxes)
+            # Same random choices for both, so only caching can make them differ
+            with contextlib.redirect_stdout(io.StringIO()):
+                random.seed(frame)
+                start = time.perf_counter()
+                cached = cached_maker.decide_movement(player, enemy_list, shard_list)
+                cached_times.append(time.perf_counter() - start)
+                random.seed(frame)
+                start = time.perf_counter()
+                plain = plain_maker.decide_movement(player, enemy_list, shard_list)
+                plain_times.append(time.perf_counter() - start)
+            same += cached == plain
+        stats = cached_maker.decision_cache.get_stats()
+        print(f"{planners:>8} | {name:>16} | {stats['hit_rate']:>8.0%} | {np.mean(cached_times) * 1000:>7.2f}ms | "
+              f"{np.mean(plain_times) * 1000:>7.2f}ms | {same}/{frames}")
+
+
+def benchmark_tiled_detection(worker_counts=(1, 2, 4, 8)):
+    """Full-frame colour segmentation + blob extraction: single pass vs tiles on N threads"""
+    from frame_context import FrameContext
+    from color_classifier import ColorClassifier
+    from screen_analyzer import COLOR_CLASSES
+    from blob_extractor import extract_blobs
+    from tiled_detector import TiledDetector
+
+    print("🧪 TILED DETECTION SCALING")
+    frame = synthetic_frame(np.random.default_rng(0))
+    classifier = ColorClassifier(COLOR_CLASSES)
+    context = FrameContext()
+
+    def single_pass():
+        context.reset(frame)
+        return {name: extract_blobs(classifier.mask(context, name)) for name in classifier.names}
+
+    def blob_sets(blobs_by_class):
+        return {name: sorted(map(tuple, blobs.boxes.tolist())) for name, blobs in blobs_by_class.items()}
+
+    reference = blob_sets(single_pass())
+    baseline = _time_call(single_pass, repeats=10)
+    print(f"{'workers':>8} | {'time':>9} | {'speedup':>7} | same")
+    print(f"{'single':>8} | {baseline:>7.2f}ms | {1.0:>6.2f}x |")
+    for workers in worker_counts:
+        tiled = TiledDetector(classifier, workers=workers)
+
+        def tiled_pass():
+            context.reset(frame)
+            return {name: tiled.blobs(context, name) for name in classifier.names}
+
+        elapsed = _time_call(tiled_pass, repeats=10)
+        same = blob_sets(tiled_pass()) == reference
+        print(f"{workers:>8} | {elapsed:>7.2f}ms | {baseline / elapsed:>6.2f}x | {'✅' if same else '❌'}")
+        tiled.shutdown()
+
+
+BENCHMARKS = {
+    'dedupe': benchmark_enemy_dedupe,
+    'tiled': benchmark_tiled_detection,
+    'threats': benchmark_threat_evaluation,
+    'planner': benchmark_path_planner,
+    'rollout': benchmark_rollout_planner,
+    'routes': benchmark_shard_routes,
+    'cache': benchmark_decision_cache,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            return
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
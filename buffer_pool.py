@@ -0,0 +1,64 @@
+# buffer_pool.py - Per-frame scratch arrays recycled by shape and dtype
+
+import threading
+from collections import defaultdict
+
+import numpy as np
+from config import BUFFER_POOL_MAX_IDLE_FRAMES
+
+
+class BufferPool:
+    """Hands out scratch arrays for one frame and takes them all back at the next.
+
+    take() returns a free array of the requested shape and dtype, allocating
+    only when none is free. recycle() (called when a new frame starts) makes
+    every array handed out since the previous recycle available again, so
+    once each code path has run once, steady-state frames reuse the same
+    arrays through OpenCV's ``dst=`` outputs and allocate nothing.
+
+    Arrays must not be kept past the frame they were taken in. Sizes that
+    have not been asked for in ``max_idle_frames`` frames (e.g. a window
+    clipped at the screen edge) are released. take() is thread-safe so tile
+    workers can share one pool.
+    """
+
+    def __init__(self, max_idle_frames=BUFFER_POOL_MAX_IDLE_FRAMES):
+        self.max_idle_frames = max_idle_frames
+        self.frame = 0
+        self.allocations = 0
+        self._free = defaultdict(list)  # (shape, dtype): arrays
+        self._in_use = []               # (key, array) taken this frame
+        self._last_used = {}            # key: frame it was last taken in
+        self._lock = threading.Lock()
+
+    def take(self, shape, dtype=np.uint8):
+        """A scratch array valid until the next recycle(); contents are undefined"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                array = free.pop()
+            else:
+                array = np.empty(shape, dtype=dtype)
+                self.allocations += 1
+            self._in_use.append((key, array))
+            self._last_used[key] = self.frame
+        return array
+
+    def recycle(self):
+        """Return every array taken since the last call and drop sizes that went unused"""
+        with self._lock:
+            for key, array in self._in_use:
+                self._free[key].append(array)
+            self._in_use = []
+            self.frame += 1
+            for key, last_used in list(self._last_used.items()):
+                if self.frame - last_used > self.max_idle_frames:
+                    del self._last_used[key]
+                    self._free.pop(key, None)
+
+    @property
+    def pooled_bytes(self):
+        with self._lock:
+            return sum(array.nbytes for arrays in self._free.values() for array in arrays) + \
+                sum(array.nbytes for _, array in self._in_use)
@@ -0,0 +1,358 @@
+# capture_backends.py - Pluggable screen capture sources for the screen analyzer
+
+import ctypes
+import ctypes.util
+import glob
+import os
+
+import cv2
+import numpy as np
+from config import GAME_REGION
+
+# Colour conversion codes for each channel order a backend can deliver.
+# Frames are handed to the analyzer in their native order so the only
+# conversion that happens is the one the detector actually needs.
+# OpenCV's BGR2HSV also takes 4-channel input and ignores alpha, so BGRA
+# frames go to HSV in one pass instead of through a BGR copy.
+HSV_CONVERSIONS = {
+    'BGR': cv2.COLOR_BGR2HSV,
+    'RGB': cv2.COLOR_RGB2HSV,
+    'BGRA': cv2.COLOR_BGR2HSV,
+}
+GRAY_CONVERSIONS = {
+    'BGR': cv2.COLOR_BGR2GRAY,
+    'RGB': cv2.COLOR_RGB2GRAY,
+    'BGRA': cv2.COLOR_BGRA2GRAY,
+}
+BGR_CONVERSIONS = {
+    'RGB': cv2.COLOR_RGB2BGR,
+    'BGRA': cv2.COLOR_BGRA2BGR,
+}
+
+
+class CaptureBackend:
+    """Base class for anything that can produce game frames.
+
+    grab() returns a numpy array in ``channel_order``. Backends are free to
+    reuse the same buffer between calls, so callers must copy a frame if they
+    need to keep it after the next grab.
+    """
+
+    name = 'base'
+    channel_order = 'BGR'
+
+    def __init__(self, region=None):
+        self.region = dict(region or GAME_REGION)
+
+    def grab(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PyAutoGUICapture(CaptureBackend):
+    """Portable fallback using pyautogui (slow, allocates every frame)"""
+
+    name = 'pyautogui'
+    channel_order = 'RGB'
+
+    def __init__(self, region=None):
+        super().__init__(region)
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def grab(self):
+        region = self.region
+        screenshot = self._pyautogui.screenshot(region=(region['left'], region['top'], region['width'], region['height']))
+        # PIL already stores RGB, so skip the RGB->BGR pass the analyzer used to do
+        return np.asarray(screenshot)
+
+
+class MSSCapture(CaptureBackend):
+    """Cross-platform grabber built on the optional mss package"""
+
+    name = 'mss'
+    channel_order = 'BGRA'
+
+    def __init__(self, region=None):
+        super().__init__(region)
+        import mss
+        self._sct = mss.mss()
+        self._monitor = {
+            'left': self.region['left'],
+            'top': self.region['top'],
+            'width': self.region['width'],
+            'height': self.region['height'],
+        }
+
+    def grab(self):
+        shot = self._sct.grab(self._monitor)
+        # View straight onto mss' raw BGRA buffer, no pixel copy
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+    def close(self):
+        self._sct.close()
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class XShmCapture(CaptureBackend):
+    """X11 MIT-SHM grabber.
+
+    The X server writes each frame straight into a shared memory segment that
+    is mapped once at start-up, and grab() returns the same numpy view onto it
+    every time, so steady-state capture does no allocation and no copy.
+    """
+
+    name = 'xshm'
+    channel_order = 'BGRA'
+
+    _IPC_PRIVATE = 0
+    _IPC_CREAT = 0o1000
+    _IPC_RMID = 0
+    _ZPIXMAP = 2
+    _ALL_PLANES = ctypes.c_ulong(-1)
+
+    def __init__(self, region=None, display=None):
+        super().__init__(region)
+        self._display = None
+        self._ximage = None
+        self._shminfo = _XShmSegmentInfo()
+
+        x11_path = ctypes.util.find_library('X11')
+        xext_path = ctypes.util.find_library('Xext')
+        if not x11_path or not xext_path:
+            raise OSError("libX11/libXext not found")
+        self._x11 = ctypes.cdll.LoadLibrary(x11_path)
+        self._xext = ctypes.cdll.LoadLibrary(xext_path)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._declare_prototypes()
+
+        self._display = self._x11.XOpenDisplay(display.encode() if display else None)
+        if not self._display:
+            raise OSError("Cannot open X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            self.close()
+            raise OSError("X server does not support MIT-SHM")
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        visual = self._x11.XDefaultVisual(self._display, screen)
+        depth = self._x11.XDefaultDepth(self._display, screen)
+        width, height = self.region['width'], self.region['height']
+
+        self._ximage = self._xext.XShmCreateImage(
+            self._display, visual, depth, self._ZPIXMAP, None,
+            ctypes.byref(self._shminfo), width, height)
+        if not self._ximage:
+            self.close()
+            raise OSError("XShmCreateImage failed")
+        image = self._ximage.contents
+        if image.bits_per_pixel != 32:
+            self.close()
+            raise OSError(f"Unsupported X visual ({image.bits_per_pixel} bpp)")
+
+        size = image.bytes_per_line * height
+        self._shminfo.shmid = self._libc.shmget(self._IPC_PRIVATE, size, self._IPC_CREAT | 0o600)
+        if self._shminfo.shmid < 0:
+            self.close()
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        self._shminfo.shmaddr = self._libc.shmat(self._shminfo.shmid, None, 0)
+        if self._shminfo.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self._shminfo.shmaddr = None
+            self.close()
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        image.data = self._shminfo.shmaddr
+        self._shminfo.readOnly = 0
+
+        if not self._xext.XShmAttach(self._display, ctypes.byref(self._shminfo)):
+            self.close()
+            raise OSError("XShmAttach failed")
+        self._x11.XSync(self._display, 0)
+        # Segment is freed automatically once both sides detach
+        self._libc.shmctl(self._shminfo.shmid, self._IPC_RMID, None)
+
+        raw = (ctypes.c_uint8 * size).from_address(self._shminfo.shmaddr)
+        rows = np.ctypeslib.as_array(raw).reshape(height, image.bytes_per_line)
+        self._frame = rows[:, :width * 4].reshape(height, width, 4)
+
+    def _declare_prototypes(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+            ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def grab(self):
+        if not self._xext.XShmGetImage(self._display, self._root, self._ximage,
+                                       self.region['left'], self.region['top'], self._ALL_PLANES):
+            return None
+        return self._frame
+
+    def close(self):
+        if self._display and self._shminfo.shmaddr:
+            self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        if self._ximage:
+            # The pixel data belongs to the shm segment, not to Xlib's allocator
+            self._ximage.contents.data = None
+            self._x11.XDestroyImage(self._ximage)
+            self._ximage = None
+        if self._shminfo.shmaddr:
+            self._libc.shmdt(self._shminfo.shmaddr)
+            self._shminfo.shmaddr = None
+        if self._display:
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+class FileCapture(CaptureBackend):
+    """Feeds frames from an image, a directory of images or a video file.
+
+    Still images are decoded once and then served from memory; video frames
+    are decoded into a single reused buffer. Useful for running the vision
+    code without a live game window.
+    """
+
+    name = 'file'
+    channel_order = 'BGR'
+
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, path, loop=True, region=None):
+        super().__init__(region)
+        self.path = path
+        self.loop = loop
+        self._images = None
+        self._video = None
+        self._buffer = None
+        self._index = 0
+
+        if os.path.isdir(path):
+            files = sorted(f for f in glob.glob(os.path.join(path, '*'))
+                           if f.lower().endswith(self.IMAGE_EXTENSIONS))
+            self._images = [self._load_image(f) for f in files]
+        elif path.lower().endswith(self.IMAGE_EXTENSIONS):
+            self._images = [self._load_image(path)]
+        else:
+            self._video = cv2.VideoCapture(path)
+            if not self._video.isOpened():
+                raise IOError(f"Cannot open video source: {path}")
+
+        if self._images is not None and not self._images:
+            raise IOError(f"No images found in: {path}")
+
+    def _load_image(self, path):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError(f"Failed to load image: {path}")
+        return image
+
+    def grab(self):
+        if self._images is not None:
+            if self._index >= len(self._images):
+                if not self.loop:
+                    return None
+                self._index = 0
+            frame = self._images[self._index]
+            self._index += 1
+            return frame
+
+        ok, frame = self._video.read(self._buffer)
+        if not ok and self.loop:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._video.read(self._buffer)
+        if not ok:
+            return None
+        self._buffer = frame
+        return frame
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+CAPTURE_BACKENDS = {
+    'xshm': XShmCapture,
+    'mss': MSSCapture,
+    'pyautogui': PyAutoGUICapture,
+    'file': FileCapture,
+}
+
+# Tried in order when CAPTURE_BACKEND is 'auto'
+AUTO_BACKEND_ORDER = ('xshm', 'mss', 'pyautogui')
+
+
+def create_capture_backend(name='auto', **kwargs):
+    """Create a capture backend by name, falling back through the fast grabbers for 'auto'"""
+    if name == 'replay':
+        # Lives with the recorder that defines the session format
+        from session_recorder import ReplayCapture
+        return ReplayCapture(**kwargs)
+    if name != 'auto':
+        if name not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend: {name}")
+        return CAPTURE_BACKENDS[name](**kwargs)
+
+    errors = []
+    for candidate in AUTO_BACKEND_ORDER:
+        try:
+            return CAPTURE_BACKENDS[candidate](**kwargs)
+        except (ImportError, OSError) as e:
+            errors.append(f"{candidate}: {e}")
+    raise RuntimeError("No capture backend available (" + "; ".join(errors) + ")")
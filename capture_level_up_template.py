@@ -1,10 +1,11 @@
-# capture_level_up_template.py - Tool to capture level-up template for detection
+# capture_level_up_template.py - Tool to capture level-up and other UI screen templates for detection
 
 import pyautogui
 import cv2
 import numpy as np
 import time
-from config import GAME_REGION
+from config import GAME_REGION, LEVEL_UP_TEMPLATE_PATH, LEVEL_UP_TEMPLATE_REGION, LEVEL_UP_MATCH_THRESHOLD, SCREEN_LABELS
+from screen_library import ScreenLibrary
 
 def capture_level_up_template():
     """Capture a template of the level-up text for template matching"""
@@ -34,13 +35,14 @@ def capture_level_up_template():
     full_screenshot = cv2.cvtColor(np.array(full_screenshot), cv2.COLOR_RGB2BGR)
     
     # Define the top-middle area where "LEVEL UP" typically appears
-    # Adjust these values based on your game's UI layout
-    template_height = 100  # Height of the template area
-    template_width = 300   # Width of the template area
+    # Adjust LEVEL_UP_TEMPLATE_REGION in config.py for your game's UI layout;
+    # the bot only searches around this same region when matching
+    template_height = LEVEL_UP_TEMPLATE_REGION['height']
+    template_width = LEVEL_UP_TEMPLATE_REGION['width']
     
-    # Calculate position (top-middle of game area)
-    start_x = (GAME_REGION['width'] - template_width) // 2
-    start_y = 50  # 50 pixels from top
+    # Position of the banner (top-middle of game area)
+    start_x = LEVEL_UP_TEMPLATE_REGION['left']
+    start_y = LEVEL_UP_TEMPLATE_REGION['top']
     
     end_x = start_x + template_width
     end_y = start_y + template_height
@@ -49,13 +51,13 @@ def capture_level_up_template():
     template = full_screenshot[start_y:end_y, start_x:end_x]
     
     # Save the template
-    cv2.imwrite('level_up_template.png', template)
+    cv2.imwrite(LEVEL_UP_TEMPLATE_PATH, template)
     
     # Also save the full screenshot for reference
     cv2.imwrite('full_level_up_screen.png', full_screenshot)
     
     print("✅ Template captured!")
-    print(f"📁 Saved as 'level_up_template.png' ({template_width}x{template_height})")
+    print(f"📁 Saved as '{LEVEL_UP_TEMPLATE_PATH}' ({template_width}x{template_height})")
     print(f"📁 Full screen saved as 'full_level_up_screen.png' for reference")
     print(f"📐 Template region: ({start_x}, {start_y}) to ({end_x}, {end_y})")
     
@@ -69,7 +71,7 @@ def test_template_matching():
     """Test the captured template against current screen"""
     try:
         # Load the template
-        template = cv2.imread('level_up_template.png', cv2.IMREAD_COLOR)
+        template = cv2.imread(LEVEL_UP_TEMPLATE_PATH, cv2.IMREAD_COLOR)
         if template is None:
             print("❌ No template found. Run capture first!")
             return
@@ -94,8 +96,8 @@ def test_template_matching():
         
         print(f"🎯 Template match confidence: {max_val:.3f}")
         
-        # Threshold for detection (adjust as needed)
-        threshold = 0.7
+        # Threshold for detection (adjust LEVEL_UP_MATCH_THRESHOLD in config.py)
+        threshold = LEVEL_UP_MATCH_THRESHOLD
         
         if max_val >= threshold:
             print(f"✅ LEVEL-UP DETECTED! (confidence: {max_val:.3f})")
@@ -118,6 +120,75 @@ def test_template_matching():
     except Exception as e:
         print(f"❌ Error testing template: {e}")
 
+def _grab_game_screen():
+    screenshot = pyautogui.screenshot(region=(
+        GAME_REGION['left'], 
+        GAME_REGION['top'], 
+        GAME_REGION['width'], 
+        GAME_REGION['height']
+    ))
+    return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+
+def _ask_int(prompt, default):
+    value = input(f"{prompt} [{default}]: ").strip()
+    return int(value) if value else default
+
+def capture_screen_template():
+    """Capture a template for any UI screen and add it to the screen library"""
+    print("📚 SCREEN LIBRARY CAPTURE TOOL")
+    print("=" * 50)
+    print(f"Known screens: {', '.join(SCREEN_LABELS)}")
+    label = input("Screen label to capture: ").strip().lower().replace(' ', '_')
+    if not label:
+        print("❌ No label given.")
+        return None
+    
+    print("Choose a region that only looks like this on that screen (title text, banner, button).")
+    print("Coordinates are relative to the game area.")
+    region = {
+        'left': _ask_int("  Left", LEVEL_UP_TEMPLATE_REGION['left']),
+        'top': _ask_int("  Top", LEVEL_UP_TEMPLATE_REGION['top']),
+        'width': _ask_int("  Width", LEVEL_UP_TEMPLATE_REGION['width']),
+        'height': _ask_int("  Height", LEVEL_UP_TEMPLATE_REGION['height']),
+    }
+    threshold = float(input(f"  Match threshold [{LEVEL_UP_MATCH_THRESHOLD}]: ").strip() or LEVEL_UP_MATCH_THRESHOLD)
+    
+    input(f"Press Enter when the '{label}' screen is visible...")
+    print("📸 Capturing screen in 3 seconds...")
+    for i in range(3, 0, -1):
+        print(f"   {i}...")
+        time.sleep(1)
+    
+    full_screenshot = _grab_game_screen()
+    template = full_screenshot[region['top']:region['top'] + region['height'],
+                               region['left']:region['left'] + region['width']]
+    
+    library = ScreenLibrary()
+    library.add_entry(label, template, region, threshold)
+    print(f"✅ Added '{label}' to {library.manifest_path} ({template.shape[1]}x{template.shape[0]})")
+    return template
+
+def test_screen_library():
+    """Classify the current screen against every template in the library"""
+    library = ScreenLibrary()
+    if not library.entries:
+        print("❌ Screen library is empty. Capture some screens first!")
+        return
+    
+    input("Position game screen and press Enter to test...")
+    full_screenshot = _grab_game_screen()
+    
+    start = time.perf_counter()
+    match = library.classify(full_screenshot)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    for score, label in library.candidates(full_screenshot):
+        print(f"   {label:<12} signature score {score:.3f}")
+    if match.label:
+        print(f"✅ Screen: {match.label} (confidence: {match.confidence:.3f}, {elapsed_ms:.2f}ms)")
+    else:
+        print(f"🎮 No UI screen recognized - normal gameplay ({elapsed_ms:.2f}ms)")
+
 def main():
     print("🎮 LEVEL-UP TEMPLATE TOOLS")
     print("=" * 50)
@@ -125,8 +196,10 @@ def main():
     print("1. Capture new level-up template")
     print("2. Test existing template")
     print("3. Both (capture then test)")
+    print("4. Add a screen to the screen library (chest, game over, pause, menu...)")
+    print("5. Test screen library on the current screen")
     
-    choice = input("\nEnter choice (1/2/3): ").strip()
+    choice = input("\nEnter choice (1/2/3/4/5): ").strip()
     
     if choice == "1":
         capture_level_up_template()
@@ -135,6 +208,10 @@ def main():
     elif choice == "3":
         capture_level_up_template()
         test_template_matching()
+    elif choice == "4":
+        capture_screen_template()
+    elif choice == "5":
+        test_screen_library()
     else:
         print("Invalid choice. Exiting.")
 
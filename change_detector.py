@@ -0,0 +1,105 @@
+# change_detector.py - Cheap per-tile frame differencing to skip re-analysis of unchanged screen areas
+
+import cv2
+import numpy as np
+from config import CHANGE_DETECTION_SCALE, CHANGE_PIXEL_THRESHOLD
+
+
+def change_thumbnail(context, scale=CHANGE_DETECTION_SCALE):
+    """Frame in its native channels shrunk scale times with area averaging, memoized in the frame context.
+
+    Colour is kept: a change between two colours of equal brightness is
+    invisible in grayscale but changes what the HSV classifiers see.
+    """
+    height, width = context.shape
+    shape = (height // scale, width // scale) + context.image.shape[2:]
+
+    def compute(dst):
+        image = context.image[:shape[0] * scale, :shape[1] * scale]
+        cv2.resize(image, (shape[1], shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+    return context.derived(f'change_thumbnail_x{scale}', shape, np.uint8, compute)
+
+
+class ChangeDetector:
+    """Reports which of a fixed set of frame regions changed since they were last analyzed.
+
+    Each region keeps its own reference: the downscaled pixels from the
+    last time it was reported dirty, i.e. the pixels its cached results
+    were computed from. A region is dirty when any channel of any thumbnail
+    pixel differs from that reference by more than CHANGE_PIXEL_THRESHOLD
+    levels, at which point its reference is replaced. Because regions are
+    compared against their reference rather than the previous frame, slow
+    drift still adds up and eventually marks a region dirty.
+
+    ``generation`` changes whenever any region is dirty, so a whole-frame
+    result cached together with it stays valid while it is unchanged.
+    """
+
+    def __init__(self, regions, scale=CHANGE_DETECTION_SCALE, threshold=CHANGE_PIXEL_THRESHOLD):
+        self.regions = list(regions)  # (left, top, right, bottom) in frame pixels
+        self.scale = scale
+        self.threshold = threshold
+        self.references = [None] * len(self.regions)
+        self.last_dirty = np.ones(len(self.regions), dtype=bool)
+        self.pending = np.ones(len(self.regions), dtype=bool)  # Dirty since take_pending()
+        self.generation = 0  # Bumped whenever any region changes
+        self.frames = 0
+        self.dirty_total = 0.0
+        self._frame_key = None
+
+    def _thumbnail_slice(self, region):
+        left, top, right, bottom = region
+        scale = self.scale
+        return slice(top // scale, -(-bottom // scale)), slice(left // scale, -(-right // scale))
+
+    def update(self, context):
+        """Dirty flag per region for this frame (computed once per frame)"""
+        frame_key = (id(context), context.frame_id)
+        if frame_key == self._frame_key:
+            return self.last_dirty
+        self._frame_key = frame_key
+
+        thumbnail = change_thumbnail(context, self.scale)
+        dirty = np.zeros(len(self.regions), dtype=bool)
+        for index, region in enumerate(self.regions):
+            rows, cols = self._thumbnail_slice(region)
+            current = thumbnail[rows, cols]
+            reference = self.references[index]
+            if reference is None or reference.shape != current.shape:
+                dirty[index] = True
+            else:
+                difference = cv2.absdiff(current, reference, dst=context.scratch(current.shape))
+                # Largest difference over all channels (minMaxLoc wants a single channel)
+                _, max_diff, _, _ = cv2.minMaxLoc(difference.reshape(difference.shape[0], -1))
+                dirty[index] = max_diff > self.threshold
+            if dirty[index]:
+                if reference is None or reference.shape != current.shape:
+                    self.references[index] = current.copy()
+                else:
+                    np.copyto(reference, current)
+
+        self.last_dirty = dirty
+        self.pending |= dirty
+        if dirty.any():
+            self.generation += 1
+        self.frames += 1
+        self.dirty_total += self.dirty_fraction
+        return dirty
+
+    def take_pending(self):
+        """Regions that changed since the last call, for a consumer that refreshes them all now"""
+        pending = self.pending
+        self.pending = np.zeros(len(self.regions), dtype=bool)
+        return pending
+
+    @property
+    def dirty_fraction(self):
+        """Fraction of regions that changed in the last frame"""
+        return float(self.last_dirty.mean()) if len(self.last_dirty) else 0.0
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'dirty_fraction': self.dirty_fraction,
+            'mean_dirty_fraction': self.dirty_total / self.frames if self.frames else 0.0,
+        }
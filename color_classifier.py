@@ -0,0 +1,105 @@
+# color_classifier.py - Single-pass HSV colour classification via lookup tables
+
+import cv2
+import numpy as np
+
+
+class ColorClassifier:
+    """Compiles HSV colour ranges into lookup tables that label a frame in one pass.
+
+    Each class gets one bit. For every HSV channel a 256-entry table holds the
+    bits of the classes whose range contains that channel value, so
+    ``LUT(H) & LUT(S) & LUT(V)`` gives a label image whose bit k is set exactly
+    where ``cv2.inRange`` would have matched class k. The cost of labelling is
+    the same for 1 class or 16; per-class masks are then cheap single-channel
+    bit tests on the label image.
+    """
+
+    def __init__(self, color_ranges):
+        """color_ranges: ordered {name: {'lower': hsv, 'upper': hsv}}"""
+        if len(color_ranges) > 16:
+            raise ValueError("ColorClassifier supports at most 16 colour classes")
+        self.names = list(color_ranges)
+        self.class_ids = {name: index for index, name in enumerate(self.names)}
+        self.dtype = np.uint8 if len(self.names) <= 8 else np.uint16
+
+        self.luts = np.zeros((3, 256), dtype=self.dtype)
+        values = np.arange(256)
+        for index, name in enumerate(self.names):
+            lower = np.asarray(color_ranges[name]['lower'])
+            upper = np.asarray(color_ranges[name]['upper'])
+            for channel in range(3):
+                inside = (values >= lower[channel]) & (values <= upper[channel])
+                self.luts[channel, inside] |= self.dtype(1 << index)
+
+    def bit(self, name):
+        return 1 << self.class_ids[name]
+
+    def bits(self, names):
+        """Combined bit mask of several classes"""
+        combined = 0
+        for name in names:
+            combined |= self.bit(name)
+        return combined
+
+    def _label(self, context, dst):
+        planes = [context.buffer(f'hsv_plane{c}', context.shape) for c in range(3)]
+        lut_out = [context.buffer(f'lut_plane{c}', context.shape, self.dtype) for c in range(3)]
+        cv2.split(context.hsv, planes)
+        for channel in range(3):
+            cv2.LUT(planes[channel], self.luts[channel], dst=lut_out[channel])
+        cv2.bitwise_and(lut_out[0], lut_out[1], dst=dst)
+        cv2.bitwise_and(dst, lut_out[2], dst=dst)
+
+    def labels(self, context):
+        """Bit-per-class label image for the frame, computed once per frame"""
+        return context.derived('color_labels', context.shape, self.dtype, lambda dst: self._label(context, dst))
+
+    def mask(self, context, name):
+        """0/255 mask of one class, equivalent to cv2.inRange on its range"""
+        def compute(dst):
+            bits = context.buffer('class_bits', context.shape, self.dtype)
+            cv2.bitwise_and(self.labels(context), self.bit(name), dst=bits)
+            cv2.compare(bits, 0, cv2.CMP_NE, dst=dst)
+        return context.derived(f'class_{name}', context.shape, np.uint8, compute)
+
+    def label_hsv(self, hsv, context=None):
+        """Bit-per-class label image of an arbitrary HSV image (e.g. a crop or a downscaled frame).
+
+        With a context the planes and the result are pooled scratch arrays.
+        """
+        take = context.scratch if context is not None else np.empty
+        shape = hsv.shape[:2]
+        planes = [take(shape, np.uint8) for _ in range(3)]
+        cv2.split(hsv, planes)
+        labels = take(shape, self.dtype)
+        lut_out = take(shape, self.dtype)
+        cv2.LUT(planes[0], self.luts[0], dst=labels)
+        for channel in (1, 2):
+            cv2.LUT(planes[channel], self.luts[channel], dst=lut_out)
+            cv2.bitwise_and(labels, lut_out, dst=labels)
+        return labels
+
+    def region_labels(self, context, left, top, right, bottom):
+        """Label image of a sub-rectangle.
+
+        Slices the frame's label image when it was already computed, otherwise
+        labels just the region, so searching a few small windows never pays for
+        a full-frame HSV conversion.
+        """
+        labels = context.cached('color_labels')
+        if labels is not None:
+            return labels[top:bottom, left:right]
+        return self.label_hsv(context.hsv_region(left, top, right, bottom), context)
+
+    def class_mask(self, context, labels, bits):
+        """0/255 scratch mask where a label image has any of the given bits set"""
+        masked = context.scratch(labels.shape, self.dtype)
+        mask = context.scratch(labels.shape, np.uint8)
+        cv2.bitwise_and(labels, bits, dst=masked)
+        return cv2.compare(masked, 0, cv2.CMP_NE, dst=mask)
+
+    def region_mask(self, context, names, left, top, right, bottom):
+        """0/255 mask of a sub-rectangle where any of the named classes matches"""
+        labels = self.region_labels(context, left, top, right, bottom)
+        return self.class_mask(context, labels, self.bits(names))
@@ -10,6 +10,22 @@ GAME_REGION = {
     'height': 877
 }
 
+# Capture backend: 'auto' tries xshm, then mss, then pyautogui.
+# Use 'file' with CAPTURE_FILE_SOURCE pointing at saved images or a video,
+# or 'replay' with CAPTURE_FILE_SOURCE pointing at a recorded session directory.
+CAPTURE_BACKEND = 'auto'
+CAPTURE_FILE_SOURCE = None
+
+# Background capture thread: number of ring buffer slots and grab rate cap
+CAPTURE_RING_SIZE = 3
+CAPTURE_MAX_FPS = 60
+BUFFER_POOL_MAX_IDLE_FRAMES = 120  # Scratch buffers of a size unused this many frames are freed
+
+# Session recording: set RECORD_SESSION_DIR to save every run for replay
+RECORD_SESSION_DIR = None
+SESSION_CHUNK_SIZE = 60        # Frames per chunk file
+SESSION_PNG_COMPRESSION = 1    # 0-9, low values keep the writer thread fast
+
 # Player detection settings
 PLAYER_COLOR_RANGE = {
     'lower': np.array([100, 150, 0]),    # Lower HSV bound for player color
@@ -46,12 +62,105 @@ MOVEMENT_KEYS = {
 MIN_CONTOUR_AREA = 100
 PLAYER_DETECTION_THRESHOLD = 0.8
 ENEMY_DETECTION_THRESHOLD = 0.7
+PLAYER_SEARCH_MARGIN = 48  # Pixels searched around the predicted player box before a full-frame search
+
+# Object tracking: the full detectors run every FULL_DETECTION_STRIDE frames;
+# in between, tracks are predicted (constant velocity Kalman filter) and
+# re-measured in a small window around each predicted box
+FULL_DETECTION_STRIDE = 3
+TRACKER_MAX_DISTANCE = 60         # Max pixels between a predicted track and its detection
+TRACKER_MAX_MISSES = 2            # Frames a track may go unmeasured before it is dropped
+TRACKER_REFINE_MARGIN = 16        # Pixels searched around each predicted box
+TRACKER_REFINE_MAX_AREA = 0.3     # Run full detection if the windows would cover more of the frame
+TRACKER_PROCESS_NOISE = 5000.0    # Acceleration noise (pixels^2 / s^3)
+TRACKER_MEASUREMENT_NOISE = 4.0   # Detection centre noise (pixels^2)
+TRACKER_INITIAL_VELOCITY_VARIANCE = 40000.0  # (pixels / s)^2 for a brand new track
+
+# Foveated enemy detection: nested squares around the player with half sizes
+# of FOVEA_RING_SCALES x SAFE_DISTANCE_FROM_ENEMIES, re-detected every
+# FOVEA_RING_RATES frames (last rate: rest of the frame, searched downscaled)
+FOVEATED_DETECTION = True
+FOVEA_RING_SCALES = (1.0, 2.0)
+FOVEA_RING_RATES = (1, 2, 4)
+FOVEA_OUTER_DOWNSCALE = 2
+
+# Tiled detection: full-frame colour segmentation and blob extraction split
+# into overlapping tiles processed on a thread pool (OpenCV releases the GIL).
+# TILE_OVERLAP should exceed the largest enemy/player size.
+TILED_DETECTION = False
+TILED_WORKERS = 4
+TILE_GRID = (2, 4)  # rows, columns
+TILE_OVERLAP = 32
+
+# Change detection: a downscaled per-channel frame difference per tile decides which tiles
+# changed. Unchanged tiles reuse their cached blobs and a frame where nothing
+# changed reuses the previous analysis outright. Uses the tile grid above.
+CHANGE_DETECTION = True
+CHANGE_DETECTION_SCALE = 4    # Thumbnail downscale factor for the difference
+CHANGE_PIXEL_THRESHOLD = 12   # Levels any colour channel of a thumbnail pixel must move to count as a change
 
 # Movement patterns
 CIRCLE_RADIUS = 200
 MOVEMENT_SPEED = 0.1  # Time between movement commands
 
+# Level-up template matching. The template is the banner region saved by
+# capture_level_up_template.py (top-middle of the game area); matching only
+# searches that region grown by LEVEL_UP_SEARCH_MARGIN pixels.
+LEVEL_UP_TEMPLATE_PATH = 'level_up_template.png'
+LEVEL_UP_TEMPLATE_REGION = {
+    'left': (GAME_REGION['width'] - 300) // 2,
+    'top': 50,
+    'width': 300,
+    'height': 100
+}
+LEVEL_UP_SEARCH_MARGIN = 60
+LEVEL_UP_MATCH_THRESHOLD = 0.7
+LEVEL_UP_PYRAMID_LEVELS = 0   # >0 enables coarse-to-fine search on downscaled images
+
+# UI screen template library (see capture_level_up_template.py to add screens).
+# A frame is first compared against every screen on a thumbnail downscaled by
+# SCREEN_SIGNATURE_SCALE; only the SCREEN_MATCH_TOP_K best entries scoring at
+# least SCREEN_SIGNATURE_MIN_SCORE get a full template match.
+SCREEN_TEMPLATE_DIR = 'screen_templates'
+SCREEN_LABELS = ('level_up', 'chest', 'game_over', 'pause', 'main_menu')
+SCREEN_SIGNATURE_SCALE = 8
+SCREEN_SIGNATURE_MIN_SCORE = 0.6
+SCREEN_MATCH_TOP_K = 2
+
+# Game-state classification (PLAYING, LEVEL_UP, PAUSED, DEAD, MENU, UNKNOWN)
+GAME_STATE_THUMBNAIL_SCALE = 16   # Statistics are taken on a frame this many times smaller
+GAME_STATE_CONFIRM_FRAMES = 2     # Consecutive frames needed before the state changes
+GAME_STATE_DARK_FRACTION = 0.4    # Fraction of dark pixels that indicates a dimmed overlay
+GAME_STATE_BLACK_LEVEL = 10       # Mean brightness below this is a black/loading screen
+SCREEN_STATE_MAP = {
+    'level_up': 'LEVEL_UP',
+    'chest': 'LEVEL_UP',          # Chest rewards are confirmed the same way as upgrades
+    'game_over': 'DEAD',
+    'pause': 'PAUSED',
+    'main_menu': 'MENU'
+}
+
 # Upgrade selection settings
+# Where the three upgrade cards sit on the level-up screen (relative to the
+# game area). Each card is OCR'd separately on a worker thread.
+UPGRADE_CARD_REGIONS = [
+    {'left': 237, 'top': 250, 'width': 367, 'height': 400},
+    {'left': 604, 'top': 250, 'width': 367, 'height': 400},
+    {'left': 971, 'top': 250, 'width': 367, 'height': 400}
+]
+UPGRADE_KEYWORDS = ['damage', 'speed', 'health', 'attack', 'defense', 'magic', 'pierce', 'fire', 'ice']
+OCR_WORKERS = 3           # Worker threads, each with its own warm tesseract engine
+OCR_CACHE_SIZE = 256      # Card images remembered by perceptual hash
+OCR_HASH_TOLERANCE = 4    # Max differing dHash bits for a cache hit
+OCR_TIMEOUT = 1.0         # Seconds detect_upgrade_options waits for the cards
+
+# Level-up handling: the selection is sent and the bot resumes as soon as the
+# game-state check stops seeing the overlay (no fixed sleeps)
+LEVEL_UP_KEY_SETTLE = 0.05      # Seconds between releasing movement keys and confirming
+LEVEL_UP_RETRY_INTERVAL = 0.75  # Re-send the selection if the overlay is still up after this
+LEVEL_UP_MAX_RETRIES = 2
+LEVEL_UP_TIMEOUT = 3.0          # Give up waiting and resume after this many seconds
+
 LEVEL_UP_DETECTION_COLOR = {
     'lower': np.array([40, 40, 40]),  # Dark background of level up screen
     'upper': np.array([60, 60, 60])
@@ -60,3 +169,80 @@ LEVEL_UP_DETECTION_COLOR = {
 # Safe distances
 SAFE_DISTANCE_FROM_ENEMIES = 150
 COLLECTION_DISTANCE = 100
+THREAT_LOOKAHEAD = 0.3  # Seconds ahead tracked enemies are projected when checking for danger
+STALE_ENEMY_SPEED = 150  # Pixels/second an enemy may have moved since it was measured; older detections count as closer
+
+# Danger field: enemy distances on a grid of DANGER_FIELD_CELL_SIZE pixel cells
+# (one distance transform per frame) answer the safety checks with lookups.
+# The grid extends DANGER_FIELD_MARGIN pixels past the game area on every side.
+DANGER_FIELD = True
+DANGER_FIELD_CELL_SIZE = 8
+DANGER_FIELD_MARGIN = 200
+
+# Path planning on a coarser grid over the danger field (cell size a multiple
+# of DANGER_FIELD_CELL_SIZE). Entering a cell within PATH_BLOCK_DISTANCE of an
+# enemy costs PATH_BLOCK_COST (shard routes never cross one); within
+# SAFE_DISTANCE_FROM_ENEMIES a step costs up to 1 + PATH_DANGER_WEIGHT, quantized to PATH_DANGER_LEVELS steps so small enemy
+# moves leave the grid unchanged. Planning stops after PATH_PLANNER_BUDGET_MS
+# per frame; an unfinished shard search resumes on the next frame. If more than
+# PATH_REPLAN_FRACTION of the cells change cost, the search restarts.
+PATH_PLANNING = True
+PATH_PLANNER_CELL_SIZE = 16
+PATH_BLOCK_DISTANCE = 40
+PATH_DANGER_WEIGHT = 8.0
+PATH_DANGER_LEVELS = 4
+PATH_BLOCK_COST = 100.0
+PATH_PLANNER_BUDGET_MS = 3.0
+PATH_LOOKAHEAD_CELLS = 3  # Steer towards the cell this many steps along the plan
+PATH_REPLAN_FRACTION = 0.25
+
+# Shard routes: visible and remembered shards (kept ROUTE_SHARD_MEMORY frames
+# after they were last seen, or until the player passes within
+# ROUTE_PICKUP_DISTANCE) are ordered into a tour of at most ROUTE_MAX_SHARDS
+# stops. The tour is repaired each frame and rebuilt only when more than
+# ROUTE_REBUILD_FRACTION of its stops are new. The bot follows the tour when
+# its next stop passes the usual shard checks (in collection range, straight
+# path clear) and falls back to the nearest safe shard otherwise. Off by
+# default: `python benchmark.py routes` still collects fewer shards per minute
+# with it than nearest-shard targeting.
+ROUTE_PLANNING = False
+ROUTE_MAX_SHARDS = 64
+ROUTE_SHARD_MEMORY = 30
+ROUTE_PICKUP_DISTANCE = 30
+ROUTE_REBUILD_FRACTION = 0.5
+
+# Decision cache: reuse the decision for inputs that quantize to the same
+# signature (player, shard and enemy centres in DECISION_CACHE_CELL_SIZE pixel
+# cells, enemy velocities in DECISION_CACHE_VELOCITY_STEP pixels/second steps,
+# detection ages in DECISION_CACHE_AGE_STEP second steps). Without the path
+# planner only enemies within DECISION_CACHE_RADIUS pixels of the player are
+# part of the signature: the farthest the shard path safety checks look.
+# Planned paths and shard tour stops can be anywhere on screen, so with the
+# path or route planner every enemy is. Keeps the DECISION_CACHE_SIZE most recently used signatures.
+# Decisions that involved a random choice and rollout-planner moves are never
+# cached. A hit skips only the priority cascade; the danger field, path
+# planner and shard tour are still updated every frame.
+DECISION_CACHE = False
+DECISION_CACHE_SIZE = 256
+DECISION_CACHE_CELL_SIZE = 16
+DECISION_CACHE_VELOCITY_STEP = 50
+DECISION_CACHE_AGE_STEP = 0.05
+DECISION_CACHE_RADIUS = COLLECTION_DISTANCE * 4 + SAFE_DISTANCE_FROM_ENEMIES
+
+# Rollout planner: instead of the danger/shard/survival cascade, simulate plans
+# of ROLLOUT_SEGMENTS moves (8 directions or stay) over ROLLOUT_HORIZON seconds
+# in ROLLOUT_STEPS steps, with enemies moving at their tracked velocities, and
+# refine them until ROLLOUT_DEADLINE_MS has passed. A plan scores its distance
+# to the closest enemy (0..1 of SAFE_DISTANCE_FROM_ENEMIES, averaged over the steps) plus
+# ROLLOUT_XP_WEIGHT per shard passed within ROLLOUT_PICKUP_DISTANCE; coming
+# within ROLLOUT_HIT_DISTANCE of an enemy counts as a hit.
+ROLLOUT_PLANNER = False
+ROLLOUT_DEADLINE_MS = 15.0
+ROLLOUT_HORIZON = 1.0
+ROLLOUT_STEPS = 12
+ROLLOUT_SEGMENTS = 4
+ROLLOUT_PLAYER_SPEED = 200  # Pixels per second the player moves while a key is held
+ROLLOUT_HIT_DISTANCE = 30
+ROLLOUT_PICKUP_DISTANCE = 30
+ROLLOUT_XP_WEIGHT = 0.25
+ROLLOUT_BATCH_SIZE = 16     # Plans scored per refinement batch once the systematic stages are done
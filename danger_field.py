@@ -0,0 +1,116 @@
+# danger_field.py - Per-frame grid of enemy distances so safety queries cost the same for 5 or 500 enemies
+
+import cv2
+import numpy as np
+from config import GAME_REGION, SAFE_DISTANCE_FROM_ENEMIES, DANGER_FIELD_CELL_SIZE, DANGER_FIELD_MARGIN
+
+
+class DangerField:
+    """Distance from every point of the game area to the nearest enemy, on a coarse grid.
+
+    update() drops the enemy centres into a grid of cell_size pixel cells
+    (grown by margin pixels on every side so escape moves past the screen
+    edge still land inside) and runs cv2.distanceTransform over it once.
+    After that, distance_at() is a lookup, path_clearance() samples the
+    grid along each path and zone_threats() sums a fixed window around a
+    point, so no query touches the enemy list. Distances are between cell
+    centres (5x5 mask approximation) and therefore accurate to about one
+    cell.
+
+    ``distance`` (pixels, float32) can be drawn directly; render() turns it
+    into a colour image for debugging.
+    """
+
+    def __init__(self, width=GAME_REGION['width'], height=GAME_REGION['height'],
+                 cell_size=DANGER_FIELD_CELL_SIZE, margin=DANGER_FIELD_MARGIN, safe_distance=SAFE_DISTANCE_FROM_ENEMIES):
+        self.cell_size = cell_size
+        self.margin = margin
+        self.safe_distance = safe_distance
+        rows = -(-(height + 2 * margin) // cell_size)
+        cols = -(-(width + 2 * margin) // cell_size)
+        self._occupancy = np.empty((rows, cols), dtype=np.uint8)
+        self.distance = np.full((rows, cols), np.inf, dtype=np.float32)  # Pixels to the nearest enemy
+        self.counts = np.zeros((rows, cols), dtype=np.float32)           # Enemies per cell
+        self.enemy_count = 0
+
+        # Threat weight max(0, safe_distance - d) of an enemy at each offset within reach of a cell
+        reach = -(-safe_distance // cell_size)
+        offsets = np.arange(-reach, reach + 1) * cell_size
+        dx, dy = np.meshgrid(offsets, offsets)
+        self._reach = reach
+        self._weights = np.maximum(0, safe_distance - np.hypot(dx, dy)).astype(np.float32)
+        self._left = dx < 0
+        self._above = dy < 0
+
+    @property
+    def shape(self):
+        return self.distance.shape
+
+    def _cells(self, points):
+        """Grid (rows, cols) of pixel points, clipped to the grid"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cells = np.floor((points + self.margin) / self.cell_size).astype(np.intp)
+        cols = np.clip(cells[:, 0], 0, self.shape[1] - 1)
+        rows = np.clip(cells[:, 1], 0, self.shape[0] - 1)
+        return rows, cols
+
+    def update(self, centers):
+        """Rebuild the field for this frame's enemy centres"""
+        rows, cols = self._cells(centers)
+        self.enemy_count = len(rows)
+        self.counts.fill(0)
+        np.add.at(self.counts, (rows, cols), 1)
+        if self.enemy_count == 0:
+            self.distance.fill(np.inf)
+            return self
+        self._occupancy.fill(255)
+        self._occupancy[rows, cols] = 0
+        cv2.distanceTransform(self._occupancy, cv2.DIST_L2, cv2.DIST_MASK_5, dst=self.distance)
+        self.distance *= self.cell_size
+        return self
+
+    def distance_at(self, points):
+        """Distance in pixels from each point to the nearest enemy"""
+        return self.distance[self._cells(points)]
+
+    def path_clearance(self, start, targets):
+        """Smallest enemy distance along each straight path from start to a target, one sample per cell"""
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        if len(targets) == 0 or self.enemy_count == 0:
+            return np.full(len(targets), np.inf)
+        start = np.asarray(start, dtype=np.float64)
+        segments = targets - start
+        longest = np.sqrt((segments * segments).sum(axis=1).max())
+        t = np.linspace(0.0, 1.0, int(longest // self.cell_size) + 2)
+        samples = start + segments[:, None, :] * t[None, :, None]  # (targets, samples, 2)
+        return self.distance_at(samples.reshape(-1, 2)).reshape(len(targets), len(t)).min(axis=1)
+
+    def zone_threats(self, point):
+        """Summed threat weight of enemies above, below, left and right of point within the safe distance"""
+        reach = self._reach
+        rows, cols = self._cells([point])
+        row, col = int(rows[0]), int(cols[0])
+        top, left = row - reach, col - reach
+        # Clip the weight window where it runs off the grid
+        r0, c0 = max(0, -top), max(0, -left)
+        r1 = min(2 * reach + 1, self.shape[0] - top)
+        c1 = min(2 * reach + 1, self.shape[1] - left)
+        window = self.counts[top + r0:top + r1, left + c0:left + c1] * self._weights[r0:r1, c0:c1]
+        left_mask, above_mask = self._left[r0:r1, c0:c1], self._above[r0:r1, c0:c1]
+        return {
+            'up': float(window[above_mask].sum()),
+            'down': float(window[~above_mask].sum()),
+            'left': float(window[left_mask].sum()),
+            'right': float(window[~left_mask].sum()),
+        }
+
+    def render(self, frame_shape=None):
+        """BGR heat map of the field (red = near an enemy), optionally cropped and scaled to a frame"""
+        clipped = np.minimum(self.distance, 2 * self.safe_distance)
+        image = cv2.applyColorMap((255 - clipped * (255 / (2 * self.safe_distance))).astype(np.uint8),
+                                  cv2.COLORMAP_JET)
+        if frame_shape is None:
+            return image
+        height, width = frame_shape[:2]
+        image = cv2.resize(image, None, fx=self.cell_size, fy=self.cell_size, interpolation=cv2.INTER_NEAREST)
+        return image[self.margin:self.margin + height, self.margin:self.margin + width]
@@ -0,0 +1,88 @@
+# decision_cache.py - Bounded LRU of recent movement decisions keyed by quantized inputs
+
+from collections import OrderedDict
+
+import numpy as np
+from config import (DECISION_CACHE_SIZE, DECISION_CACHE_CELL_SIZE, DECISION_CACHE_VELOCITY_STEP,
+                    DECISION_CACHE_AGE_STEP, DECISION_CACHE_RADIUS)
+
+
+class DecisionCache:
+    """Remembers the decisions for recently seen, nearly identical inputs.
+
+    signature() snaps the player, enemy and shard centres to cells of
+    DECISION_CACHE_CELL_SIZE pixels, enemy velocities to steps of
+    DECISION_CACHE_VELOCITY_STEP pixels/second and detection ages to steps
+    of DECISION_CACHE_AGE_STEP seconds, and sorts the rows so detection
+    order does not matter. With a radius, only enemies within that many
+    pixels of the player take part, so it must cover every enemy the
+    decision can depend on; radius=None keys on every enemy. The result is
+    a small hashable tuple; two frames with the same signature get the
+    same decision.
+    At most DECISION_CACHE_SIZE signatures are kept, least recently used
+    evicted first.
+    """
+
+    def __init__(self, capacity=DECISION_CACHE_SIZE, cell_size=DECISION_CACHE_CELL_SIZE,
+                 velocity_step=DECISION_CACHE_VELOCITY_STEP, age_step=DECISION_CACHE_AGE_STEP,
+                 radius=DECISION_CACHE_RADIUS):
+        self.capacity = capacity
+        self.cell_size = cell_size
+        self.radius = radius
+        self.velocity_step = velocity_step
+        self.age_step = age_step
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _cells(self, centers, velocities=None, ages=None):
+        """Sorted quantized rows (cell x, cell y[, velocity x, velocity y, age]) as bytes"""
+        cells = np.floor_divide(centers, self.cell_size).astype(np.int32)
+        if velocities is not None:
+            steps = np.floor(velocities / self.velocity_step).astype(np.int32)
+            age_steps = np.floor(np.asarray(ages, dtype=np.float64) / self.age_step).astype(np.int32)
+            cells = np.hstack((cells, steps, age_steps.reshape(-1, 1)))
+        if len(cells) > 1:
+            cells = cells[np.lexsort(cells.T[::-1])]
+        return cells.tobytes()
+
+    def signature(self, player_pos, enemies, shards, velocities=None, extra=None):
+        """Hashable key for these inputs; extra is any other state the decision depends on"""
+        player = (int(player_pos[0]) // self.cell_size, int(player_pos[1]) // self.cell_size)
+        velocities = enemies.velocities if velocities is None else np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+        if self.radius is None:
+            enemy_cells = self._cells(enemies.centers, velocities, enemies.ages)
+        else:
+            near = enemies.squared_distances(player_pos) < self.radius * self.radius
+            enemy_cells = self._cells(enemies.centers[near], velocities[near], enemies.ages[near])
+        return (player, enemy_cells, self._cells(shards.centers), extra)
+
+    def get(self, key):
+        """Cached decision for key, or None"""
+        decision = self.entries.get(key)
+        if decision is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return decision
+
+    def put(self, key, decision):
+        """Remember decision for key, evicting the least recently used entry when full"""
+        self.entries[key] = decision
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self):
+        """Hit and eviction counters since creation"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -1,25 +1,72 @@
 # decision_maker_enhanced.py - Enhanced AI logic with smart pathfinding and safety
 
-from config import SAFE_DISTANCE_FROM_ENEMIES, COLLECTION_DISTANCE
+from config import (SAFE_DISTANCE_FROM_ENEMIES, COLLECTION_DISTANCE, THREAT_LOOKAHEAD, STALE_ENEMY_SPEED, DANGER_FIELD,
+                    PATH_PLANNING, ROLLOUT_PLANNER, ROUTE_PLANNING, DECISION_CACHE)
+from detections import Detections
+from danger_field import DangerField
+from path_planner import PathPlanner
+from rollout_planner import RolloutPlanner
+from route_planner import RoutePlanner
+from decision_cache import DecisionCache
+import numpy as np
 import random
 import math
 
 class DecisionMakerEnhanced:
-    def __init__(self):
+    # Candidate escape moves, in the order ties are broken: up, down, left, right
+    ESCAPE_STEPS = np.array([(0, -50), (0, 50), (-50, 0), (50, 0)], dtype=np.float64)
+    
+    def __init__(self, use_danger_field=DANGER_FIELD, use_path_planning=PATH_PLANNING, use_rollout_planner=ROLLOUT_PLANNER,
+                 use_route_planning=ROUTE_PLANNING, use_decision_cache=DECISION_CACHE):
         self.last_direction = None
         self.stuck_counter = 0
         self.last_position = None
+        # With the danger field every safety check is a grid lookup; without
+        # it they are exact distance computations against every enemy
+        self.use_danger_field = use_danger_field
+        self._fields = [DangerField(), DangerField()] if use_danger_field else []  # Enemies and projected threats
+        self._built_fields = []  # (source Detections, field) most recently built
+        self.danger_field = None  # Field of the last decision's enemies, for debug rendering
+        # Routes around enemies instead of straight lines (needs the danger field)
+        self.path_planner = PathPlanner() if use_danger_field and use_path_planning else None
+        # Visible and remembered shards ordered into a tour, followed when none is reachable close by
+        self.route_planner = RoutePlanner() if use_route_planning else None
+        # Simulated rollouts over 8 directions plus stay replace the whole cascade below
+        self.rollout_planner = RolloutPlanner() if use_rollout_planner else None
+        # Decisions for recently seen (quantized) inputs are reused instead of recomputed
+        self.decision_cache = None
+        if use_decision_cache:
+            # Planned paths and tour stops can be anywhere on screen, so then every enemy is in the key
+            whole_screen = self.path_planner is not None or self.route_planner is not None
+            self.decision_cache = DecisionCache(radius=None) if whole_screen else DecisionCache()
+        self._random_decision = False  # Set when the decision being made involved a random choice
         
-    def decide_movement(self, player, enemies, experience_shards=None):
+    def decide_movement(self, player, enemies, experience_shards=None, enemy_velocities=None):
         """
         Enhanced decision making with safety checks and smart pathfinding
+        enemies/experience_shards: Detections (or lists of (x, y, w, h) boxes)
+        enemy_velocities: optional (vx, vy) pixels/second per enemy; defaults to
+        the velocities tracked Detections carry
         """
         if not player:
             return 'stop'  # Cannot find player
+        enemies = Detections.coerce(enemies)
+        experience_shards = Detections.coerce(experience_shards)
+        if enemy_velocities is not None and len(enemy_velocities):
+            enemy_velocities = np.asarray(enemy_velocities, dtype=np.float64)
+        else:
+            enemy_velocities = None
         
         player_x, player_y, player_w, player_h = player
         player_center = (player_x + player_w // 2, player_y + player_h // 2)
         
+        if self.rollout_planner is not None:
+            # Staying put can be a planned move, so no stuck detection. Rollouts are
+            # randomized and cut off by a deadline, so their moves are never cached
+            return self.rollout_planner.plan(player_center, enemies, experience_shards, enemy_velocities)
+        
+        # Stuck detection runs before the cache lookup: a cached decision that keeps
+        # the player stuck still counts towards the random escape
         # Check if we're stuck (same position)
         if self.last_position:
             distance_moved = self._calculate_distance(player_center, self.last_position)
@@ -30,126 +77,216 @@ class DecisionMakerEnhanced:
         
         self.last_position = player_center
         
-        # If stuck, try random movement
+        # If stuck, try random movement (never cached)
         if self.stuck_counter > 20:
             self.stuck_counter = 0
             return random.choice(['up', 'down', 'left', 'right'])
         
-        # Priority 1: Check for immediate danger
-        immediate_danger = self._check_immediate_danger(player_center, enemies)
+        # Per-frame state runs even when the decision comes from the cache, so the
+        # danger field, planner and shard memory never fall behind during a run of hits
+        if self.use_danger_field:
+            self.danger_field = self._field_of(enemies)
+        if self.path_planner is not None:
+            self.path_planner.begin_frame(self.danger_field)
+        route_stop = None
+        if self.route_planner is not None:
+            route_stop = self._next_route_stop(player_center, experience_shards, enemies)
+        
+        if self.decision_cache is not None:
+            # The route planner's current stop is state the inputs do not show
+            extra = self.route_planner.tour[0] if route_stop is not None else None
+            key = self.decision_cache.signature(player_center, enemies, experience_shards, enemy_velocities, extra)
+            cached = self.decision_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        self._random_decision = False
+        decision = self._choose_movement(player_center, enemies, experience_shards, enemy_velocities, route_stop)
+        if self.decision_cache is not None and not self._random_decision:
+            self.decision_cache.put(key, decision)
+        return decision
+    
+    def _choose_movement(self, player_center, enemies, experience_shards, enemy_velocities, route_stop=None):
+        """The danger / shard / survival cascade for one frame; route_stop is the shard tour's next stop"""
+        # Priority 1: Check for immediate danger (where tracked enemies are about to be)
+        threats = self._project_enemies(enemies, enemy_velocities, THREAT_LOOKAHEAD)
+        immediate_danger = self._check_immediate_danger(player_center, threats)
         if immediate_danger:
-            escape_direction = self._find_escape_direction(player_center, enemies)
+            escape_direction = None
+            if self.path_planner is not None:
+                escape_direction = self._plan_escape(player_center)
+            if escape_direction is None:
+                escape_direction = self._find_escape_direction(player_center, threats)
             print(f"🚨 DANGER! Escaping {escape_direction}")
             return escape_direction
         
         # Priority 2: Collect safe experience shards
-        if experience_shards:
-            safe_shard = self._find_safe_experience_shard(player_center, experience_shards, enemies)
-            if safe_shard:
-                direction = self._calculate_direction_to_target(player_center, safe_shard)
-                print(f"💎 Moving {direction} to collect safe experience shard")
-                return direction
+        safe_shard = None
+        if route_stop is not None and self._shard_reachable(player_center, route_stop, enemies):
+            # Follow the tour through visible and remembered shards in its order
+            if self.path_planner is not None:
+                safe_shard = self.path_planner.path_waypoint(player_center, route_stop)
+            else:
+                safe_shard = route_stop
+        if safe_shard is None and experience_shards:
+            # No tour, or its next stop cannot be reached safely: nearest safe shard
+            if self.path_planner is not None:
+                # Next waypoint on the cheapest route to any reachable shard
+                safe_shard = self._plan_to_shards(player_center, experience_shards)
+            if safe_shard is None:
+                safe_shard = self._find_safe_experience_shard(player_center, experience_shards, enemies)
+        if safe_shard:
+            direction = self._calculate_direction_to_target(player_center, safe_shard)
+            print(f"💎 Moving {direction} to collect safe experience shard")
+            return direction
         
         # Priority 3: General survival movement
         survival_direction = self._calculate_survival_movement(player_center, enemies)
         return survival_direction
     
+    def _project_enemies(self, enemies, velocities, lookahead):
+        """Enemy Detections moved lookahead seconds along their velocities"""
+        if not enemies:
+            return enemies
+        velocities = enemies.velocities if velocities is None or len(velocities) == 0 else np.asarray(velocities)
+        if not velocities.any():
+            return enemies
+        offsets = np.rint(velocities * lookahead).astype(np.int32)
+        projected = Detections(enemies.data.copy())
+        projected.boxes[:, :2] += offsets
+        projected.centers[:] += offsets
+        return projected
+    
+    def _field_of(self, enemies):
+        """DangerField of these enemies, rebuilt only when they are not one of the last fields' sources"""
+        for source, field in self._built_fields:
+            if source is enemies:
+                return field
+        if len(self._built_fields) == len(self._fields):
+            _, field = self._built_fields.pop(0)
+        else:
+            field = self._fields[len(self._built_fields)]
+        self._built_fields.append((enemies, field.update(enemies.centers)))
+        return field
+    
     def _check_immediate_danger(self, player_pos, enemies):
         """Check if player is in immediate danger"""
         if not enemies:
             return False
         
         danger_distance = SAFE_DISTANCE_FROM_ENEMIES // 2  # Half safe distance for immediate danger
-        
-        for enemy in enemies:
-            enemy_x, enemy_y, enemy_w, enemy_h = enemy
-            enemy_center = (enemy_x + enemy_w // 2, enemy_y + enemy_h // 2)
-            distance = self._calculate_distance(player_pos, enemy_center)
-            
-            if distance < danger_distance:
+        if self.use_danger_field:
+            if self._field_of(enemies).distance_at(player_pos)[0] < danger_distance:
                 return True
-        
-        return False
+            # The field has enemies where they were seen; check the stale ones with their slack
+            enemies = enemies[enemies.ages > 0]
+            if not enemies:
+                return False
+        distances = np.sqrt(enemies.squared_distances(player_pos)) - enemies.ages * STALE_ENEMY_SPEED
+        return bool(distances.min() < danger_distance)
     
     def _find_escape_direction(self, player_pos, enemies):
         """Find the best direction to escape from enemies"""
-        directions = {
-            'up': (0, -50),
-            'down': (0, 50),
-            'left': (-50, 0),
-            'right': (50, 0)
-        }
+        directions = ['up', 'down', 'left', 'right']
+        if not enemies:
+            return directions[0]
+        
+        new_positions = np.asarray(player_pos, dtype=np.float64) + self.ESCAPE_STEPS
+        if self.use_danger_field:
+            return directions[int(np.argmax(self._field_of(enemies).distance_at(new_positions)))]
         
-        best_direction = 'up'
-        max_distance_to_enemies = 0
-        
-        for direction, (dx, dy) in directions.items():
-            # Calculate potential new position
-            new_pos = (player_pos[0] + dx, player_pos[1] + dy)
-            
-            # Calculate minimum distance to any enemy from this new position
-            min_enemy_distance = float('inf')
-            for enemy in enemies:
-                enemy_x, enemy_y, enemy_w, enemy_h = enemy
-                enemy_center = (enemy_x + enemy_w // 2, enemy_y + enemy_h // 2)
-                distance = self._calculate_distance(new_pos, enemy_center)
-                min_enemy_distance = min(min_enemy_distance, distance)
-            
-            # Choose direction that maximizes distance from nearest enemy
-            if min_enemy_distance > max_distance_to_enemies:
-                max_distance_to_enemies = min_enemy_distance
-                best_direction = direction
-        
-        return best_direction
+        # Distance from each candidate position to each enemy: (directions, enemies)
+        offsets = enemies.centers[None, :, :] - new_positions[:, None, :]
+        nearest = (offsets * offsets).sum(axis=2).min(axis=1)
+        
+        # Choose direction that maximizes distance from nearest enemy
+        return directions[int(np.argmax(nearest))]
     
     def _find_safe_experience_shard(self, player_pos, experience_shards, enemies):
         """Find the closest experience shard that's safe to collect"""
-        safe_shards = []
-        
-        for shard in experience_shards:
-            shard_x, shard_y, shard_w, shard_h = shard
-            shard_center = (shard_x + shard_w // 2, shard_y + shard_h // 2)
-            
-            # Check if shard is within collection distance
-            shard_distance = self._calculate_distance(player_pos, shard_center)
-            if shard_distance > COLLECTION_DISTANCE * 4:  # Too far
-                continue
-            
-            # Check if path to shard is safe
-            if self._is_path_safe(player_pos, shard_center, enemies):
-                safe_shards.append((shard, shard_distance))
-        
-        if not safe_shards:
+        centers = experience_shards.centers
+        offsets = centers - np.asarray(player_pos, dtype=np.float64)
+        shard_distances = np.sqrt((offsets * offsets).sum(axis=1))
+        
+        # Only shards within collection range whose whole path is clear of enemies
+        candidates = np.flatnonzero(shard_distances <= COLLECTION_DISTANCE * 4)
+        safe = candidates[self._paths_safe(player_pos, centers[candidates], enemies)]
+        if len(safe) == 0:
             return None
         
         # Return closest safe shard
-        closest_shard = min(safe_shards, key=lambda x: x[1])
-        shard_x, shard_y, shard_w, shard_h = closest_shard[0]
-        return (shard_x + shard_w // 2, shard_y + shard_h // 2)
+        closest = safe[np.argmin(shard_distances[safe])]
+        return tuple(centers[closest].tolist())
+    
+    def _shard_reachable(self, player_pos, shard, enemies):
+        """The checks every shard target passes: within collection range and a straight path clear of enemies"""
+        if self._calculate_distance(player_pos, shard) > COLLECTION_DISTANCE * 4:
+            return False
+        return self._is_path_safe(player_pos, shard, enemies)
+    
+    def _next_route_stop(self, player_pos, experience_shards, enemies):
+        """First stop of the shard tour, skipping shards next to an enemy, or None"""
+        remembered = self.route_planner.observe(player_pos, experience_shards)
+        if len(remembered) == 0:
+            return None
+        if self.use_danger_field:
+            usable = self._field_of(enemies).distance_at(remembered) >= SAFE_DISTANCE_FROM_ENEMIES // 2
+        elif enemies:
+            offsets = remembered[:, None, :] - enemies.centers[None, :, :]
+            usable = (offsets * offsets).sum(axis=2).min(axis=1) >= (SAFE_DISTANCE_FROM_ENEMIES // 2) ** 2
+        else:
+            usable = None
+        stops = self.route_planner.plan(player_pos, usable)
+        return tuple(stops[0].tolist()) if len(stops) else None
+    
+    def _plan_escape(self, player_pos):
+        """Direction along an A* route to the safest nearby cell, or None"""
+        target = self.path_planner.safest_point(player_pos, SAFE_DISTANCE_FROM_ENEMIES)
+        waypoint = self.path_planner.path_waypoint(player_pos, target, through_danger=True)
+        if waypoint is None:
+            return None
+        return self._calculate_direction_to_target(player_pos, waypoint)
+    
+    def _plan_to_shards(self, player_pos, experience_shards):
+        """Waypoint on the flow field towards the shards in range that are not next to an enemy, or None"""
+        centers = experience_shards.centers
+        offsets = centers - np.asarray(player_pos, dtype=np.float64)
+        in_range = (offsets * offsets).sum(axis=1) <= (COLLECTION_DISTANCE * 4) ** 2
+        clear = self.danger_field.distance_at(centers) >= SAFE_DISTANCE_FROM_ENEMIES // 2
+        return self.path_planner.flow_waypoint(player_pos, centers[in_range & clear].tolist())
+    
+    def _path_clearances(self, start_pos, targets, enemy_centers):
+        """Squared distance from every enemy centre to every start->target segment, shape (targets, enemies)"""
+        start = np.asarray(start_pos, dtype=np.float64)
+        segments = np.asarray(targets, dtype=np.float64).reshape(-1, 2) - start
+        offsets = np.asarray(enemy_centers, dtype=np.float64).reshape(-1, 2) - start
+        
+        # Project each enemy onto each segment and clamp to its end points
+        lengths_sq = (segments * segments).sum(axis=1)
+        t = segments @ offsets.T / np.maximum(lengths_sq, 1e-12)[:, None]
+        np.clip(t, 0.0, 1.0, out=t)
+        dx = offsets[None, :, 0] - t * segments[:, None, 0]
+        dy = offsets[None, :, 1] - t * segments[:, None, 1]
+        return dx * dx + dy * dy
+    
+    def _paths_safe(self, start_pos, targets, enemies):
+        """Per target: does the straight path from start keep SAFE_DISTANCE_FROM_ENEMIES from every enemy"""
+        targets = np.asarray(targets).reshape(-1, 2)
+        if not enemies or len(targets) == 0:
+            return np.ones(len(targets), dtype=bool)
+        if self.use_danger_field:
+            return self._field_of(enemies).path_clearance(start_pos, targets) >= SAFE_DISTANCE_FROM_ENEMIES
+        # Every path stays within reach of the start, so farther enemies can't touch one
+        reach = np.sqrt(((targets - np.asarray(start_pos)) ** 2).sum(axis=1).max()) + SAFE_DISTANCE_FROM_ENEMIES
+        enemies = enemies.within(start_pos, reach)
+        if not enemies:
+            return np.ones(len(targets), dtype=bool)
+        clearances = self._path_clearances(start_pos, targets, enemies.centers)
+        return clearances.min(axis=1) >= SAFE_DISTANCE_FROM_ENEMIES * SAFE_DISTANCE_FROM_ENEMIES
     
     def _is_path_safe(self, start_pos, target_pos, enemies):
         """Check if the path from start to target is safe from enemies"""
-        if not enemies:
-            return True
-        
-        # Check several points along the path
-        steps = 5
-        for i in range(steps + 1):
-            t = i / steps
-            check_x = start_pos[0] + t * (target_pos[0] - start_pos[0])
-            check_y = start_pos[1] + t * (target_pos[1] - start_pos[1])
-            check_pos = (check_x, check_y)
-            
-            # Check if this point is too close to any enemy
-            for enemy in enemies:
-                enemy_x, enemy_y, enemy_w, enemy_h = enemy
-                enemy_center = (enemy_x + enemy_w // 2, enemy_y + enemy_h // 2)
-                distance = self._calculate_distance(check_pos, enemy_center)
-                
-                if distance < SAFE_DISTANCE_FROM_ENEMIES:
-                    return False
-        
-        return True
+        return bool(self._paths_safe(start_pos, [target_pos], Detections.coerce(enemies))[0])
     
     def _calculate_direction_to_target(self, player_pos, target_pos):
         """Calculate the best direction to move toward a target"""
@@ -164,27 +301,16 @@ class DecisionMakerEnhanced:
             # No enemies visible - move in a gentle circle
             return 'circle'
         
-        # Calculate danger zones
-        danger_zones = {'up': 0, 'down': 0, 'left': 0, 'right': 0}
-        
-        for enemy in enemies:
-            enemy_x, enemy_y, enemy_w, enemy_h = enemy
-            enemy_center = (enemy_x + enemy_w // 2, enemy_y + enemy_h // 2)
-            distance = self._calculate_distance(player_pos, enemy_center)
-            
-            # Weight danger by distance (closer enemies are more dangerous)
-            danger_weight = max(0, SAFE_DISTANCE_FROM_ENEMIES - distance)
-            
-            # Determine which zones this enemy affects
-            if enemy_center[0] < player_pos[0]:
-                danger_zones['left'] += danger_weight
-            else:
-                danger_zones['right'] += danger_weight
-                
-            if enemy_center[1] < player_pos[1]:
-                danger_zones['up'] += danger_weight
-            else:
-                danger_zones['down'] += danger_weight
+        if self.use_danger_field:
+            danger_zones = self._field_of(enemies).zone_threats(player_pos)
+            stale = enemies[enemies.ages > 0]
+            if stale:
+                # The field weighs stale enemies where they were seen; add what their slack brings them closer
+                seen = self._zone_threats(player_pos, stale, 0.0)
+                closer = self._zone_threats(player_pos, stale, stale.ages * STALE_ENEMY_SPEED)
+                danger_zones = {zone: danger_zones[zone] + closer[zone] - seen[zone] for zone in danger_zones}
+        else:
+            danger_zones = self._zone_threats(player_pos, enemies, enemies.ages * STALE_ENEMY_SPEED)
         
         # Find the safest direction
         safest_direction = min(danger_zones, key=danger_zones.get)
@@ -194,10 +320,28 @@ class DecisionMakerEnhanced:
             # All directions equally safe, add some variation
             safe_directions = [d for d, danger in danger_zones.items() if danger == 0]
             if len(safe_directions) > 1:
+                self._random_decision = True
                 return random.choice(safe_directions)
         
         return safest_direction
     
+    def _zone_threats(self, player_pos, enemies, slack):
+        """Threat weight per direction; slack is how much closer than its centre each enemy may be"""
+        # Weight danger by distance (closer enemies are more dangerous)
+        offsets = enemies.centers - np.asarray(player_pos, dtype=np.float64)
+        distances = np.sqrt((offsets * offsets).sum(axis=1)) - slack
+        danger_weights = np.maximum(0, SAFE_DISTANCE_FROM_ENEMIES - distances)
+        
+        # Each enemy adds to one vertical and one horizontal zone
+        above = offsets[:, 1] < 0
+        left = offsets[:, 0] < 0
+        return {
+            'up': float(danger_weights[above].sum()),
+            'down': float(danger_weights[~above].sum()),
+            'left': float(danger_weights[left].sum()),
+            'right': float(danger_weights[~left].sum()),
+        }
+    
     def _calculate_distance(self, pos1, pos2):
         """Calculate Euclidean distance between two points"""
         return math.sqrt((pos2[0] - pos1[0])**2 + (pos2[1] - pos1[1])**2)
@@ -209,6 +353,8 @@ class DecisionMakerEnhanced:
         
         player_x, player_y, player_w, player_h = player
         player_center = (player_x + player_w // 2, player_y + player_h // 2)
+        enemies = Detections.coerce(enemies)
+        experience_shards = Detections.coerce(experience_shards)
         
         info = []
         info.append(f"Player at: {player_center}")
@@ -216,16 +362,11 @@ class DecisionMakerEnhanced:
         info.append(f"Experience shards: {len(experience_shards) if experience_shards else 0}")
         
         if enemies:
-            closest_enemy_dist = min([
-                self._calculate_distance(player_center, (e[0] + e[2]//2, e[1] + e[3]//2))
-                for e in enemies
-            ])
+            closest_enemy_dist = math.sqrt(enemies.squared_distances(player_center).min())
             info.append(f"Closest enemy: {closest_enemy_dist:.1f} pixels")
         
         if experience_shards:
-            safe_shards = len([s for s in experience_shards if self._is_path_safe(
-                player_center, (s[0] + s[2]//2, s[1] + s[3]//2), enemies
-            )])
+            safe_shards = int(self._paths_safe(player_center, experience_shards.centers, enemies).sum())
             info.append(f"Safe shards: {safe_shards}")
         
         return " | ".join(info)
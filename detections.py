@@ -0,0 +1,140 @@
+# detections.py - Array-backed detection lists shared by vision, tracking and decision code
+
+import numpy as np
+
+# One record per detected object. box is x, y, w, h; center is the integer
+# centre (x + w // 2, y + h // 2) every consumer used to recompute; area is
+# the blob pixel count (w * h when unknown); class_id indexes the colour
+# classes of the ColorClassifier (-1 unknown); track_id is -1 for untracked
+# detections; velocity is pixels per second (zero unless tracked); age is
+# how many seconds before the current frame the object was last measured
+# (zero for this frame's detections, more for stale foveated rings or
+# tracks coasting without a measurement).
+DETECTION_DTYPE = np.dtype([
+    ('box', np.int32, (4,)),
+    ('center', np.int32, (2,)),
+    ('area', np.int32),
+    ('class_id', np.int16),
+    ('track_id', np.int32),
+    ('confidence', np.float32),
+    ('velocity', np.float32, (2,)),
+    ('age', np.float32),
+])
+
+
+class Detections:
+    """A list of detected objects stored as one numpy structured array.
+
+    Behaves like the list of (x, y, w, h) tuples it replaces: len(), truth
+    value, iteration and integer indexing all yield box tuples, so existing
+    callers keep working. Vector code uses the field views instead (boxes,
+    centers, areas, ...), which are zero-copy views into the record array.
+    Indexing with a slice, boolean mask or index array returns a new
+    Detections, so filtering is one numpy operation.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data=None):
+        self.data = np.empty(0, dtype=DETECTION_DTYPE) if data is None else data
+
+    @classmethod
+    def from_boxes(cls, boxes, class_id=-1, areas=None, confidence=1.0, track_ids=-1, velocities=0.0, ages=0.0):
+        """Detections from (N, 4) x, y, w, h boxes; the other fields broadcast"""
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        data = np.empty(len(boxes), dtype=DETECTION_DTYPE)
+        data['box'] = boxes
+        data['center'] = boxes[:, :2] + boxes[:, 2:] // 2
+        data['area'] = boxes[:, 2] * boxes[:, 3] if areas is None else areas
+        data['class_id'] = class_id
+        data['track_id'] = track_ids
+        data['confidence'] = confidence
+        data['velocity'] = velocities
+        data['age'] = ages
+        return cls(data)
+
+    @classmethod
+    def from_blobs(cls, blobs, class_id=-1):
+        """Detections from extract_blobs output"""
+        return cls.from_boxes(blobs.boxes, class_id, areas=blobs.areas)
+
+    @classmethod
+    def coerce(cls, detections):
+        """Detections from a Detections, a list of box tuples or None"""
+        if isinstance(detections, cls):
+            return detections
+        if detections is None or len(detections) == 0:
+            return cls()
+        return cls.from_boxes(detections)
+
+    @classmethod
+    def concatenate(cls, parts):
+        parts = [part.data for part in parts]
+        if not parts:
+            return cls()
+        return cls(np.concatenate(parts))
+
+    @property
+    def boxes(self):
+        return self.data['box']
+
+    @property
+    def centers(self):
+        return self.data['center']
+
+    @property
+    def areas(self):
+        return self.data['area']
+
+    @property
+    def class_ids(self):
+        return self.data['class_id']
+
+    @property
+    def track_ids(self):
+        return self.data['track_id']
+
+    @property
+    def confidences(self):
+        return self.data['confidence']
+
+    @property
+    def velocities(self):
+        return self.data['velocity']
+
+    @property
+    def ages(self):
+        return self.data['age']
+
+    def of_class(self, class_id):
+        return self[self.data['class_id'] == class_id]
+
+    def squared_distances(self, point):
+        """Squared distance from point to every detection centre"""
+        offsets = self.centers - np.asarray(point, dtype=np.float64)
+        return (offsets * offsets).sum(axis=1)
+
+    def within(self, point, radius):
+        """Detections whose centre lies within radius of point"""
+        return self[self.squared_distances(point) < radius * radius]
+
+    def tolist(self):
+        """Boxes as a list of (x, y, w, h) tuples"""
+        return [tuple(box) for box in self.boxes.tolist()]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bool__(self):
+        return len(self.data) > 0
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return tuple(self.data['box'][key].tolist())
+        return Detections(self.data[key])
+
+    def __repr__(self):
+        return f"Detections({self.tolist()})"
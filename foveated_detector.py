@@ -0,0 +1,133 @@
+# foveated_detector.py - Multi-rate enemy detection: full rate near the player, less often further out
+
+import time
+
+import numpy as np
+from config import (SAFE_DISTANCE_FROM_ENEMIES, ENEMY_COLOR_RANGES, MIN_CONTOUR_AREA, FOVEA_RING_SCALES,
+                    FOVEA_RING_RATES, FOVEA_OUTER_DOWNSCALE)
+from blob_extractor import extract_blobs, boxes_to_corners
+from spatial_index import dedupe_points
+from detections import Detections
+
+
+class FoveatedEnemyDetector:
+    """Schedules enemy detection by distance from the player.
+
+    The frame is split into nested squares centred on the player whose half
+    sizes are FOVEA_RING_SCALES times SAFE_DISTANCE_FROM_ENEMIES, plus the
+    rest of the frame. Ring k is re-detected every FOVEA_RING_RATES[k]
+    frames; the outermost ring (the whole frame) is searched on an image
+    downscaled FOVEA_OUTER_DOWNSCALE times. The inner ring covers every
+    enemy within the safe distance and always runs at full rate and
+    resolution, so danger response is unchanged.
+
+    Each ring keeps the enemies whose centres fall outside the next inner
+    square; merging takes the freshest ring first and drops stored
+    detections that a fresher ring now covers. ``detect`` returns the merged
+    enemy Detections with each one's ``age`` in seconds since its ring ran.
+    """
+
+    def __init__(self, screen_analyzer, ring_scales=FOVEA_RING_SCALES, ring_rates=FOVEA_RING_RATES,
+                 outer_downscale=FOVEA_OUTER_DOWNSCALE):
+        if len(ring_rates) != len(ring_scales) + 1:
+            raise ValueError("FOVEA_RING_RATES needs one rate per ring plus one for the outer region")
+        self.screen_analyzer = screen_analyzer
+        self.half_sizes = [int(scale * SAFE_DISTANCE_FROM_ENEMIES) for scale in ring_scales]
+        self.rates = [max(1, rate) for rate in ring_rates]
+        self.outer_downscale = max(1, outer_downscale)
+        self.reset()
+
+    def reset(self):
+        """Forget stored detections; every ring runs on the next frame"""
+        ring_count = len(self.rates)
+        self.ring_enemies = [Detections() for _ in range(ring_count)]
+        self.ring_times = [None] * ring_count
+        self.frames_since = [None] * ring_count
+        self.ring_runs = [0] * ring_count
+
+    def _square(self, center, half_size, frame_shape):
+        height, width = frame_shape
+        cx, cy = center
+        return (max(0, cx - half_size), max(0, cy - half_size),
+                min(width, cx + half_size), min(height, cy + half_size))
+
+    def _enemies_from_labels(self, context, labels, min_area, offset=(0, 0), scale=1):
+        """Per-colour blobs + NMS on a label image, mapped back to frame coordinates"""
+        classifier = self.screen_analyzer.color_classifier
+        component_labels = context.scratch(labels.shape, np.int32)
+        parts = []
+        for color_name in ENEMY_COLOR_RANGES:
+            class_name = f'enemy_{color_name}'
+            mask = classifier.class_mask(context, labels, classifier.bit(class_name))
+            blobs = extract_blobs(mask, min_area, labels=component_labels)
+            if len(blobs.areas) == 0:
+                continue
+            boxes = self.screen_analyzer._non_max_suppression(boxes_to_corners(blobs.boxes), 0.3)
+            boxes[:, 2:] -= boxes[:, :2]
+            boxes *= scale
+            boxes[:, :2] += offset
+            parts.append(Detections.from_boxes(boxes, classifier.class_ids[class_name]))
+        return Detections.concatenate(parts)
+
+    def _detect_ring(self, context, ring, squares):
+        if ring == len(self.half_sizes):
+            # Outer region: whole frame, downscaled
+            scale = self.outer_downscale
+            labels = self.screen_analyzer.color_classifier.label_hsv(context.scaled_hsv(scale), context)
+            enemies = self._enemies_from_labels(context, labels, MIN_CONTOUR_AREA // (scale * scale), scale=scale)
+        else:
+            left, top, right, bottom = squares[ring]
+            if right <= left or bottom <= top:
+                return Detections()
+            labels = self.screen_analyzer.color_classifier.region_labels(context, left, top, right, bottom)
+            enemies = self._enemies_from_labels(context, labels, MIN_CONTOUR_AREA, offset=(left, top))
+        if ring == 0:
+            return enemies
+        # The next ring in is detected more often; it owns everything it covers
+        return enemies[~self._inside(enemies, squares[ring - 1])]
+
+    def _inside(self, enemies, square):
+        """Per-detection flag: centre inside the square"""
+        left, top, right, bottom = square
+        cx, cy = enemies.centers.T
+        return (left <= cx) & (cx < right) & (top <= cy) & (cy < bottom)
+
+    def detect(self, context, player, timestamp=None):
+        """Merged enemy Detections (ages set), refreshing only the rings that are due"""
+        now = time.monotonic() if timestamp is None else timestamp
+        if player is None:
+            # No fovea without a player: behave like the uniform detector
+            self.reset()
+            return self.screen_analyzer._detect_enemies(context)
+
+        x, y, w, h = player
+        center = (x + w // 2, y + h // 2)
+        squares = [self._square(center, half_size, context.shape) for half_size in self.half_sizes]
+
+        for ring, rate in enumerate(self.rates):
+            if self.frames_since[ring] is None or self.frames_since[ring] + 1 >= rate:
+                self.ring_enemies[ring] = self._detect_ring(context, ring, squares)
+                self.ring_times[ring] = now
+                self.frames_since[ring] = 0
+                self.ring_runs[ring] += 1
+            else:
+                self.frames_since[ring] += 1
+
+        parts, ages = [], []
+        for ring, ring_enemies in enumerate(self.ring_enemies):
+            age = now - self.ring_times[ring]
+            if age > 0:
+                # Skip stale detections the player has since moved a fresher ring over
+                stale = np.zeros(len(ring_enemies), dtype=bool)
+                for inner in range(ring):
+                    stale |= self._inside(ring_enemies, squares[inner])
+                ring_enemies = ring_enemies[~stale]
+            parts.append(ring_enemies)
+            ages.append(np.full(len(ring_enemies), age, dtype=np.float32))
+        enemies = Detections.concatenate(parts)
+        if len(enemies):
+            enemies.ages[:] = np.concatenate(ages)
+
+        # Fresher rings come first, so their copy of a boundary enemy wins
+        keep = dedupe_points(enemies.boxes[:, :2].tolist(), 20)
+        return enemies[np.asarray(keep, dtype=np.intp)]
@@ -0,0 +1,168 @@
+# frame_context.py - Per-frame cache of derived images shared by all detectors
+
+import cv2
+import numpy as np
+from capture_backends import HSV_CONVERSIONS, GRAY_CONVERSIONS, BGR_CONVERSIONS
+from buffer_pool import BufferPool
+
+
+class FrameContext:
+    """Lazily computes and memoizes derived images for one frame.
+
+    Each conversion (BGR, HSV, gray, pyramid levels, colour masks) runs at
+    most once per frame no matter how many detectors ask for it. Output
+    buffers are kept between frames and refilled in place via OpenCV's
+    ``dst=`` arguments, so a reused context allocates nothing once warm.
+    Unnamed intermediates (region crops, masks, label images) come from a
+    BufferPool via scratch() and are recycled on every reset().
+
+    Call reset() with each new frame; derived images and scratch arrays from
+    the previous frame are invalid afterwards.
+    """
+
+    def __init__(self, image=None, channel_order='BGR', pool=None):
+        self.image = None
+        self.channel_order = channel_order
+        self.frame_id = 0
+        self.pool = pool if pool is not None else BufferPool()
+        self._buffers = {}
+        self._ready = set()
+        if image is not None:
+            self.reset(image, channel_order)
+
+    def reset(self, image, channel_order=None):
+        """Point the context at a new frame and invalidate everything derived from the old one"""
+        self.image = image
+        if channel_order is not None:
+            self.channel_order = channel_order
+        self.frame_id += 1
+        self._ready.clear()
+        self.pool.recycle()
+        return self
+
+    @property
+    def shape(self):
+        return self.image.shape[:2]
+
+    def buffer(self, key, shape, dtype=np.uint8):
+        """Reusable output array for a derived image, reallocated only if the shape changes"""
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
+    def scratch(self, shape, dtype=np.uint8):
+        """Pooled array for an intermediate result, valid until the next reset()"""
+        return self.pool.take(shape, dtype)
+
+    def derived(self, key, shape, dtype, compute):
+        """Memoized derived image: compute(dst) fills a reused buffer at most once per frame"""
+        if key in self._ready:
+            return self._buffers[key]
+        dst = self.buffer(key, shape, dtype)
+        compute(dst)
+        self._ready.add(key)
+        return dst
+
+    def cached(self, key):
+        """Derived image already computed for this frame, or None"""
+        return self._buffers[key] if key in self._ready else None
+
+    @property
+    def bgr(self):
+        if self.channel_order == 'BGR':
+            return self.image
+        cached = self.cached('bgr')
+        if cached is not None:
+            return cached
+        dst = self.buffer('bgr', self.shape + (3,))
+        cv2.cvtColor(self.image, BGR_CONVERSIONS[self.channel_order], dst=dst)
+        self._ready.add('bgr')
+        return dst
+
+    def bgr_region(self, left, top, right, bottom):
+        """BGR pixels of a sub-rectangle, converting only that region if the full BGR frame isn't cached"""
+        if self.channel_order == 'BGR' or 'bgr' in self._ready:
+            return self.bgr[top:bottom, left:right]
+        dst = self.scratch((bottom - top, right - left, 3))
+        return cv2.cvtColor(self.image[top:bottom, left:right], BGR_CONVERSIONS[self.channel_order], dst=dst)
+
+    def gray_region(self, left, top, right, bottom):
+        """Grayscale pixels of a sub-rectangle, converting only that region if the full gray frame isn't cached"""
+        if 'gray' in self._ready:
+            return self.gray[top:bottom, left:right]
+        dst = self.scratch((bottom - top, right - left))
+        return cv2.cvtColor(self.image[top:bottom, left:right], GRAY_CONVERSIONS[self.channel_order], dst=dst)
+
+    def hsv_region(self, left, top, right, bottom):
+        """HSV pixels of a sub-rectangle, converting only that region if the full HSV frame isn't cached"""
+        if 'hsv' in self._ready:
+            return self.hsv[top:bottom, left:right]
+        dst = self.scratch((bottom - top, right - left, 3))
+        if self.channel_order in HSV_CONVERSIONS:
+            return cv2.cvtColor(self.image[top:bottom, left:right], HSV_CONVERSIONS[self.channel_order], dst=dst)
+        return cv2.cvtColor(self.bgr_region(left, top, right, bottom), cv2.COLOR_BGR2HSV, dst=dst)
+
+    @property
+    def hsv(self):
+        cached = self.cached('hsv')
+        if cached is not None:
+            return cached
+        dst = self.buffer('hsv', self.shape + (3,))
+        if self.channel_order in HSV_CONVERSIONS:
+            cv2.cvtColor(self.image, HSV_CONVERSIONS[self.channel_order], dst=dst)
+        else:
+            cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV, dst=dst)
+        self._ready.add('hsv')
+        return dst
+
+    def scaled_hsv(self, factor):
+        """HSV of the frame shrunk factor times by nearest-neighbour sampling (colours stay exact)"""
+        height, width = self.shape
+        shape = (height // factor, width // factor, 3)
+
+        def compute(dst):
+            small = self.scratch(shape[:2] + self.image.shape[2:])
+            cv2.resize(self.image, (shape[1], shape[0]), dst=small, interpolation=cv2.INTER_NEAREST)
+            if self.channel_order not in HSV_CONVERSIONS:
+                small = cv2.cvtColor(small, BGR_CONVERSIONS[self.channel_order], dst=self.scratch(shape))
+            cv2.cvtColor(small, HSV_CONVERSIONS.get(self.channel_order, cv2.COLOR_BGR2HSV), dst=dst)
+        return self.derived(f'hsv_x{factor}', shape, np.uint8, compute)
+
+    @property
+    def gray(self):
+        cached = self.cached('gray')
+        if cached is not None:
+            return cached
+        dst = self.buffer('gray', self.shape)
+        cv2.cvtColor(self.image, GRAY_CONVERSIONS[self.channel_order], dst=dst)
+        self._ready.add('gray')
+        return dst
+
+    def pyramid(self, level, source='bgr'):
+        """Image downscaled by 2**level (level 0 is full resolution), built with pyrDown"""
+        if level == 0:
+            return getattr(self, source)
+        key = f'{source}_pyr{level}'
+        cached = self.cached(key)
+        if cached is not None:
+            return cached
+        previous = self.pyramid(level - 1, source)
+        h, w = previous.shape[:2]
+        shape = ((h + 1) // 2, (w + 1) // 2) + previous.shape[2:]
+        dst = self.buffer(key, shape)
+        cv2.pyrDown(previous, dst=dst, dstsize=(shape[1], shape[0]))
+        self._ready.add(key)
+        return dst
+
+    def mask(self, name, color_range):
+        """inRange mask of the HSV image for a {'lower', 'upper'} colour range, memoized by name"""
+        key = f'mask_{name}'
+        cached = self.cached(key)
+        if cached is not None:
+            return cached
+        dst = self.buffer(key, self.shape)
+        cv2.inRange(self.hsv, color_range['lower'], color_range['upper'], dst=dst)
+        self._ready.add(key)
+        return dst
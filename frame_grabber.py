@@ -0,0 +1,139 @@
+# frame_grabber.py - Background capture thread with a latest-frame ring buffer
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from config import CAPTURE_RING_SIZE, CAPTURE_MAX_FPS
+
+# image: ring slot holding the pixels (valid until the next get_latest call)
+# timestamp: time.monotonic() when the grab finished
+# sequence: running capture number
+# dropped: frames captured but never consumed since the previous get_latest
+CapturedFrame = namedtuple('CapturedFrame', ['image', 'timestamp', 'sequence', 'dropped'])
+
+
+class FrameGrabber:
+    """Keeps grabbing frames on a producer thread so capture is off the decision path.
+
+    Frames are copied into a small preallocated ring. The consumer always gets
+    the newest frame; anything older that was never picked up is counted as
+    dropped. The slot handed to the consumer is never overwritten until the
+    consumer asks for the next frame.
+    """
+
+    def __init__(self, capture_backend, ring_size=CAPTURE_RING_SIZE, max_fps=CAPTURE_MAX_FPS):
+        if ring_size < 3:
+            raise ValueError("ring_size must be at least 3 (reading, latest and writing slots)")
+        self.capture_backend = capture_backend
+        self.ring_size = ring_size
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+
+        self._ring = None
+        self._timestamps = [0.0] * ring_size
+        self._sequences = [0] * ring_size
+        self._condition = threading.Condition()
+        self._latest_slot = -1
+        self._reading_slot = -1
+        self._last_consumed_sequence = 0
+        self._thread = None
+        self._running = False
+
+        self.frames_captured = 0
+        self.frames_consumed = 0
+        self.frames_dropped = 0
+        self.capture_errors = 0
+
+    @property
+    def channel_order(self):
+        return self.capture_backend.channel_order
+
+    def start(self):
+        """Start the producer thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the producer thread and wake any waiting consumer"""
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _free_slot(self):
+        for slot in range(self.ring_size):
+            if slot != self._latest_slot and slot != self._reading_slot:
+                return slot
+
+    def _run(self):
+        while self._running:
+            started = time.monotonic()
+            try:
+                frame = self.capture_backend.grab()
+            except Exception:
+                frame = None
+            if frame is None:
+                self.capture_errors += 1
+                time.sleep(0.05)
+                continue
+            timestamp = time.monotonic()
+
+            if self._ring is None or self._ring[0].shape != frame.shape:
+                self._ring = [np.empty_like(frame) for _ in range(self.ring_size)]
+
+            with self._condition:
+                slot = self._free_slot()
+
+            # Backends may reuse their buffer, so copy into our own slot.
+            # Outside the lock: nobody else touches a slot that is neither
+            # latest nor being read.
+            np.copyto(self._ring[slot], frame)
+
+            with self._condition:
+                self.frames_captured += 1
+                self._timestamps[slot] = timestamp
+                self._sequences[slot] = self.frames_captured
+                self._latest_slot = slot
+                self._condition.notify_all()
+
+            if self.min_interval:
+                remaining = self.min_interval - (time.monotonic() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+
+    def get_latest(self, timeout=None):
+        """Return the newest frame not yet consumed, waiting up to timeout seconds"""
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: not self._running or (
+                    self._latest_slot >= 0 and self._sequences[self._latest_slot] > self._last_consumed_sequence),
+                timeout=timeout)
+            if not ready or self._latest_slot < 0:
+                return None
+            slot = self._latest_slot
+            sequence = self._sequences[slot]
+            if sequence <= self._last_consumed_sequence:
+                return None
+
+            dropped = sequence - self._last_consumed_sequence - 1
+            self.frames_dropped += dropped
+            self.frames_consumed += 1
+            self._last_consumed_sequence = sequence
+            self._reading_slot = slot
+            self._latest_slot = -1
+            return CapturedFrame(self._ring[slot], self._timestamps[slot], sequence, dropped)
+
+    def get_stats(self):
+        """Capture pipeline counters for logging"""
+        return {
+            'captured': self.frames_captured,
+            'consumed': self.frames_consumed,
+            'dropped': self.frames_dropped,
+            'errors': self.capture_errors,
+        }
@@ -0,0 +1,95 @@
+# game_state.py - Fast game-state classification with hysteresis
+
+import cv2
+import numpy as np
+from config import (GAME_STATE_THUMBNAIL_SCALE, GAME_STATE_CONFIRM_FRAMES, GAME_STATE_DARK_FRACTION,
+                    GAME_STATE_BLACK_LEVEL, SCREEN_STATE_MAP)
+from capture_backends import GRAY_CONVERSIONS
+from frame_context import FrameContext
+from utils import dark_pixel_fraction
+
+
+class GameState:
+    """What the game is currently showing"""
+    PLAYING = 'PLAYING'
+    LEVEL_UP = 'LEVEL_UP'
+    PAUSED = 'PAUSED'
+    DEAD = 'DEAD'
+    MENU = 'MENU'
+    UNKNOWN = 'UNKNOWN'
+
+
+class GameStateClassifier:
+    """Decides the game state from cheap downsampled-frame statistics plus the screen library.
+
+    Per frame it looks at a thumbnail (GAME_STATE_THUMBNAIL_SCALE times
+    smaller, nearest-neighbour sampled) for its brightness and dark-pixel
+    fraction, and asks the screen library whether a known UI screen is up.
+    A new state only takes effect after GAME_STATE_CONFIRM_FRAMES consecutive
+    frames agree, so a single odd frame cannot flip the bot into or out of
+    gameplay.
+    """
+
+    def __init__(self, screen_library=None, confirm_frames=GAME_STATE_CONFIRM_FRAMES):
+        self.screen_library = screen_library
+        self.confirm_frames = confirm_frames
+        self.state = GameState.UNKNOWN
+        self.candidate = GameState.UNKNOWN
+        self.candidate_frames = 0
+        self.last_screen = None
+        self.last_stats = {}
+
+    def reset(self, state=GameState.UNKNOWN):
+        """Forget the current state, e.g. after the bot itself dismissed a screen"""
+        self.state = state
+        self.candidate = state
+        self.candidate_frames = 0
+
+    def _thumbnail_gray(self, context):
+        scale = GAME_STATE_THUMBNAIL_SCALE
+        height, width = context.shape
+
+        def compute(dst):
+            small = context.scratch(dst.shape + context.image.shape[2:])
+            cv2.resize(context.image, (width // scale, height // scale), dst=small, interpolation=cv2.INTER_NEAREST)
+            cv2.cvtColor(small, GRAY_CONVERSIONS[context.channel_order], dst=dst)
+        return context.derived('state_thumbnail_gray', (height // scale, width // scale), np.uint8, compute)
+
+    def classify_frame(self, image):
+        """Raw (un-smoothed) state of a single frame"""
+        context = image if isinstance(image, FrameContext) else FrameContext(image)
+        gray = self._thumbnail_gray(context)
+        mean = cv2.mean(gray)[0]  # ndarray.mean() allocates a float buffer
+        dark = dark_pixel_fraction(gray, dst=context.scratch(gray.shape))
+        self.last_stats = {'mean': mean, 'dark_fraction': dark}
+
+        if mean < GAME_STATE_BLACK_LEVEL:
+            # Fade to black: loading or a scene transition
+            return GameState.UNKNOWN
+
+        self.last_screen = self.screen_library.classify(context) if self.screen_library else None
+        if self.last_screen and self.last_screen.label:
+            return SCREEN_STATE_MAP.get(self.last_screen.label, GameState.UNKNOWN)
+
+        if dark > GAME_STATE_DARK_FRACTION:
+            # Dimmed overlay we have no template for. Without a level-up
+            # template this is the old fallback heuristic for the level-up screen.
+            has_level_up_template = (self.screen_library is not None and 'level_up' in self.screen_library.entries)
+            return GameState.UNKNOWN if has_level_up_template else GameState.LEVEL_UP
+        return GameState.PLAYING
+
+    def update(self, image):
+        """Classify a frame and return the hysteresis-filtered game state"""
+        observed = self.classify_frame(image)
+        if observed == self.state:
+            self.candidate, self.candidate_frames = observed, 0
+            return self.state
+
+        if observed == self.candidate:
+            self.candidate_frames += 1
+        else:
+            self.candidate, self.candidate_frames = observed, 1
+        if self.candidate_frames >= self.confirm_frames:
+            self.state = observed
+            self.candidate_frames = 0
+        return self.state
@@ -0,0 +1,109 @@
+# level_up_handler.py - Non-blocking level-up handling driven by the game-state check
+
+import time
+
+from config import LEVEL_UP_KEY_SETTLE, LEVEL_UP_RETRY_INTERVAL, LEVEL_UP_MAX_RETRIES, LEVEL_UP_TIMEOUT
+from game_state import GameState
+from utils import log_action
+
+
+class LevelUpHandler:
+    """Selects an upgrade without sleeping through the level-up overlay.
+
+    Instead of fixed waits, ``update`` is called once per captured frame with
+    the current game state and advances a small state machine:
+
+    IDLE -> SETTLING    level-up confirmed; movement keys released
+    SETTLING -> WAITING after LEVEL_UP_KEY_SETTLE seconds the selection is sent
+    WAITING -> IDLE     the state check no longer sees the overlay
+
+    While waiting, the selection is re-sent every LEVEL_UP_RETRY_INTERVAL
+    seconds (at most LEVEL_UP_MAX_RETRIES times) in case the key press was
+    lost, and the handler gives up after LEVEL_UP_TIMEOUT seconds so the bot
+    never stays frozen. Each transition's duration is kept in ``durations``.
+    """
+
+    IDLE = 'IDLE'
+    SETTLING = 'SETTLING'
+    WAITING = 'WAITING'
+
+    def __init__(self, player_controller, state_classifier, key_settle=LEVEL_UP_KEY_SETTLE,
+                 retry_interval=LEVEL_UP_RETRY_INTERVAL, max_retries=LEVEL_UP_MAX_RETRIES,
+                 timeout=LEVEL_UP_TIMEOUT):
+        self.player_controller = player_controller
+        self.state_classifier = state_classifier
+        self.key_settle = key_settle
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.phase = self.IDLE
+        self.started_at = None
+        self.last_sent_at = None
+        self.retries = 0
+        self.durations = []  # Seconds from level-up detection to gameplay, per level-up
+        self.timeouts = 0
+
+    @property
+    def active(self):
+        """True while a level-up is being handled (gameplay should not be steered)"""
+        return self.phase != self.IDLE
+
+    def _send_selection(self, now):
+        self.player_controller.confirm_upgrade()
+        self.last_sent_at = now
+
+    def _finish(self, now, timed_out=False):
+        duration = now - self.started_at
+        self.durations.append(duration)
+        self.phase = self.IDLE
+        if timed_out:
+            self.timeouts += 1
+            # Let the classifier re-decide from scratch instead of trusting a stale LEVEL_UP
+            self.state_classifier.reset()
+            log_action("LEVEL_UP", f"Overlay still up after {duration:.2f}s, resuming anyway")
+        else:
+            log_action("LEVEL_UP", f"Upgrade selected, back in game after {duration:.2f}s "
+                                   f"({self.retries} retries)")
+
+    def update(self, state, now=None):
+        """Advance the state machine for one frame; returns True while the level-up is in progress"""
+        now = time.monotonic() if now is None else now
+
+        if self.phase == self.IDLE:
+            if state != GameState.LEVEL_UP:
+                return False
+            print(f"🆙 Selecting upgrade: option 1")
+            self.player_controller.move_player('stop')
+            self.phase = self.SETTLING
+            self.started_at = now
+            self.retries = 0
+
+        if self.phase == self.SETTLING:
+            if now - self.started_at < self.key_settle:
+                return True
+            self._send_selection(now)
+            self.phase = self.WAITING
+            return True
+
+        # WAITING: the overlay is gone once the state check settles on anything else
+        if state != GameState.LEVEL_UP:
+            self._finish(now)
+            return False
+        if now - self.started_at >= self.timeout:
+            self._finish(now, timed_out=True)
+            return False
+        if now - self.last_sent_at >= self.retry_interval and self.retries < self.max_retries:
+            self.retries += 1
+            self._send_selection(now)
+        return True
+
+    def get_stats(self):
+        """Level-up count, timeouts and transition durations (seconds)"""
+        durations = self.durations
+        return {
+            'count': len(durations),
+            'timeouts': self.timeouts,
+            'mean': sum(durations) / len(durations) if durations else 0.0,
+            'max': max(durations) if durations else 0.0,
+        }
@@ -5,18 +5,35 @@ import keyboard
 import time
 import threading
 import sys
+import os
 
 from screen_analyzer import ScreenAnalyzer
+from frame_grabber import FrameGrabber
+from session_recorder import SessionRecorder
+from game_state import GameState, GameStateClassifier
+from level_up_handler import LevelUpHandler
+from tracker import TrackedDetector
 from player_controller_keyboard import PlayerControllerKeyboard
 from decision_maker_enhanced import DecisionMakerEnhanced
 from utils import log_action
+from config import RECORD_SESSION_DIR
 
 class GameBot:
     def __init__(self):
         self.running = True
         self.screen_analyzer = ScreenAnalyzer()
+        self.frame_grabber = FrameGrabber(self.screen_analyzer.get_capture_backend())
+        self.recorder = None
+        if RECORD_SESSION_DIR:
+            session_path = os.path.join(RECORD_SESSION_DIR, time.strftime("session_%Y%m%d_%H%M%S"))
+            self.recorder = SessionRecorder(session_path, channel_order=self.frame_grabber.channel_order)
+            log_action("RECORD", f"Recording session to {session_path}")
         self.player_controller = PlayerControllerKeyboard()  # Using keyboard library
         self.decision_maker = DecisionMakerEnhanced()  # Using enhanced AI
+        self.state_classifier = GameStateClassifier(self.screen_analyzer.screen_library)
+        self.tracked_detector = TrackedDetector(self.screen_analyzer)
+        self.level_up_handler = LevelUpHandler(self.player_controller, self.state_classifier)
+        self.game_state = GameState.UNKNOWN
         self.loop_count = 0
         
         # Set up kill switch
@@ -61,39 +78,53 @@ class GameBot:
         # Automatic countdown
         self.countdown_and_focus(5)
         
+        # Capture runs on its own thread so grabbing overlaps with analysis
+        self.frame_grabber.start()
+        
         try:
             while self.running:
                 self.loop_count += 1
                 
                 try:
-                    # Capture the game screen
-                    game_screen = self.screen_analyzer.capture_game_screen()
+                    # Pick up the newest captured frame (older ones are dropped)
+                    frame = self.frame_grabber.get_latest(timeout=1.0)
                     
-                    if game_screen is None:
+                    if frame is None:
                         log_action("ERROR", "Failed to capture screen")
-                        time.sleep(1)
+                        continue
+                    game_screen = frame.image
+                    if self.recorder:
+                        self.recorder.record_frame(game_screen, frame.timestamp)
+                    
+                    # Cheap game-state check first; full detection only runs during gameplay
+                    context = self.screen_analyzer.begin_frame(game_screen, self.frame_grabber.channel_order)
+                    state = self.state_classifier.update(context)
+                    if state != self.game_state:
+                        log_action("STATE", f"{self.game_state} -> {state}")
+                        self.game_state = state
+                    
+                    # Level-up: send the selection and keep polling frames until the overlay is gone
+                    if self.level_up_handler.update(state):
+                        self.tracked_detector.reset()
                         continue
                     
-                    # Analyze the current game state
-                    player, enemies = self.screen_analyzer.analyze_screen(game_screen)
-                    experience_shards = self.screen_analyzer.detect_experience_shards(game_screen)
+                    if state != GameState.PLAYING:
+                        # Paused, dead, on a menu or unsure: don't steer blindly
+                        self.player_controller.move_player('stop')
+                        self.tracked_detector.reset()
+                        continue
                     
-                    # Check for level-up screen
-                    if self.screen_analyzer.detect_level_up_screen(game_screen):
-                        print(f"🆙 Selecting upgrade: option 1")
-                        
-                        # Actually select the upgrade using keyboard controls
-                        self.player_controller.select_upgrade()
-                        
-                        # Wait a bit for level-up screen to disappear
-                        time.sleep(2)
-                        continue  # Skip the rest of the loop while level-up screen is handled
+                    # Full detection every FULL_DETECTION_STRIDE frames, tracking in between
+                    tracked = self.tracked_detector.process(context, frame.timestamp)
+                    player, enemies, experience_shards = tracked.player, tracked.enemies, tracked.shards
                     
-                    # Make smart decisions
+                    # Make smart decisions (tracked enemies carry their velocities)
                     move_direction = self.decision_maker.decide_movement(player, enemies, experience_shards)
                     
                     # Control the player character
                     self.player_controller.move_player(move_direction)
+                    if self.recorder:
+                        self.recorder.record_command(move_direction)
                     
                     # Detailed logging every 30 loops
                     if self.loop_count % 30 == 1:
@@ -102,12 +133,19 @@ class GameBot:
                     
                     # Brief status every 100 loops
                     if self.loop_count % 100 == 0:
-                        status = f"Loop {self.loop_count} | Direction: {move_direction}"
+                        stats = self.frame_grabber.get_stats()
+                        latency_ms = (time.monotonic() - frame.timestamp) * 1000
+                        status = (f"Loop {self.loop_count} | Direction: {move_direction} | "
+                                  f"Frame latency: {latency_ms:.0f}ms | "
+                                  f"Dropped: {stats['dropped']}/{stats['captured']} | "
+                                  f"Full detections: {self.tracked_detector.full_detections}/"
+                                  f"{self.tracked_detector.full_detections + self.tracked_detector.tracked_frames} | "
+                                  f"Player search: {self.screen_analyzer.last_player_search}")
+                        change_detector = self.screen_analyzer.change_detector(context)
+                        if change_detector:
+                            status += f" | Dirty tiles: {change_detector.dirty_fraction:.0%}"
                         log_action("STATUS", status)
                     
-                    # Small delay to prevent excessive CPU usage
-                    time.sleep(0.1)
-                    
                 except Exception as e:
                     log_action("ERROR", f"Error in main loop: {str(e)}")
                     time.sleep(0.5)
@@ -120,6 +158,19 @@ class GameBot:
     def cleanup(self):
         """Clean up resources before exit"""
         log_action("CLEANUP", "Cleaning up...")
+        self.frame_grabber.stop()
+        if self.screen_analyzer.ocr_pool:
+            self.screen_analyzer.ocr_pool.shutdown()
+        if self.screen_analyzer.tiled_detector:
+            self.screen_analyzer.tiled_detector.shutdown()
+        level_ups = self.level_up_handler.get_stats()
+        if level_ups['count']:
+            log_action("LEVEL_UP", f"{level_ups['count']} level-ups, avg {level_ups['mean']:.2f}s, "
+                                   f"max {level_ups['max']:.2f}s, {level_ups['timeouts']} timed out")
+        if self.recorder:
+            self.recorder.close()
+            log_action("RECORD", f"Saved {self.recorder.frames_recorded} frames "
+                                 f"({self.recorder.frames_skipped} skipped) to {self.recorder.path}")
         self.player_controller.emergency_stop()
         keyboard.unhook_all()
         print("🛑 Smart bot stopped successfully.")
@@ -0,0 +1,167 @@
+# ocr_worker.py - Background OCR of upgrade cards with warm engines and a perceptual-hash cache
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import cv2
+import numpy as np
+from config import OCR_WORKERS, OCR_CACHE_SIZE, OCR_HASH_TOLERANCE, UPGRADE_KEYWORDS
+from capture_backends import GRAY_CONVERSIONS
+from frame_context import FrameContext
+
+
+def dhash(gray, hash_size=8):
+    """64-bit difference hash of a grayscale image (robust to small brightness/scale changes)"""
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def parse_upgrade_text(text):
+    """Pick the likely upgrade name out of raw OCR text, or None"""
+    for line in (line.strip() for line in text.split('\n')):
+        # Look for lines that might be upgrade names
+        if 3 < len(line) < 50 and any(keyword in line.lower() for keyword in UPGRADE_KEYWORDS):
+            return line
+    return None
+
+
+class _TesserocrEngine:
+    """In-process tesseract instance that stays loaded between calls"""
+
+    def __init__(self):
+        from tesserocr import PyTessBaseAPI, PSM
+        self.api = PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+
+    def read(self, binary):
+        height, width = binary.shape
+        self.api.SetImageBytes(binary.tobytes(), width, height, 1, width)
+        return self.api.GetUTF8Text()
+
+    def close(self):
+        self.api.End()
+
+
+class _PytesseractEngine:
+    """Fallback that spawns a tesseract process per call"""
+
+    def __init__(self):
+        import pytesseract
+        self.pytesseract = pytesseract
+
+    def read(self, binary):
+        return self.pytesseract.image_to_string(binary, config='--psm 6')
+
+    def close(self):
+        pass
+
+
+def _create_engine():
+    try:
+        return _TesserocrEngine()
+    except ImportError:
+        return _PytesseractEngine()
+
+
+class OCRWorkerPool:
+    """Runs OCR for upgrade cards on worker threads.
+
+    Each worker thread keeps its own tesseract engine alive (tesserocr when
+    installed, otherwise pytesseract), so cards are read in parallel without
+    start-up cost. Results are cached by the dHash of the card image: a card
+    seen before (within OCR_HASH_TOLERANCE differing bits) resolves
+    immediately without running OCR again, and one that is still being
+    read shares the running request's Future.
+    """
+
+    def __init__(self, max_workers=OCR_WORKERS, cache_size=OCR_CACHE_SIZE, hash_tolerance=OCR_HASH_TOLERANCE):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="OCRWorker")
+        self.cache_size = cache_size
+        self.hash_tolerance = hash_tolerance
+        self._cache = OrderedDict()
+        self._pending = {}  # hash: Future of the OCR running for it
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = []
+        self._engines_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _engine(self):
+        engine = getattr(self._local, 'engine', None)
+        if engine is None:
+            engine = _create_engine()
+            self._local.engine = engine
+            with self._engines_lock:
+                self._engines.append(engine)
+        return engine
+
+    def _find(self, table, card_hash):
+        """Key of table equal to card_hash or within hash_tolerance bits of it, or None (hold the lock)"""
+        if card_hash in table:
+            return card_hash
+        if self.hash_tolerance:
+            for key in table:
+                if bin(key ^ card_hash).count('1') <= self.hash_tolerance:
+                    return key
+        return None
+
+    def _store(self, card_hash, text):
+        with self._cache_lock:
+            self._cache[card_hash] = text
+            self._cache.move_to_end(card_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _read_card(self, gray, card_hash):
+        try:
+            binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            text = self._engine().read(binary)
+            self._store(card_hash, text)
+            return text
+        finally:
+            with self._cache_lock:
+                self._pending.pop(card_hash, None)
+
+    def _card_future(self, gray, card_hash):
+        """Future for one card: resolved from the cache, shared with an OCR already running, or new"""
+        with self._cache_lock:
+            key = self._find(self._cache, card_hash)
+            if key is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            key = self._find(self._pending, card_hash)
+            if key is not None:
+                # The same card is being read right now: wait for that result
+                self.cache_hits += 1
+                return self._pending[key]
+            self.cache_misses += 1
+            future = self.executor.submit(self._read_card, gray, card_hash)
+            self._pending[card_hash] = future
+            return future
+
+    def read_cards(self, image, regions):
+        """Start OCR of each {'left', 'top', 'width', 'height'} card region; returns one Future per card.
+
+        Futures of cached cards are already resolved. Card pixels are copied
+        before this returns, so the frame buffer can be reused right away.
+        """
+        context = image if isinstance(image, FrameContext) else FrameContext(image)
+        futures = []
+        for region in regions:
+            crop = context.image[region['top']:region['top'] + region['height'],
+                                 region['left']:region['left'] + region['width']]
+            gray = cv2.cvtColor(crop, GRAY_CONVERSIONS[context.channel_order])
+            futures.append(self._card_future(gray, dhash(gray)))
+        return futures
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        with self._engines_lock:
+            for engine in self._engines:
+                engine.close()
+            self._engines = []
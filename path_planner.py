@@ -0,0 +1,361 @@
+# path_planner.py - Grid path planning around enemies: A* to a point and an incremental flow field to shards
+
+import heapq
+import math
+import time
+
+import numpy as np
+from config import (SAFE_DISTANCE_FROM_ENEMIES, PATH_PLANNER_CELL_SIZE, PATH_BLOCK_DISTANCE, PATH_DANGER_WEIGHT,
+                    PATH_DANGER_LEVELS, PATH_BLOCK_COST, PATH_PLANNER_BUDGET_MS, PATH_LOOKAHEAD_CELLS, PATH_REPLAN_FRACTION)
+
+INF = float('inf')
+SQRT2 = math.sqrt(2)
+NEIGHBOUR_STEPS = [(-1, -1, SQRT2), (-1, 0, 1.0), (-1, 1, SQRT2), (0, -1, 1.0),
+                   (0, 1, 1.0), (1, -1, SQRT2), (1, 0, 1.0), (1, 1, SQRT2)]
+
+
+_neighbour_cache = {}
+
+
+def grid_neighbours(shape):
+    """Per flat cell index, the (neighbour index, step length) pairs of its 8-neighbourhood (shared per shape)"""
+    if shape not in _neighbour_cache:
+        rows, cols = shape
+        _neighbour_cache[shape] = [[((r + dr) * cols + c + dc, length) for dr, dc, length in NEIGHBOUR_STEPS
+                                    if 0 <= r + dr < rows and 0 <= c + dc < cols]
+                                   for r in range(rows) for c in range(cols)]
+    return _neighbour_cache[shape]
+
+
+class PathPlanner:
+    """Plans movement over a coarse cost grid built from the DangerField.
+
+    Each planner cell covers several danger field cells and takes their
+    smallest enemy distance. Within SAFE_DISTANCE_FROM_ENEMIES the cost of
+    entering a cell rises in PATH_DANGER_LEVELS steps up to
+    1 + PATH_DANGER_WEIGHT; cells closer than PATH_BLOCK_DISTANCE cost
+    PATH_BLOCK_COST, so they are crossed only to get out of a swarm that
+    already surrounds the player, and a shard route that would cross one
+    is reported as no route. Quantizing the cost means enemies drifting a
+    few pixels usually leave the grid unchanged.
+
+    Two searches share the grid:
+
+    * ``find_path`` - A* from a point to one target (used for escapes).
+    * ``flow_waypoint`` - a multi-goal cost-to-go field over all goal
+      cells, kept with D* Lite: it searches backwards from the goals, so
+      when the player moves, a few cells change cost or a goal comes or
+      goes, only the affected part of the search is repaired.
+
+    Both stop at the per-frame deadline set by ``begin_frame``. An
+    unfinished flow field resumes next frame. ``path_waypoint`` reports no
+    route when A* ran out of time or its path enters a blocked cell, unless
+    asked for a way out of danger (escapes), which takes the path to the
+    explored cell closest to the target.
+    """
+
+    def __init__(self, cell_size=PATH_PLANNER_CELL_SIZE, block_distance=PATH_BLOCK_DISTANCE,
+                 danger_weight=PATH_DANGER_WEIGHT, danger_levels=PATH_DANGER_LEVELS, block_cost=PATH_BLOCK_COST,
+                 budget_ms=PATH_PLANNER_BUDGET_MS, lookahead_cells=PATH_LOOKAHEAD_CELLS, replan_fraction=PATH_REPLAN_FRACTION):
+        self.cell_size = cell_size
+        self.block_distance = block_distance
+        self.danger_weight = danger_weight
+        self.danger_levels = danger_levels
+        self.block_cost = block_cost
+        self.budget = budget_ms / 1000
+        self.lookahead_cells = lookahead_cells
+        self.replan_fraction = replan_fraction
+        self.shape = None
+        self.margin = 0
+        self.cost_grid = None     # Cost of entering each cell
+        self.distance_grid = None  # Pixels to the nearest enemy per cell
+        self.deadline = INF
+        self.full_replans = 0
+        self.repairs = 0
+        self.expansions = 0
+
+    # Grid ------------------------------------------------------------------
+
+    def _cell(self, point):
+        """Flat index of the cell containing a pixel point (clamped to the grid)"""
+        rows, cols = self.shape
+        col = min(cols - 1, max(0, int((point[0] + self.margin) // self.cell_size)))
+        row = min(rows - 1, max(0, int((point[1] + self.margin) // self.cell_size)))
+        return row * cols + col
+
+    def _center(self, index):
+        """Pixel centre of a cell"""
+        row, col = divmod(index, self.shape[1])
+        half = self.cell_size / 2
+        return (col * self.cell_size + half - self.margin, row * self.cell_size + half - self.margin)
+
+    def _h(self, a, b):
+        """Octile distance in cells: admissible since every step costs at least its length"""
+        cols = self.shape[1]
+        dr = abs(a // cols - b // cols)
+        dc = abs(a % cols - b % cols)
+        return max(dr, dc) + (SQRT2 - 1) * min(dr, dc)
+
+    def _costs_from_field(self, field, distance, cost):
+        """Per-cell enemy distance (min over the covered field cells) and quantized entry cost, into buffers"""
+        factor = self.cell_size // field.cell_size
+        rows, cols = distance.shape
+        blocks = field.distance[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor)
+        np.min(blocks, axis=(1, 3), out=distance)
+        # Danger level: ceil(levels * (safe - d) / safe), clipped to 0..levels
+        np.subtract(SAFE_DISTANCE_FROM_ENEMIES, distance, out=cost)
+        cost *= self.danger_levels / SAFE_DISTANCE_FROM_ENEMIES
+        np.clip(cost, 0, self.danger_levels, out=cost)
+        np.ceil(cost, out=cost)
+        cost *= self.danger_weight / self.danger_levels
+        cost += 1
+        np.less(distance, self.block_distance, out=self._blocked)
+        cost[self._blocked] = self.block_cost
+
+    def begin_frame(self, field, now=None):
+        """Take this frame's danger field and start the planning budget"""
+        now = time.perf_counter() if now is None else now
+        self.deadline = now + self.budget
+        factor = self.cell_size // field.cell_size
+        if factor < 1 or factor * field.cell_size != self.cell_size:
+            raise ValueError("PATH_PLANNER_CELL_SIZE must be a multiple of DANGER_FIELD_CELL_SIZE")
+        shape = (field.shape[0] // factor, field.shape[1] // factor)
+        if self.shape != shape or self.margin != field.margin:
+            self.shape = shape
+            self.margin = field.margin
+            self.neighbours = grid_neighbours(shape)
+            self.distance_grid = np.empty(shape, dtype=np.float32)
+            self.cost_grid = np.empty(shape, dtype=np.float32)
+            self._previous_cost = np.empty(shape, dtype=np.float32)
+            self._changed = np.empty(shape, dtype=bool)
+            self._blocked = np.empty(shape, dtype=bool)
+            self._cost_list = None
+            self._unsearched = [INF] * (shape[0] * shape[1])
+            self.g = self.rhs = None
+
+        # Double-buffered so this frame's costs can be diffed against the last
+        self.cost_grid, self._previous_cost = self._previous_cost, self.cost_grid
+        self._costs_from_field(field, self.distance_grid, self.cost_grid)
+        if self._cost_list is not None:
+            np.not_equal(self._previous_cost, self.cost_grid, out=self._changed)
+            changed = np.flatnonzero(self._changed)
+        if self._cost_list is None or len(changed) > self.replan_fraction * self.cost_grid.size:
+            # Cells share one float object per cost level instead of one each
+            flat = self.cost_grid.ravel()
+            levels = np.unique(flat)
+            costs = levels.tolist()
+            self._cost_list = [costs[level] for level in np.searchsorted(levels, flat).tolist()]
+            self._reset_search()
+        else:
+            costs = self._cost_list
+            for cell, value in zip(changed.tolist(), self.cost_grid.ravel()[changed].tolist()):
+                costs[cell] = value
+            self._cost_changes.extend(changed.tolist())
+
+    # A* ------------------------------------------------------------------------
+
+    def find_path(self, start, target):
+        """Cell-centre waypoints from start towards target (pixels), cheapest first"""
+        cells, _ = self._search(start, target)
+        return [self._center(cell) for cell in cells]
+
+    def _search(self, start, target):
+        """A* cells from start towards target, and whether the search reached target"""
+        cost = self._cost_list
+        source, goal = self._cell(start), self._cell(target)
+        g = {source: 0.0}
+        parent = {source: None}
+        heap = [(self._h(source, goal), 0.0, source)]
+        closest, closest_h = source, self._h(source, goal)
+        expanded = 0
+        while heap:
+            if expanded % 32 == 0 and time.perf_counter() > self.deadline:
+                break
+            _, cost_so_far, u = heapq.heappop(heap)
+            if cost_so_far > g[u]:
+                continue  # Stale entry
+            expanded += 1
+            h = self._h(u, goal)
+            if h < closest_h:
+                closest, closest_h = u, h
+            if u == goal:
+                break
+            for v, length in self.neighbours[u]:
+                candidate = g[u] + length * cost[v]
+                if candidate < g.get(v, INF):
+                    g[v] = candidate
+                    parent[v] = u
+                    heapq.heappush(heap, (candidate + self._h(v, goal), candidate, v))
+        self.expansions += expanded
+
+        reached = goal in parent
+        end = goal if reached else closest
+        cells = []
+        while end is not None:
+            cells.append(end)
+            end = parent[end]
+        return cells[::-1], reached
+
+    def path_waypoint(self, start, target, through_danger=False):
+        """Point a few cells along the A* path to target, or None.
+
+        None also when the search did not reach target in time or the path
+        enters a cell within PATH_BLOCK_DISTANCE of an enemy, unless
+        through_danger is set (escaping a swarm: any way out beats none).
+        """
+        cells, reached = self._search(start, target)
+        if len(cells) < 2:
+            return None
+        if not through_danger:
+            cost = self._cost_list
+            if not reached or any(cost[cell] >= self.block_cost for cell in cells[1:]):
+                return None
+        return self._center(cells[min(self.lookahead_cells, len(cells) - 1)])
+
+    def safest_point(self, point, radius):
+        """Centre of the reachable-looking cell farthest from enemies within radius of point"""
+        rows, cols = self.shape
+        index = self._cell(point)
+        row, col = divmod(index, cols)
+        reach = int(radius // self.cell_size)
+        top, left = max(0, row - reach), max(0, col - reach)
+        window = self.distance_grid[top:row + reach + 1, left:col + reach + 1]
+        # Prefer the nearest among equally safe cells
+        r, c = np.mgrid[top:top + window.shape[0], left:left + window.shape[1]]
+        score = np.minimum(window, 2 * SAFE_DISTANCE_FROM_ENEMIES) - np.hypot(r - row, c - col) * 1e-3
+        best = int(np.argmax(score))
+        return self._center((top + best // window.shape[1]) * cols + left + best % window.shape[1])
+
+    # D* Lite flow field ----------------------------------------------------------
+
+    def _reset_search(self):
+        # Refill the lists in place: a restart allocates no per-cell objects
+        if self.g is None:
+            self.g, self.rhs = list(self._unsearched), list(self._unsearched)
+        else:
+            self.g[:] = self._unsearched
+            self.rhs[:] = self._unsearched
+        self.goals = set()
+        self.heap = []
+        self.queued = {}  # cell: key currently valid in the heap
+        self.km = 0.0
+        self.start = None
+        self._cost_changes = []
+        self.full_replans += 1
+
+    def _key(self, index):
+        best = min(self.g[index], self.rhs[index])
+        return (best + self._h(self.start, index) + self.km, best)
+
+    def _update_vertex(self, u):
+        if u not in self.goals:
+            cost, g = self._cost_list, self.g
+            best = INF
+            for v, length in self.neighbours[u]:
+                candidate = length * cost[v] + g[v]
+                if candidate < best:
+                    best = candidate
+            self.rhs[u] = best
+        if self.g[u] != self.rhs[u]:
+            key = self._key(u)
+            self.queued[u] = key
+            heapq.heappush(self.heap, (key[0], key[1], u))
+        else:
+            self.queued.pop(u, None)
+
+    def _compute(self):
+        """Expand cells until the start is consistent (or provably has no route
+        cheaper than PATH_BLOCK_COST); False if the deadline cut it short"""
+        heap, g, rhs, start = self.heap, self.g, self.rhs, self.start
+        expanded = 0
+        finished = True
+        while heap:
+            k1, k2, u = heap[0]
+            if self.queued.get(u) != (k1, k2):
+                heapq.heappop(heap)  # Stale entry
+                continue
+            if (k1, k2) >= self._key(start) and rhs[start] == g[start]:
+                break
+            if k1 - self.km >= self.block_cost:
+                break  # Every route still to be found would cross an enemy
+            if expanded % 32 == 0 and time.perf_counter() > self.deadline:
+                finished = False
+                break
+            expanded += 1
+            heapq.heappop(heap)
+            key = self._key(u)
+            if (k1, k2) < key:
+                self.queued[u] = key
+                heapq.heappush(heap, (key[0], key[1], u))
+                continue
+            del self.queued[u]
+            if g[u] > rhs[u]:
+                g[u] = rhs[u]
+            else:
+                g[u] = INF
+                self._update_vertex(u)
+            for v, _ in self.neighbours[u]:
+                self._update_vertex(v)
+        self.expansions += expanded
+        return finished
+
+    def set_goals(self, start, goals):
+        """Move the search start and goal set, repair the field for this frame's changes, then search"""
+        start_cell = self._cell(start)
+        goal_cells = {self._cell(goal) for goal in goals}
+        goal_cells = {cell for cell in goal_cells if self._cost_list[cell] < self.block_cost}
+
+        if self.start is not None and start_cell != self.start:
+            self.km += self._h(self.start, start_cell)
+        self.start = start_cell
+
+        affected = set()
+        g = self.g
+        for cell in self._cost_changes:
+            # The cost of entering a cell changes the edges into it, i.e. its
+            # neighbours' rhs, but only if the search has reached the cell
+            if g[cell] != INF:
+                affected.update(v for v, _ in self.neighbours[cell])
+        self._cost_changes = []
+        for cell in self.goals - goal_cells:
+            self.goals.discard(cell)
+            affected.add(cell)
+        for cell in goal_cells - self.goals:
+            self.goals.add(cell)
+            self.rhs[cell] = 0.0
+            affected.add(cell)
+        if affected:
+            self.repairs += 1
+        for cell in affected:
+            self._update_vertex(cell)
+        return self._compute()
+
+    def flow_waypoint(self, start, goals):
+        """Point a few cells down the cost-to-go field from start towards the cheapest goal, or None"""
+        if not goals:
+            return None
+        if not self.set_goals(start, goals):
+            return None  # Repair unfinished: g may still lead to old goals
+        cell = self.start
+        if min(self.g[cell], self.rhs[cell]) >= self.block_cost:
+            return None  # Only through enemies
+        cost, g = self._cost_list, self.g
+        for _ in range(self.lookahead_cells):
+            if cell in self.goals:
+                break
+            step, best = None, INF
+            for v, length in self.neighbours[cell]:
+                candidate = length * cost[v] + g[v]
+                if candidate < best:
+                    step, best = v, candidate
+            if step is None:
+                break
+            cell = step
+        if cell == self.start:
+            return None
+        return self._center(cell)
+
+    @property
+    def cost_to_go(self):
+        """Flow field as a grid (inf where not yet known), for debug rendering"""
+        return np.array(self.g).reshape(self.shape)
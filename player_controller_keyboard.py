@@ -95,6 +95,14 @@ class PlayerControllerKeyboard:
         pyautogui.click(x, y)
         time.sleep(0.5)  # Wait for click to register
     
+    def confirm_upgrade(self):
+        """Press Enter on the level-up screen without waiting for it to close"""
+        try:
+            self._release_all_keys()
+            kb.press_and_release('enter')
+        except Exception as e:
+            print(f"❌ Error selecting upgrade: {e}")
+    
     def select_upgrade(self):
         """Select the default upgrade option by pressing Enter."""
         try:
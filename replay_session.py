@@ -0,0 +1,119 @@
+# replay_session.py - Run a recorded session through the analyzer and decision maker offline
+
+import argparse
+import contextlib
+import os
+import time
+
+import numpy as np
+from screen_analyzer import ScreenAnalyzer
+from decision_maker_enhanced import DecisionMakerEnhanced
+from session_recorder import ReplayCapture
+from game_state import GameState, GameStateClassifier
+from tracker import TrackedDetector
+
+
+def _summarize(name, samples):
+    if not samples:
+        return f"{name:<10} no samples"
+    ms = np.asarray(samples) * 1000
+    return f"{name:<10} mean {ms.mean():7.2f}ms | p95 {np.percentile(ms, 95):7.2f}ms | max {ms.max():7.2f}ms"
+
+
+def replay_session(path, realtime=False, speed=1.0, verbose=False, stride=1):
+    """Replay a session and report per-stage timing and agreement with the recorded commands.
+
+    With stride > 1 detection goes through the TrackedDetector (full detection
+    every stride frames, tracking in between) and is timed as 'track'.
+    """
+    capture = ReplayCapture(path, realtime=realtime, speed=speed)
+    analyzer = ScreenAnalyzer(capture)
+    decision_maker = DecisionMakerEnhanced()
+    state_classifier = GameStateClassifier(analyzer.screen_library)
+    tracked_detector = TrackedDetector(analyzer, stride) if stride > 1 else None
+    timings = {'capture': [], 'state': [], 'analyze': [], 'shards': [], 'track': [], 'decide': []}
+    states = {}
+    matches = compared = 0
+
+    print(f"▶️ Replaying {capture.frame_count} frames from {path}")
+    # The detectors and decision maker print on every frame; keep the report readable
+    # (discarded, not buffered: a long replay would otherwise hold all of it in memory)
+    devnull = None if verbose else open(os.devnull, 'w')
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)
+
+    while True:
+        start = time.perf_counter()
+        frame = analyzer.capture_native_frame()
+        if frame is None:
+            break
+        timings['capture'].append(time.perf_counter() - start)
+
+        with output:
+            start = time.perf_counter()
+            context = analyzer.begin_frame(frame, capture.channel_order)
+            state = state_classifier.update(context)
+            timings['state'].append(time.perf_counter() - start)
+            states[state] = states.get(state, 0) + 1
+            if state != GameState.PLAYING:
+                if tracked_detector:
+                    tracked_detector.reset()
+                continue
+
+            if tracked_detector:
+                start = time.perf_counter()
+                tracked = tracked_detector.process(context, capture.timestamp)
+                timings['track'].append(time.perf_counter() - start)
+                player, enemies, shards = tracked.player, tracked.enemies, tracked.shards
+            else:
+                start = time.perf_counter()
+                player, enemies = analyzer.analyze_screen(context, capture.timestamp)
+                timings['analyze'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                shards = analyzer.detect_experience_shards(context)
+                timings['shards'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            direction = decision_maker.decide_movement(player, enemies, shards)
+            timings['decide'].append(time.perf_counter() - start)
+
+        recorded = capture.commands_for_frame()
+        if recorded:
+            compared += 1
+            matches += direction == recorded[-1]
+    if devnull is not None:
+        devnull.close()
+
+    print("=" * 60)
+    print("States: " + ", ".join(f"{state} {count}" for state, count in sorted(states.items())))
+    unused = ('analyze', 'shards') if tracked_detector else ('track',)
+    for name, samples in timings.items():
+        if name not in unused:
+            print(_summarize(name, samples))
+    searches = analyzer.player_search_counts
+    print("Player search: " + ", ".join(f"{path} {count}" for path, count in searches.items()))
+    change_detector = analyzer.tiled_detector.change_detector if analyzer.tiled_detector else None
+    if change_detector:
+        print(f"Dirty tiles: mean {change_detector.get_stats()['mean_dirty_fraction']:.1%} | "
+              f"reused results: {analyzer.reused_results}")
+    if compared:
+        # Random fallbacks in the decision maker mean 100% is not expected
+        print(f"Decisions matching recording: {matches}/{compared} ({matches / compared:.1%})")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded bot session offline")
+    parser.add_argument('session', help="Session directory written by SessionRecorder")
+    parser.add_argument('--realtime', action='store_true', help="Play back at recorded speed")
+    parser.add_argument('--speed', type=float, default=1.0, help="Playback speed multiplier with --realtime")
+    parser.add_argument('--stride', type=int, default=1,
+                        help="Run full detection every N frames and track objects in between")
+    parser.add_argument('--verbose', action='store_true', help="Show analyzer and decision output")
+    args = parser.parse_args()
+    replay_session(args.session, realtime=args.realtime, speed=args.speed, verbose=args.verbose,
+                   stride=args.stride)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# rollout_planner.py - Anytime movement planner: simulates short rollouts of 8 directions plus stay until a deadline
+
+import time
+
+import numpy as np
+from config import (GAME_REGION, SAFE_DISTANCE_FROM_ENEMIES, ROLLOUT_DEADLINE_MS, ROLLOUT_HORIZON, ROLLOUT_STEPS,
+                    ROLLOUT_SEGMENTS, ROLLOUT_PLAYER_SPEED, ROLLOUT_HIT_DISTANCE, ROLLOUT_PICKUP_DISTANCE,
+                    ROLLOUT_XP_WEIGHT, ROLLOUT_BATCH_SIZE)
+
+# Moves in the order ties are broken. Cardinal moves use the names
+# move_player() knows, diagonals the (dx, dy) tuples it presses two keys for.
+ACTIONS = ['up', 'down', 'left', 'right', (-1, -1), (1, -1), (-1, 1), (1, 1), 'stop']
+ACTION_VECTORS = np.array([(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1), (0, 0)],
+                          dtype=np.float64)
+ACTION_VECTORS[4:8] /= np.sqrt(2)
+DISCOUNT = 0.95  # Per step: near-term margins and shards count a little more than later ones
+
+
+class RolloutPlanner:
+    """Chooses a move by simulating short futures instead of a priority cascade.
+
+    A plan is ROLLOUT_SEGMENTS actions, each held for an equal share of
+    ROLLOUT_STEPS steps over ROLLOUT_HORIZON seconds. Enemies move along
+    their tracked velocities and the player at ROLLOUT_PLAYER_SPEED, so a
+    batch of plans is one array computation. A plan scores its survival
+    margin (distance to the closest enemy, up to SAFE_DISTANCE_FROM_ENEMIES,
+    as 0..1, averaged over the steps with near steps weighted more) plus
+    ROLLOUT_XP_WEIGHT per shard passed within ROLLOUT_PICKUP_DISTANCE; a plan that comes within ROLLOUT_HIT_DISTANCE
+    of an enemy scores below every surviving plan, higher the later the hit.
+
+    Planning is anytime. The 9 constant plans and last frame's best plan
+    (frames are much shorter than a segment) are always scored. Then, while the deadline
+    allows, two-part plans for the most promising first moves, then random
+    changes to the best plan so far. plan() returns the first move of the
+    best plan found when time runs out.
+    """
+
+    def __init__(self, deadline_ms=ROLLOUT_DEADLINE_MS, horizon=ROLLOUT_HORIZON, steps=ROLLOUT_STEPS,
+                 segments=ROLLOUT_SEGMENTS, player_speed=ROLLOUT_PLAYER_SPEED, hit_distance=ROLLOUT_HIT_DISTANCE,
+                 pickup_distance=ROLLOUT_PICKUP_DISTANCE, xp_weight=ROLLOUT_XP_WEIGHT, batch_size=ROLLOUT_BATCH_SIZE,
+                 width=GAME_REGION['width'], height=GAME_REGION['height'], seed=0):
+        if steps % segments:
+            raise ValueError("ROLLOUT_STEPS must be a multiple of ROLLOUT_SEGMENTS")
+        self.budget = deadline_ms / 1000
+        self.segments = segments
+        self.segment_steps = steps // segments
+        self.dt = horizon / steps
+        self.player_speed = player_speed
+        self.hit_distance = hit_distance
+        self.pickup_distance = pickup_distance
+        self.xp_weight = xp_weight
+        self.batch_size = batch_size
+        self.bounds = np.array([width, height], dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+        self.times = self.dt * np.arange(1, steps + 1)
+        self.discounts = DISCOUNT ** np.arange(steps)
+        self.margin_weights = self.discounts / self.discounts.sum()
+        self.best_plan = None   # Action indices of the last chosen plan
+        self.best_score = None
+        self.rollouts = 0       # Plans scored in the last call
+        self.stages = 0         # Last refinement stage reached in the last call
+
+    def _prepare(self, player_pos, enemies, velocities, shards):
+        """Enemy trajectories and shards that a rollout can get near, as arrays"""
+        self.start = np.asarray(player_pos, dtype=np.float64)
+        reach = self.player_speed * self.times[-1]
+        centers = enemies.centers.astype(np.float64)
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+        # An enemy matters if it can end up within the safe distance of anywhere the player can reach
+        speeds = np.sqrt((velocities * velocities).sum(axis=1))
+        offsets = centers - self.start
+        near = np.sqrt((offsets * offsets).sum(axis=1)) <= reach + speeds * self.times[-1] + SAFE_DISTANCE_FROM_ENEMIES
+        # (steps, enemies, 2) positions at the end of every step
+        self.enemy_paths = centers[near] + self.times[:, None, None] * velocities[near]
+        shard_centers = shards.centers.astype(np.float64)
+        offsets = shard_centers - self.start
+        self.shards = shard_centers[(offsets * offsets).sum(axis=1) <= (reach + self.pickup_distance) ** 2]
+
+    def _evaluate(self, plans):
+        """Score of each plan, a (count, segments) array of action indices"""
+        moves = np.repeat(ACTION_VECTORS[plans], self.segment_steps, axis=1) * (self.player_speed * self.dt)
+        positions = np.clip(self.start + np.cumsum(moves, axis=1), 0, self.bounds)  # (plans, steps, 2)
+        steps = positions.shape[1]
+        self.rollouts += len(plans)
+
+        alive = np.ones(positions.shape[:2], dtype=bool)
+        scores = np.ones(len(plans))
+        if self.enemy_paths.shape[1]:
+            gaps = positions[:, :, None, :] - self.enemy_paths[None]
+            closest = np.sqrt((gaps * gaps).sum(axis=3).min(axis=2))  # (plans, steps)
+            hit = closest < self.hit_distance
+            dead = hit.any(axis=1)
+            hit_step = np.where(dead, hit.argmax(axis=1), steps)
+            alive = np.arange(steps) < hit_step[:, None]
+            margins = np.minimum(closest, SAFE_DISTANCE_FROM_ENEMIES) / SAFE_DISTANCE_FROM_ENEMIES
+            scores = margins @ self.margin_weights
+            scores[dead] = hit_step[dead] / steps - 1
+
+        if len(self.shards):
+            gaps = positions[:, :, None, :] - self.shards[None, None]
+            reached = ((gaps * gaps).sum(axis=3) < self.pickup_distance ** 2) & alive[:, :, None]
+            # Each shard counts once, discounted by the step it is first reached
+            collected = reached.any(axis=1)
+            xp = (collected * self.discounts[reached.argmax(axis=1)]).sum(axis=1)
+            scores += np.where(scores >= 0, self.xp_weight * xp, 0)
+        return scores
+
+    def _consider(self, plans):
+        scores = self._evaluate(plans)
+        best = int(np.argmax(scores))
+        if self.best_score is None or scores[best] > self.best_score:
+            self.best_score = float(scores[best])
+            self.best_plan = plans[best].copy()
+        return scores
+
+    def plan(self, player_pos, enemies, shards, velocities=None, now=None):
+        """Best first move found before the deadline: a move_player() direction"""
+        now = time.perf_counter() if now is None else now
+        deadline = now + self.budget
+        self._prepare(player_pos, enemies, enemies.velocities if velocities is None else velocities, shards)
+        previous = self.best_plan
+        self.best_plan, self.best_score = None, None
+        self.rollouts = 0
+        self.stages = 1
+
+        # Stage 1, always run: hold each move for the whole horizon
+        segments, count = self.segments, len(ACTIONS)
+        constant = np.repeat(np.arange(count)[:, None], segments, axis=1)
+        if previous is not None:
+            constant = np.vstack((constant, previous[None]))
+        first_scores = self._consider(constant)[:count]
+
+        # Stage 2: switch moves halfway, most promising first moves first
+        half = segments // 2
+        self.stages = 2
+        for first in np.argsort(-first_scores, kind='stable'):
+            if time.perf_counter() > deadline:
+                return ACTIONS[self.best_plan[0]]
+            plans = np.empty((count, segments), dtype=np.intp)
+            plans[:, :half] = first
+            plans[:, half:] = np.arange(count)[:, None]
+            self._consider(plans)
+
+        # Stage 3: random changes to the best plan (a new move from a random segment on, or in one segment)
+        self.stages = 3
+        columns = np.arange(segments)
+        while time.perf_counter() <= deadline:
+            size = self.batch_size
+            changed_from = self.rng.integers(0, segments, size)
+            new_moves = self.rng.integers(0, count, size)
+            suffix = self.rng.random(size) < 0.5
+            mask = np.where(suffix[:, None], columns >= changed_from[:, None], columns == changed_from[:, None])
+            self._consider(np.where(mask, new_moves[:, None], self.best_plan[None]))
+        return ACTIONS[self.best_plan[0]]
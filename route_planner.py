@@ -0,0 +1,179 @@
+# route_planner.py - Orders visible and remembered shards into a short collection tour, repaired frame to frame
+
+import numpy as np
+from config import ROUTE_MAX_SHARDS, ROUTE_SHARD_MEMORY, ROUTE_PICKUP_DISTANCE, ROUTE_REBUILD_FRACTION
+
+KEY_GRID = 8  # Untracked shards are identified by their position rounded to this many pixels
+# A shard under a new key this close to a remembered one not seen this frame
+# is that shard again (tracker reset, new track id, or a box that moved a cell)
+REKEY_DISTANCE = 12
+
+
+def _distance_matrix(points):
+    offsets = points[:, None, :] - points[None, :, :]
+    return np.sqrt((offsets * offsets).sum(axis=2))
+
+
+def two_opt(distances, order, fixed=1):
+    """Improve an open path by segment reversals that leave its first fixed nodes alone; returns (order, moves).
+
+    distances covers every node plus a final free "end" node (distance 0
+    to everything), which lets the path end anywhere. Each round scores
+    every reversal with one array expression and applies the best one.
+    """
+    order = np.asarray(order)
+    count = len(order)
+    if count < fixed + 2:
+        return order, 0
+    i, j = np.triu_indices(count, k=1)
+    keep = i >= fixed
+    i, j = i[keep], j[keep]
+    moves = 0
+    for _ in range(count * count):
+        path = np.append(order, len(distances) - 1)
+        d = distances[path[:, None], path[None, :]]
+        # Reversing path[i..j] swaps edges (i-1, i) and (j, j+1) for (i-1, j) and (i, j+1)
+        delta = d[i - 1, j] + d[i, j + 1] - d[i - 1, i] - d[j, j + 1]
+        best = int(np.argmin(delta))
+        if delta[best] >= -1e-6:
+            break
+        order[i[best]:j[best] + 1] = order[i[best]:j[best] + 1][::-1].copy()
+        moves += 1
+    return order, moves
+
+
+class RoutePlanner:
+    """A shard collection tour that survives from frame to frame.
+
+    observe() keeps a memory of shards: tracked shards by track id, others
+    by position. A key seen for the first time within REKEY_DISTANCE of a
+    remembered shard that was not seen this frame takes that shard over,
+    also on the tour, so a tracker reset does not duplicate shards. A shard
+    that goes out of sight stays remembered for
+    ROUTE_SHARD_MEMORY frames unless the player gets within
+    ROUTE_PICKUP_DISTANCE of it (collected). plan() orders the usable
+    remembered shards (at most ROUTE_MAX_SHARDS, nearest first) into an
+    open path from the player.
+
+    The tour is repaired rather than rebuilt: shards that are gone or no
+    longer usable are cut out, new ones are put in at their cheapest
+    insertion point, and 2-opt then polishes the result, which usually
+    takes zero or one move. The first stop stays first while it is on the
+    tour, so the player does not turn back and forth between two shards.
+    Only when there is no tour yet or more than ROUTE_REBUILD_FRACTION of
+    the stops are new is it built from scratch (nearest neighbour, then
+    2-opt).
+    """
+
+    def __init__(self, max_shards=ROUTE_MAX_SHARDS, memory=ROUTE_SHARD_MEMORY, pickup_distance=ROUTE_PICKUP_DISTANCE,
+                 rebuild_fraction=ROUTE_REBUILD_FRACTION):
+        self.max_shards = max_shards
+        self.memory = memory
+        self.pickup_distance = pickup_distance
+        self.rebuild_fraction = rebuild_fraction
+        self.remembered = {}  # key: [x, y, frames unseen]
+        self.keys = []
+        self.positions = np.empty((0, 2))
+        self.tour = []        # Keys in visiting order
+        self.rebuilds = 0
+        self.repairs = 0
+        self.two_opt_moves = 0
+
+    def observe(self, player_pos, shards):
+        """Update the shard memory with this frame's Detections; returns the remembered positions"""
+        for entry in self.remembered.values():
+            entry[2] += 1
+        renamed = {}
+        for (x, y), track_id in zip(shards.centers.tolist(), shards.track_ids.tolist()):
+            key = track_id if track_id >= 0 else ('at', x // KEY_GRID, y // KEY_GRID)
+            if key not in self.remembered:
+                old_key = self._same_shard(x, y)
+                if old_key is not None:
+                    del self.remembered[old_key]
+                    renamed[old_key] = key
+            self.remembered[key] = [x, y, 0]
+        if renamed:
+            self.tour = [renamed.get(key, key) for key in self.tour]
+
+        player = np.asarray(player_pos, dtype=np.float64)
+        limit = self.pickup_distance * self.pickup_distance
+        for key, (x, y, unseen) in list(self.remembered.items()):
+            collected = unseen > 0 and (x - player[0]) ** 2 + (y - player[1]) ** 2 < limit
+            if collected or unseen > self.memory:
+                del self.remembered[key]
+
+        self.keys = list(self.remembered)
+        self.positions = np.array([self.remembered[key][:2] for key in self.keys], dtype=np.float64).reshape(-1, 2)
+        return self.positions
+
+    def _same_shard(self, x, y):
+        """Key of the closest remembered shard within REKEY_DISTANCE not yet seen this frame, or None"""
+        best_key, best = None, REKEY_DISTANCE * REKEY_DISTANCE
+        for key, (other_x, other_y, unseen) in self.remembered.items():
+            distance = (other_x - x) ** 2 + (other_y - y) ** 2
+            if unseen > 0 and distance <= best:
+                best_key, best = key, distance
+        return best_key
+
+    def plan(self, player_pos, usable=None):
+        """Tour stops (array of x, y, in visiting order) over the remembered shards where usable is True"""
+        player = np.asarray(player_pos, dtype=np.float64)
+        candidates = np.arange(len(self.keys)) if usable is None else np.flatnonzero(usable)
+        if len(candidates) > self.max_shards:
+            offsets = self.positions[candidates] - player
+            nearest = np.argpartition((offsets * offsets).sum(axis=1), self.max_shards - 1)[:self.max_shards]
+            candidates = candidates[nearest]
+        if len(candidates) == 0:
+            self.tour = []
+            return np.empty((0, 2))
+
+        index_of = {self.keys[index]: node for node, index in enumerate(candidates.tolist(), start=1)}
+        # Nodes: 0 = player, 1..n = shards, n + 1 = free end of the open path
+        points = np.vstack((player, self.positions[candidates]))
+        distances = np.zeros((len(points) + 1, len(points) + 1))
+        distances[:-1, :-1] = _distance_matrix(points)
+        kept = [index_of[key] for key in self.tour if key in index_of]
+        added = sorted(set(index_of.values()) - set(kept))
+        # Keep heading for the stop the player is already walking to while it is still on the tour
+        fixed = 2 if self.tour and self.tour[0] in index_of else 1
+        if not kept or len(added) > self.rebuild_fraction * len(index_of):
+            order = self._nearest_neighbour(distances)
+            fixed = 1
+            self.rebuilds += 1
+        else:
+            order = [0] + kept
+            for node in added:
+                order = self._insert(distances, order, node, fixed)
+            if added or len(kept) < len(self.tour):
+                self.repairs += 1
+        order, moves = two_opt(distances, order, fixed)
+        self.two_opt_moves += moves
+
+        keys = [self.keys[index] for index in candidates.tolist()]
+        self.tour = [keys[node - 1] for node in order[1:].tolist()]
+        return points[order[1:]]
+
+    def _nearest_neighbour(self, distances):
+        """Greedy path from the player: always the closest unvisited shard next"""
+        unvisited = np.ones(len(distances) - 1, dtype=bool)
+        unvisited[0] = False
+        order = [0]
+        while unvisited.any():
+            row = np.where(unvisited, distances[order[-1], :-1], np.inf)
+            order.append(int(np.argmin(row)))
+            unvisited[order[-1]] = False
+        return order
+
+    def _insert(self, distances, order, node, fixed=1):
+        """order with node placed where it adds the least length, not before the first fixed nodes"""
+        path = np.asarray(order)
+        following = np.append(path[1:], len(distances) - 1)  # The free end after the last stop
+        added = distances[path, node] + distances[node, following] - distances[path, following]
+        position = int(np.argmin(added[fixed - 1:])) + fixed
+        return order[:position] + [node] + order[position:]
+
+    def tour_length(self, player_pos):
+        """Length in pixels of the current tour from player_pos"""
+        points = [player_pos] + [self.remembered[key][:2] for key in self.tour if key in self.remembered]
+        points = np.asarray(points, dtype=np.float64)
+        return float(np.sqrt(((points[1:] - points[:-1]) ** 2).sum(axis=1)).sum())
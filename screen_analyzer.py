@@ -1,170 +1,260 @@
 # screen_analyzer.py - Screen capture and analysis using OpenCV and numpy
 
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 import cv2
 import numpy as np
-import pyautogui
-from config import GAME_REGION, PLAYER_COLOR_RANGE, ENEMY_COLOR_RANGES, XP_GEM_COLOR_RANGE, MIN_CONTOUR_AREA
+from config import (PLAYER_COLOR_RANGE, ENEMY_COLOR_RANGES, XP_GEM_COLOR_RANGE, MIN_CONTOUR_AREA,
+                    CAPTURE_BACKEND, CAPTURE_FILE_SOURCE, LEVEL_UP_TEMPLATE_PATH, LEVEL_UP_TEMPLATE_REGION,
+                    LEVEL_UP_SEARCH_MARGIN, LEVEL_UP_MATCH_THRESHOLD, LEVEL_UP_PYRAMID_LEVELS,
+                    UPGRADE_CARD_REGIONS, OCR_TIMEOUT, PLAYER_SEARCH_MARGIN, FOVEATED_DETECTION,
+                    TILED_DETECTION, TILED_WORKERS, CHANGE_DETECTION)
+from capture_backends import create_capture_backend, BGR_CONVERSIONS
+from frame_context import FrameContext
+from color_classifier import ColorClassifier
+from blob_extractor import extract_blobs, boxes_to_corners
+from detections import Detections
+from spatial_index import non_max_suppression, dedupe_points
+from template_matcher import TemplateMatcher
+from screen_library import ScreenLibrary
+from utils import dark_pixel_fraction
+from ocr_worker import OCRWorkerPool, parse_upgrade_text
+from foveated_detector import FoveatedEnemyDetector
+from tiled_detector import TiledDetector
+
+# Every colour the detectors look for, labelled together in one LUT pass
+COLOR_CLASSES = {'player': PLAYER_COLOR_RANGE}
+COLOR_CLASSES.update({f'enemy_{name}': color_range for name, color_range in ENEMY_COLOR_RANGES.items()})
+COLOR_CLASSES['xp_gem'] = XP_GEM_COLOR_RANGE
 
 class ScreenAnalyzer:
 
+    def __init__(self, capture_backend=None):
+        self.capture_backend = capture_backend
+        self.frame_context = FrameContext()
+        self.color_classifier = ColorClassifier(COLOR_CLASSES)
+        # Optional: full-frame segmentation spread over tiles on worker threads,
+        # and/or only re-run on the tiles that changed since the last frame
+        self.tiled_detector = None
+        if TILED_DETECTION or CHANGE_DETECTION:
+            self.tiled_detector = TiledDetector(self.color_classifier, workers=TILED_WORKERS if TILED_DETECTION else 1,
+                                                incremental=CHANGE_DETECTION)
+        self._unchanged_results = {}  # name: (change generation, result)
+        self.reused_results = 0
+        self.level_up_matcher = TemplateMatcher(
+            LEVEL_UP_TEMPLATE_PATH, search_region=LEVEL_UP_TEMPLATE_REGION, search_margin=LEVEL_UP_SEARCH_MARGIN,
+            threshold=LEVEL_UP_MATCH_THRESHOLD, pyramid_levels=LEVEL_UP_PYRAMID_LEVELS)
+        self._warned_missing_template = False
+        self.screen_library = ScreenLibrary()
+        self.ocr_pool = None  # Started on first use
+        # Player search state: last box, per-frame motion and which search path found it
+        self.last_player = None
+        self.player_motion = (0, 0)
+        self.last_player_search = None  # 'roi', 'full' or 'miss'
+        self.player_search_counts = {'roi': 0, 'full': 0, 'miss': 0}
+        # Enemies near the player every frame, further out less often
+        self.foveated_detector = FoveatedEnemyDetector(self) if FOVEATED_DETECTION else None
+        self._warned_missing_ocr = False
+
+    def get_capture_backend(self):
+        """Return the capture backend, creating the configured one on first use"""
+        if self.capture_backend is None:
+            kwargs = {'path': CAPTURE_FILE_SOURCE} if CAPTURE_BACKEND in ('file', 'replay') else {}
+            self.capture_backend = create_capture_backend(CAPTURE_BACKEND, **kwargs)
+        return self.capture_backend
+
     def capture_game_screen(self):
-        # Capture the screen region defined in the configuration
-        screenshot = pyautogui.screenshot(region=(GAME_REGION['left'], GAME_REGION['top'], GAME_REGION['width'], GAME_REGION['height']))
-        screenshot = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-        return screenshot
+        """Capture the screen region defined in the configuration as a new BGR image"""
+        backend = self.get_capture_backend()
+        frame = backend.grab()
+        if frame is None:
+            return None
+        if backend.channel_order == 'BGR':
+            return frame.copy()  # Backends may reuse their buffer on the next grab
+        return cv2.cvtColor(frame, BGR_CONVERSIONS[backend.channel_order])
 
-    def analyze_screen(self, image):
-        # Identify player and enemies on screen
-        player = self._detect_player(image)
-        enemies = self._detect_enemies(image)
-        return player, enemies
+    def capture_native_frame(self):
+        """Capture in the backend's own channel order, without conversion or copy.
 
-    def _detect_player(self, image):
-        # Convert image to HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        player_mask = cv2.inRange(hsv, PLAYER_COLOR_RANGE['lower'], PLAYER_COLOR_RANGE['upper'])
-        contours, _ = cv2.findContours(player_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-        for contour in contours:
-            if cv2.contourArea(contour) > MIN_CONTOUR_AREA:
-                x, y, w, h = cv2.boundingRect(contour)
-                return (x, y, w, h)
+        Fast path for the frame loop: pass the frame to begin_frame() with
+        native_channel_order. The backend may overwrite it on the next grab.
+        """
+        return self.get_capture_backend().grab()
+
+    @property
+    def native_channel_order(self):
+        """Channel order of capture_native_frame() results ('BGR', 'RGB' or 'BGRA')"""
+        return self.get_capture_backend().channel_order
+
+    def begin_frame(self, image, channel_order='BGR'):
+        """Start analysis of a new frame; pass the returned context to every detector.
+
+        Images are BGR like cv2.imread and capture_game_screen() give; pass
+        channel_order for frames straight from a capture backend.
+        """
+        return self.frame_context.reset(image, channel_order)
+
+    def _context(self, image):
+        # Detectors accept a FrameContext (shared conversions) or a raw image.
+        # A raw image always starts a fresh frame: ring buffers reuse arrays,
+        # so the same object can hold different pixels from one call to the next.
+        if isinstance(image, FrameContext):
+            return image
+        return self.begin_frame(image)
+
+    def change_detector(self, context):
+        """The tile change detector for this frame size, or None when change detection is off"""
+        if self.tiled_detector is None or not self.tiled_detector.incremental:
+            return None
+        self.tiled_detector.prepare(context.shape)
+        return self.tiled_detector.change_detector
+
+    def _reusable(self, context, name):
+        """Previous result of a detector if no tile changed since it was computed, else None"""
+        change_detector = self.change_detector(context)
+        if change_detector is None:
+            return None
+        change_detector.update(context)
+        cached = self._unchanged_results.get(name)
+        if cached is not None and cached[0] == change_detector.generation:
+            self.reused_results += 1
+            return cached[1]
         return None
 
+    def _remember(self, context, name, result):
+        change_detector = self.change_detector(context)
+        if change_detector is not None:
+            self._unchanged_results[name] = (change_detector.generation, result)
+        return result
+
+    def analyze_screen(self, image, timestamp=None):
+        # Identify player and enemies on screen; timestamp is the frame's capture time (seconds)
+        context = self._context(image)
+        cached = self._reusable(context, 'analysis')
+        if cached is not None:
+            # Nothing on screen changed since the last analysis
+            return cached
+        player = self._detect_player(context)
+        if self.foveated_detector:
+            # Enemies from rings that were not due this frame carry their age in seconds
+            enemies = self.foveated_detector.detect(context, player, timestamp)
+        else:
+            enemies = self._detect_enemies(context)
+        return self._remember(context, 'analysis', (player, enemies))
+
+    def _blobs(self, context, class_name, min_area):
+        """Connected blobs of one colour class, reusing the context's label buffer"""
+        if self.tiled_detector:
+            return self.tiled_detector.blobs(context, class_name, min_area)
+        mask = self.color_classifier.mask(context, class_name)
+        labels = context.buffer('cc_labels', context.shape, np.int32)
+        return extract_blobs(mask, min_area, labels=labels)
+
+    def _nearest_blob(self, blobs, point, offset=(0, 0)):
+        """(x, y, w, h) of the blob whose centroid is closest to point, in frame coordinates"""
+        offsets = blobs.centroids + offset - point
+        nearest = int(np.argmin((offsets * offsets).sum(axis=1)))
+        x, y, w, h = blobs.boxes[nearest].tolist()
+        return (x + offset[0], y + offset[1], w, h)
+
+    def _detect_player(self, image):
+        """Find the player, searching a window around its predicted position first.
+
+        The window is the last box moved by the last frame-to-frame motion and
+        grown by PLAYER_SEARCH_MARGIN. Only when that misses (or on the first
+        frame) is the whole frame searched, and then the blob nearest the last
+        position (or the screen centre) wins rather than the first one found.
+        last_player_search records which path was taken.
+        """
+        context = self._context(image)
+        height, width = context.shape
+        player = None
+
+        if self.last_player is not None:
+            x, y, w, h = self.last_player
+            dx, dy = self.player_motion
+            left = max(0, x + dx - PLAYER_SEARCH_MARGIN)
+            top = max(0, y + dy - PLAYER_SEARCH_MARGIN)
+            right = min(width, x + dx + w + PLAYER_SEARCH_MARGIN)
+            bottom = min(height, y + dy + h + PLAYER_SEARCH_MARGIN)
+            if right > left and bottom > top:
+                mask = self.color_classifier.region_mask(context, ['player'], left, top, right, bottom)
+                blobs = extract_blobs(mask, MIN_CONTOUR_AREA, labels=context.scratch(mask.shape, np.int32))
+                if len(blobs.areas):
+                    player = self._nearest_blob(blobs, (x + dx + w / 2, y + dy + h / 2), (left, top))
+                    self.last_player_search = 'roi'
+
+        if player is None:
+            blobs = self._blobs(context, 'player', MIN_CONTOUR_AREA)
+            if len(blobs.areas):
+                if self.last_player is not None:
+                    x, y, w, h = self.last_player
+                    expected = (x + w / 2, y + h / 2)
+                else:
+                    expected = (width / 2, height / 2)
+                player = self._nearest_blob(blobs, expected)
+                self.last_player_search = 'full'
+            else:
+                self.last_player_search = 'miss'
+
+        self.player_search_counts[self.last_player_search] += 1
+        if player is not None and self.last_player is not None:
+            self.player_motion = (player[0] - self.last_player[0], player[1] - self.last_player[1])
+        else:
+            self.player_motion = (0, 0)
+        self.last_player = player
+        return player
+
     def _non_max_suppression(self, boxes, overlapThresh):
-        """Non-maximum suppression to merge overlapping bounding boxes."""
-        if len(boxes) == 0:
-            return []
-
-        # if the bounding boxes integers, convert them to floats --
-        # this is important since we'll be doing a bunch of divisions
-        if boxes.dtype.kind == "i":
-            boxes = boxes.astype("float")
-
-        # initialize the list of picked indexes	
-        pick = []
-
-        # grab the coordinates of the bounding boxes
-        x1 = boxes[:,0]
-        y1 = boxes[:,1]
-        x2 = boxes[:,2]
-        y2 = boxes[:,3]
-
-        # compute the area of the bounding boxes and sort the bounding
-        # boxes by the bottom-right y-coordinate of the bounding box
-        area = (x2 - x1 + 1) * (y2 - y1 + 1)
-        idxs = np.argsort(y2)
-
-        # keep looping while some indexes still remain in the indexes
-        # list
-        while len(idxs) > 0:
-            # grab the last index in the indexes list and add the
-            # index value to the list of picked indexes
-            last = len(idxs) - 1
-            i = idxs[last]
-            pick.append(i)
-
-            # find the largest (x, y) coordinates for the start of
-            # the bounding box and the smallest (x, y) coordinates
-            # for the end of the bounding box
-            xx1 = np.maximum(x1[i], x1[idxs[:last]])
-            yy1 = np.maximum(y1[i], y1[idxs[:last]])
-            xx2 = np.minimum(x2[i], x2[idxs[:last]])
-            yy2 = np.minimum(y2[i], y2[idxs[:last]])
-
-            # compute the width and height of the bounding box
-            w = np.maximum(0, xx2 - xx1 + 1)
-            h = np.maximum(0, yy2 - yy1 + 1)
-
-            # compute the ratio of overlap
-            overlap = (w * h) / area[idxs[:last]]
-
-            # delete all indexes from the index list that have
-            idxs = np.delete(idxs, np.concatenate(([last], np.where(overlap > overlapThresh)[0])))
-
-        # return only the bounding boxes that were picked using the
-        # integer data type
-        return boxes[pick].astype("int")
+        """Non-maximum suppression to merge overlapping bounding boxes (grid-indexed, near-linear)."""
+        return non_max_suppression(boxes, overlapThresh)
 
     def _detect_enemies(self, image):
-        # Convert image to HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        all_enemies = []
-
-        for color_name, color_range in ENEMY_COLOR_RANGES.items():
-            mask = cv2.inRange(hsv, color_range['lower'], color_range['upper'])
-            contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-            boxes = []
-            for contour in contours:
-                if cv2.contourArea(contour) > MIN_CONTOUR_AREA:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    boxes.append([x, y, x + w, y + h])
-            
-            boxes = np.array(boxes)
-            suppressed_boxes = self._non_max_suppression(boxes, 0.3)
+        context = self._context(image)
+        parts = []
 
-            for (startX, startY, endX, endY) in suppressed_boxes:
-                all_enemies.append((startX, startY, endX - startX, endY - startY))
+        for color_name in ENEMY_COLOR_RANGES:
+            class_name = f'enemy_{color_name}'
+            blobs = self._blobs(context, class_name, MIN_CONTOUR_AREA)
+            if len(blobs.areas) == 0:
+                continue
+            suppressed = self._non_max_suppression(boxes_to_corners(blobs.boxes), 0.3)
+            suppressed[:, 2:] -= suppressed[:, :2]
+            parts.append(Detections.from_boxes(suppressed, self.color_classifier.class_ids[class_name]))
+        all_enemies = Detections.concatenate(parts)
 
         # Filter out enemies that are too close to each other (likely duplicates)
-        final_enemies = []
-        for i, enemy1 in enumerate(all_enemies):
-            is_duplicate = False
-            for j, enemy2 in enumerate(final_enemies):
-                if i == j:
-                    continue
-                dist = np.linalg.norm(np.array(enemy1[:2]) - np.array(enemy2[:2]))
-                if dist < 20: # Minimum distance between enemies
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                final_enemies.append(enemy1)
-
-        return final_enemies
+        keep = dedupe_points(all_enemies.boxes[:, :2].tolist(), 20)  # Minimum distance between enemies
+        return all_enemies[np.asarray(keep, dtype=np.intp)]
     
     def detect_experience_shards(self, image):
         """Detect green experience shards on screen"""
-        # Convert image to HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        # Create mask for green experience shards
-        xp_mask = cv2.inRange(hsv, XP_GEM_COLOR_RANGE['lower'], XP_GEM_COLOR_RANGE['upper'])
-        contours, _ = cv2.findContours(xp_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
-        experience_shards = []
-        for contour in contours:
-            # Use smaller area threshold for experience shards
-            if cv2.contourArea(contour) > MIN_CONTOUR_AREA // 4:
-                x, y, w, h = cv2.boundingRect(contour)
-                experience_shards.append((x, y, w, h))
-        
-        return experience_shards
+        context = self._context(image)
+        cached = self._reusable(context, 'shards')
+        if cached is not None:
+            return cached
+        # Blobs of the XP gem colour class from the shared colour label image
+        # Use smaller area threshold for experience shards
+        blobs = self._blobs(context, 'xp_gem', MIN_CONTOUR_AREA // 4)
+        return self._remember(context, 'shards', Detections.from_blobs(blobs, self.color_classifier.class_ids['xp_gem']))
     
     def detect_level_up_screen(self, image):
         """Detect if the level-up screen is currently showing using template matching"""
+        context = self._context(image)
         try:
-            # Load the level-up template
-            import os
-            template_path = 'level_up_template.png'
-            
-            if not os.path.exists(template_path):
+            # Template is cached and only reloaded when the file changes
+            if not self.level_up_matcher.available:
                 # Fallback to old method if no template exists
-                print("⚠️ No level-up template found. Use 'python capture_level_up_template.py' to create one.")
-                return self._detect_level_up_fallback(image)
-            
-            template = cv2.imread(template_path, cv2.IMREAD_COLOR)
-            if template is None:
-                print("❌ Failed to load level-up template.")
-                return self._detect_level_up_fallback(image)
-            
-            # Perform template matching
-            result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                if not self._warned_missing_template:
+                    print("⚠️ No level-up template found. Use 'python capture_level_up_template.py' to create one.")
+                    self._warned_missing_template = True
+                return self._detect_level_up_fallback(context)
+            self._warned_missing_template = False
             
-            # Threshold for detection (adjust as needed)
-            threshold = 0.7
-            level_up_detected = max_val >= threshold
+            # Only the banner area around LEVEL_UP_TEMPLATE_REGION is searched
+            max_val, max_loc = self.level_up_matcher.match(context)
+            level_up_detected = max_val >= self.level_up_matcher.threshold
             
             if level_up_detected:
                 print(f"📈 LEVEL UP SCREEN DETECTED! (confidence: {max_val:.3f})")
@@ -173,62 +263,59 @@ class ScreenAnalyzer:
             
         except Exception as e:
             print(f"❌ Error in template matching: {e}")
-            return self._detect_level_up_fallback(image)
+            return self._detect_level_up_fallback(context)
+    
+    def detect_ui_screen(self, image):
+        """Identify which UI screen from the screen library is showing, if any (ScreenMatch)"""
+        return self.screen_library.classify(self._context(image))
     
     def _detect_level_up_fallback(self, image):
         """Fallback level-up detection method (less reliable)"""
-        # Convert to grayscale for easier detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        # Grayscale is shared with the other detectors through the frame context
+        gray = self._context(image).gray
         
         # Look for dark areas typical of level up overlay (more than 40% dark pixels)
-        dark_areas = cv2.threshold(gray, 50, 255, cv2.THRESH_BINARY_INV)[1]
-        dark_pixel_count = cv2.countNonZero(dark_areas)
-        total_pixels = gray.shape[0] * gray.shape[1]
-        
-        level_up_detected = (dark_pixel_count / total_pixels) > 0.4
+        level_up_detected = dark_pixel_fraction(gray) > 0.4
         
         if level_up_detected:
             print("📈 LEVEL UP SCREEN DETECTED! (fallback method - may be inaccurate)")
         
         return level_up_detected
     
-    def detect_upgrade_options(self, image):
-        """Detect and extract upgrade option text from level-up screen"""
-        try:
-            import pytesseract
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Enhance text contrast
-            enhanced = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-            
-            # Extract text from the image
-            text = pytesseract.image_to_string(enhanced, config='--psm 6')
-            
-            # Parse upgrade options (simple approach)
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
-            
-            # Filter for likely upgrade names (basic heuristic)
-            upgrade_options = []
-            for line in lines:
-                # Look for lines that might be upgrade names
-                if len(line) > 3 and len(line) < 50:  # Reasonable length
-                    if any(keyword in line.lower() for keyword in 
-                           ['damage', 'speed', 'health', 'attack', 'defense', 'magic', 'pierce', 'fire', 'ice']):
-                        upgrade_options.append(line)
-            
-            if not upgrade_options:
-                # Fallback: use simple placeholder names based on position
-                upgrade_options = ["Option 1", "Option 2", "Option 3"]
-            
-            print(f"🔍 Detected upgrades: {upgrade_options}")
-            return upgrade_options
-            
-        except ImportError:
-            print("⚠️ pytesseract not installed. Using position-based upgrade selection.")
-            # Fallback to position-based selection
-            return ["Option 1", "Option 2", "Option 3"]
-        except Exception as e:
-            print(f"❌ Error reading upgrade text: {e}")
-            return ["Option 1", "Option 2", "Option 3"]
+    def request_upgrade_options(self, image):
+        """Start OCR of the upgrade cards on the worker pool; returns one Future per card"""
+        if self.ocr_pool is None:
+            self.ocr_pool = OCRWorkerPool()
+        return self.ocr_pool.read_cards(self._context(image), UPGRADE_CARD_REGIONS)
+    
+    def collect_upgrade_options(self, futures, timeout=0):
+        """Upgrade names from request_upgrade_options, waiting up to timeout seconds in total"""
+        deadline = time.monotonic() + timeout
+        upgrade_options = []
+        for index, future in enumerate(futures):
+            # Fallback: use simple placeholder names based on position
+            name = f"Option {index + 1}"
+            try:
+                text = future.result(timeout=max(0, deadline - time.monotonic()))
+                name = parse_upgrade_text(text) or name
+            except FutureTimeoutError:
+                pass
+            except ImportError:
+                if not self._warned_missing_ocr:
+                    print("⚠️ pytesseract not installed. Using position-based upgrade selection.")
+                    self._warned_missing_ocr = True
+            except Exception as e:
+                print(f"❌ Error reading upgrade text: {e}")
+            upgrade_options.append(name)
+        return upgrade_options
+    
+    def detect_upgrade_options(self, image, timeout=OCR_TIMEOUT):
+        """Detect and extract upgrade option text from level-up screen.
+        
+        Each card is read in parallel on the OCR worker pool and cards seen
+        before come straight from the cache. Cards not read within timeout
+        fall back to position-based names.
+        """
+        upgrade_options = self.collect_upgrade_options(self.request_upgrade_options(image), timeout)
+        print(f"🔍 Detected upgrades: {upgrade_options}")
+        return upgrade_options
@@ -0,0 +1,174 @@
+# screen_library.py - Library of UI screen templates with signature-prefiltered matching
+
+import json
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from config import (SCREEN_TEMPLATE_DIR, SCREEN_SIGNATURE_SCALE, SCREEN_SIGNATURE_MIN_SCORE, SCREEN_MATCH_TOP_K,
+                    LEVEL_UP_TEMPLATE_PATH, LEVEL_UP_TEMPLATE_REGION, LEVEL_UP_SEARCH_MARGIN,
+                    LEVEL_UP_MATCH_THRESHOLD)
+from frame_context import FrameContext
+from template_matcher import TemplateMatcher
+
+MANIFEST_NAME = 'manifest.json'
+
+# label: best matching screen or None; confidence: full template match score
+ScreenMatch = namedtuple('ScreenMatch', ['label', 'confidence'])
+NO_SCREEN = ScreenMatch(None, 0.0)
+
+
+def _signature_score(patch, signature):
+    """Normalized cross-correlation of two small float patches (mean similarity if either is flat)"""
+    a = patch - patch.mean()
+    b = signature - signature.mean()
+    norm = np.sqrt((a * a).sum() * (b * b).sum())
+    if norm < 1e-3:
+        return 1.0 - abs(float(patch.mean()) - float(signature.mean())) / 255.0
+    return float((a * b).sum() / norm)
+
+
+class ScreenEntry:
+    """One screen in the library: a template, where it appears and how it is matched"""
+
+    def __init__(self, label, template_path, region, threshold=0.7, search_margin=LEVEL_UP_SEARCH_MARGIN):
+        self.label = label
+        self.region = region
+        self.matcher = TemplateMatcher(template_path, search_region=region, search_margin=search_margin,
+                                       threshold=threshold, name=label)
+        self._signature = None
+        self._signature_mtime = None
+
+    def signature_size(self, scale):
+        return (max(1, self.region['width'] // scale), max(1, self.region['height'] // scale))
+
+    def signature(self, scale):
+        """Downscaled grayscale template, rebuilt whenever the template file changes"""
+        if not self.matcher.available:
+            return None
+        if self._signature is None or self._signature_mtime != self.matcher.template_mtime:
+            gray = cv2.cvtColor(self.matcher.templates[0], cv2.COLOR_BGR2GRAY)
+            self._signature = cv2.resize(gray, self.signature_size(scale), interpolation=cv2.INTER_AREA).astype(np.float32)
+            self._signature_mtime = self.matcher.template_mtime
+        return self._signature
+
+    def frame_signature(self, context, scale):
+        """The same downscaled view of this entry's region in the current frame"""
+        region = self.region
+        left, top = region['left'], region['top']
+        right, bottom = left + region['width'], top + region['height']
+        height, width = context.shape
+        if left < 0 or top < 0 or right > width or bottom > height:
+            return None
+        patch = context.gray_region(left, top, right, bottom)
+        return cv2.resize(patch, self.signature_size(scale), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class ScreenLibrary:
+    """Recognizes UI screens (level-up, chest, game over, pause, menu...) in one cheap pass.
+
+    Entries live in a directory with a manifest.json mapping each label to its
+    template file, screen region and threshold. Every entry first compares a
+    small grayscale thumbnail of its region of the frame (SCREEN_SIGNATURE_SCALE
+    times smaller) against the same thumbnail of its template. Only the top few
+    entries above SCREEN_SIGNATURE_MIN_SCORE get a full template match, so in
+    normal gameplay (nothing resembles a UI screen) no matchTemplate runs at all.
+    The manifest is reloaded when its mtime changes, checked at most every
+    ``check_interval`` seconds.
+    """
+
+    def __init__(self, directory=SCREEN_TEMPLATE_DIR, signature_scale=SCREEN_SIGNATURE_SCALE,
+                 min_signature_score=SCREEN_SIGNATURE_MIN_SCORE, top_k=SCREEN_MATCH_TOP_K, check_interval=1.0):
+        self.directory = directory
+        self.signature_scale = signature_scale
+        self.min_signature_score = min_signature_score
+        self.top_k = top_k
+        self.check_interval = check_interval
+        self.entries = {}
+        self.last_candidates = []
+        self._manifest_mtime = None
+        self._last_check = None
+        self.load()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'screens': {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def load(self):
+        """(Re)load entries from the manifest"""
+        manifest = self._read_manifest()
+        self.entries = {}
+        for label, spec in manifest['screens'].items():
+            self.entries[label] = ScreenEntry(label, os.path.join(self.directory, spec['template']),
+                                              spec['region'], spec.get('threshold', 0.7))
+        # Templates captured before the library existed keep working
+        if 'level_up' not in self.entries and os.path.exists(LEVEL_UP_TEMPLATE_PATH):
+            self.entries['level_up'] = ScreenEntry('level_up', LEVEL_UP_TEMPLATE_PATH,
+                                                   LEVEL_UP_TEMPLATE_REGION, LEVEL_UP_MATCH_THRESHOLD)
+        self._manifest_mtime = self._stat_manifest()
+        self._last_check = time.monotonic()
+
+    def _stat_manifest(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        # Called every frame: only touch the filesystem every check_interval seconds
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._stat_manifest() != self._manifest_mtime:
+            self.load()
+
+    def add_entry(self, label, template, region, threshold=0.7):
+        """Save a BGR template image for label and register it in the manifest"""
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"{label}.png"
+        cv2.imwrite(os.path.join(self.directory, filename), template)
+        manifest = self._read_manifest()
+        manifest['screens'][label] = {'template': filename, 'region': dict(region), 'threshold': threshold}
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.load()
+
+    def candidates(self, image):
+        """Entries ranked by signature similarity, best first, as (score, label)"""
+        context = image if isinstance(image, FrameContext) else FrameContext(image)
+        scored = []
+        for label, entry in self.entries.items():
+            signature = entry.signature(self.signature_scale)
+            if signature is None:
+                continue
+            patch = entry.frame_signature(context, self.signature_scale)
+            if patch is None:
+                continue
+            scored.append((_signature_score(patch, signature), label))
+        scored.sort(reverse=True)
+        return scored
+
+    def classify(self, image):
+        """Best matching screen as ScreenMatch(label, confidence); NO_SCREEN during normal gameplay"""
+        self._reload_if_changed()
+        context = image if isinstance(image, FrameContext) else FrameContext(image)
+        scored = self.candidates(context)
+        self.last_candidates = [(score, label) for score, label in scored[:self.top_k]
+                                if score >= self.min_signature_score]
+
+        best = NO_SCREEN
+        for _, label in self.last_candidates:
+            matcher = self.entries[label].matcher
+            result = matcher.match(context)
+            if result is not None and result[0] >= matcher.threshold and result[0] > best.confidence:
+                best = ScreenMatch(label, result[0])
+        return best
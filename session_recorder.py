@@ -0,0 +1,250 @@
+# session_recorder.py - Record live sessions to disk and replay them as a capture source
+
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from capture_backends import CaptureBackend
+from config import GAME_REGION, SESSION_CHUNK_SIZE, SESSION_PNG_COMPRESSION
+
+# Session layout (one directory per session):
+#   session.json     - manifest: region, channel order, frame shape, chunk list
+#   chunk_00000.npz  - 'data' (PNG-encoded frames back to back), 'offsets'
+#                      (N+1 byte offsets into data) and 'timestamps' (N seconds
+#                      since the first frame)
+#   commands.jsonl   - one {"t", "frame", "direction"} record per move_player call
+SESSION_FORMAT_VERSION = 1
+MANIFEST_NAME = 'session.json'
+COMMANDS_NAME = 'commands.jsonl'
+
+
+def _chunk_name(index):
+    return f"chunk_{index:05d}.npz"
+
+
+class SessionRecorder:
+    """Writes captured frames, their timestamps and issued commands to a session directory.
+
+    Frames are copied and handed to a writer thread that PNG-encodes them
+    (lossless, so replays reproduce detections exactly) and flushes one
+    chunk file every ``chunk_size`` frames. If the writer falls behind the
+    frame is skipped rather than stalling the bot.
+    """
+
+    def __init__(self, path, channel_order='BGR', region=None,
+                 chunk_size=SESSION_CHUNK_SIZE, compression=SESSION_PNG_COMPRESSION):
+        self.path = path
+        self.channel_order = channel_order
+        self.region = dict(region or GAME_REGION)
+        self.chunk_size = chunk_size
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+
+        self.frames_recorded = 0
+        self.frames_skipped = 0
+        self._first_timestamp = None
+        self._frame_shape = None
+        self._chunks = []
+        self._queue = queue.Queue(maxsize=chunk_size * 2)
+        self._commands_file = open(os.path.join(path, COMMANDS_NAME), 'w')
+        self._commands_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="SessionRecorder", daemon=True)
+        self._writer.start()
+
+    def _relative_time(self, timestamp):
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+        return timestamp - self._first_timestamp
+
+    def record_frame(self, image, timestamp=None):
+        """Queue a frame for writing; returns its index in the session or None if skipped"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._frame_shape is None:
+            self._frame_shape = image.shape
+        try:
+            self._queue.put_nowait((image.copy(), self._relative_time(timestamp)))
+        except queue.Full:
+            self.frames_skipped += 1
+            return None
+        index = self.frames_recorded
+        self.frames_recorded += 1
+        return index
+
+    def record_command(self, direction, timestamp=None):
+        """Log a move_player command against the most recently recorded frame"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if isinstance(direction, tuple):
+            direction = [float(v) for v in direction]
+        entry = {
+            't': round(self._relative_time(timestamp), 6),
+            'frame': self.frames_recorded - 1,
+            'direction': direction,
+        }
+        with self._commands_lock:
+            self._commands_file.write(json.dumps(entry) + '\n')
+
+    def _write_loop(self):
+        encoded, timestamps = [], []
+        params = [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+        while True:
+            item = self._queue.get()
+            if item is not None:
+                image, timestamp = item
+                ok, buffer = cv2.imencode('.png', image, params)
+                if ok:
+                    encoded.append(buffer.ravel())
+                    timestamps.append(timestamp)
+            if encoded and (item is None or len(encoded) >= self.chunk_size):
+                self._flush_chunk(encoded, timestamps)
+                encoded, timestamps = [], []
+            if item is None:
+                return
+
+    def _flush_chunk(self, encoded, timestamps):
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(buffer) for buffer in encoded], out=offsets[1:])
+        name = _chunk_name(len(self._chunks))
+        np.savez(os.path.join(self.path, name),
+                 data=np.concatenate(encoded), offsets=offsets,
+                 timestamps=np.asarray(timestamps, dtype=np.float64))
+        self._chunks.append({'file': name, 'frames': len(encoded)})
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {
+            'version': SESSION_FORMAT_VERSION,
+            'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'region': self.region,
+            'channel_order': self.channel_order,
+            'frame_shape': list(self._frame_shape) if self._frame_shape else None,
+            'chunks': self._chunks,
+        }
+        tmp_path = os.path.join(self.path, MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_NAME))
+
+    def close(self):
+        """Flush pending frames and finalize the manifest"""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        self._write_manifest()
+        with self._commands_lock:
+            self._commands_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_session_commands(path):
+    """Read the recorded move_player commands of a session"""
+    commands = []
+    commands_path = os.path.join(path, COMMANDS_NAME)
+    if not os.path.exists(commands_path):
+        return commands
+    with open(commands_path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if isinstance(entry['direction'], list):
+                entry['direction'] = tuple(entry['direction'])
+            commands.append(entry)
+    return commands
+
+
+class ReplayCapture(CaptureBackend):
+    """Capture source that plays a recorded session back through the analyzer.
+
+    With realtime=True frames are released at their recorded pace (scaled by
+    ``speed``); otherwise grab() returns the next frame as fast as it can be
+    decoded. Returns None at the end of the session unless ``loop`` is set.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path, realtime=True, speed=1.0, loop=False, region=None):
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != SESSION_FORMAT_VERSION:
+            raise ValueError(f"Unsupported session format: {self.manifest.get('version')}")
+        super().__init__(region or self.manifest['region'])
+        self.path = path
+        self.channel_order = self.manifest['channel_order']
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.commands = load_session_commands(path)
+        self._commands_by_frame = {}
+        for command in self.commands:
+            self._commands_by_frame.setdefault(command['frame'], []).append(command['direction'])
+        self.frame_count = sum(chunk['frames'] for chunk in self.manifest['chunks'])
+
+        self.frame_index = -1
+        self.timestamp = None
+        self._chunk_index = 0
+        self._chunk = None
+        self._chunk_position = 0
+        self._start_wall = None
+        self._start_timestamp = None
+
+    def _load_chunk(self, index):
+        with np.load(os.path.join(self.path, self.manifest['chunks'][index]['file'])) as chunk:
+            self._chunk = {key: chunk[key] for key in ('data', 'offsets', 'timestamps')}
+        self._chunk_index = index
+        self._chunk_position = 0
+
+    def rewind(self):
+        self.frame_index = -1
+        self.timestamp = None
+        self._chunk = None
+        self._chunk_index = 0
+        self._start_wall = None
+
+    def grab(self):
+        if not self.manifest['chunks']:
+            return None
+        if self._chunk is None:
+            self._load_chunk(0)
+        elif self._chunk_position >= len(self._chunk['timestamps']):
+            if self._chunk_index + 1 < len(self.manifest['chunks']):
+                self._load_chunk(self._chunk_index + 1)
+            elif self.loop:
+                self.rewind()
+                self._load_chunk(0)
+            else:
+                return None
+
+        position = self._chunk_position
+        start, end = self._chunk['offsets'][position], self._chunk['offsets'][position + 1]
+        frame = cv2.imdecode(self._chunk['data'][start:end], cv2.IMREAD_UNCHANGED)
+        timestamp = float(self._chunk['timestamps'][position])
+        self._chunk_position += 1
+        self.frame_index += 1
+        self.timestamp = timestamp
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._start_wall is None:
+                self._start_wall, self._start_timestamp = now, timestamp
+            delay = self._start_wall + (timestamp - self._start_timestamp) / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+        return frame
+
+    def commands_for_frame(self, frame_index=None):
+        """Recorded commands issued while the given frame (default: current) was the latest"""
+        if frame_index is None:
+            frame_index = self.frame_index
+        return self._commands_by_frame.get(frame_index, [])
+
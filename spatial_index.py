@@ -0,0 +1,110 @@
+# spatial_index.py - Uniform grid hash for near-linear box and point neighbour queries
+
+from collections import defaultdict
+
+import numpy as np
+
+
+class GridIndex:
+    """Buckets items by the grid cells their extent covers.
+
+    Two inclusive rectangles can only intersect if they share a cell, so a
+    query only has to look at the handful of items in the cells it covers
+    rather than at every item. With a cell size around the typical box size
+    each box lands in at most four cells and queries stay O(1) on average.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = max(1, int(cell_size))
+        self.cells = defaultdict(list)
+
+    def _cell_range(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return (int(x1 // size), int(y1 // size), int(x2 // size), int(y2 // size))
+
+    def insert(self, item, x1, y1, x2, y2):
+        cx1, cy1, cx2, cy2 = self._cell_range(x1, y1, x2, y2)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self.cells[(cx, cy)].append(item)
+
+    def insert_point(self, item, x, y):
+        self.cells[(int(x // self.cell_size), int(y // self.cell_size))].append(item)
+
+    def query(self, x1, y1, x2, y2):
+        """Items whose cells overlap the rectangle (a superset of the true hits)"""
+        cx1, cy1, cx2, cy2 = self._cell_range(x1, y1, x2, y2)
+        found = set()
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                found.update(self.cells.get((cx, cy), ()))
+        return found
+
+
+def _default_cell_size(boxes):
+    # About twice the median box edge keeps most boxes within 1-4 cells
+    sizes = np.concatenate((boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]))
+    return max(16, 2 * int(np.median(sizes)) + 1)
+
+
+def non_max_suppression(boxes, overlap_thresh, cell_size=None):
+    """Greedy NMS over (N, 4) x1, y1, x2, y2 boxes using a grid index.
+
+    Same rule as the classic O(n^2) version: boxes are visited from the
+    largest bottom edge down, and every remaining box whose overlap with the
+    picked one exceeds overlap_thresh of its own area is suppressed. Only
+    boxes sharing a grid cell with the picked box are ever compared.
+    Returns the picked boxes as an int array.
+    """
+    boxes = np.asarray(boxes)
+    if len(boxes) == 0:
+        return np.empty((0, 4), dtype=int)
+
+    if cell_size is None:
+        cell_size = _default_cell_size(boxes)
+    x1, y1, x2, y2 = (boxes[:, k].astype(float).tolist() for k in range(4))
+    area = [(x2[i] - x1[i] + 1) * (y2[i] - y1[i] + 1) for i in range(len(boxes))]
+
+    index = GridIndex(cell_size)
+    for i in range(len(boxes)):
+        index.insert(i, x1[i], y1[i], x2[i], y2[i])
+
+    suppressed = [False] * len(boxes)
+    pick = []
+    for i in reversed(np.argsort(boxes[:, 3], kind='stable').tolist()):
+        if suppressed[i]:
+            continue
+        pick.append(i)
+        suppressed[i] = True
+        for j in index.query(x1[i], y1[i], x2[i], y2[i]):
+            if suppressed[j]:
+                continue
+            w = min(x2[i], x2[j]) - max(x1[i], x1[j]) + 1
+            h = min(y2[i], y2[j]) - max(y1[i], y1[j]) + 1
+            if w > 0 and h > 0 and (w * h) / area[j] > overlap_thresh:
+                suppressed[j] = True
+
+    return boxes[pick].astype("int")
+
+
+def dedupe_points(points, min_distance):
+    """Greedy duplicate filter: keep a point unless a kept point lies closer than min_distance.
+
+    Points are visited in input order. Returns the indices of the kept points.
+    """
+    index = GridIndex(min_distance)
+    kept_points = []
+    keep = []
+    min_distance_sq = min_distance * min_distance
+    for i, (x, y) in enumerate(points):
+        is_duplicate = False
+        for k in index.query(x - min_distance, y - min_distance, x + min_distance, y + min_distance):
+            kx, ky = kept_points[k]
+            if (kx - x) ** 2 + (ky - y) ** 2 < min_distance_sq:
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            index.insert_point(len(kept_points), x, y)
+            kept_points.append((x, y))
+            keep.append(i)
+    return keep
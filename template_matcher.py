@@ -0,0 +1,130 @@
+# template_matcher.py - Cached, ROI-restricted template matching for UI screens
+
+import os
+import time
+
+import cv2
+from frame_context import FrameContext
+
+
+def expand_region(region, margin, frame_width, frame_height):
+    """Grow a {'left', 'top', 'width', 'height'} region by margin pixels, clipped to the frame"""
+    left = max(0, region['left'] - margin)
+    top = max(0, region['top'] - margin)
+    right = min(frame_width, region['left'] + region['width'] + margin)
+    bottom = min(frame_height, region['top'] + region['height'] + margin)
+    return left, top, right, bottom
+
+
+class TemplateMatcher:
+    """Matches one template image against a fixed search window of the frame.
+
+    The template is read from disk once and reloaded only when its mtime
+    changes (checked at most every ``check_interval`` seconds). Matching is
+    restricted to ``search_region`` expanded by ``search_margin`` pixels
+    instead of the whole frame. With ``pyramid_levels`` > 0 the window is
+    first searched on a downscaled copy and the best hit is then refined at
+    full resolution in a small neighbourhood.
+    """
+
+    def __init__(self, template_path, search_region=None, search_margin=0, threshold=0.7,
+                 pyramid_levels=0, check_interval=1.0, name=None):
+        self.template_path = template_path
+        self.search_region = search_region
+        self.search_margin = search_margin
+        self.threshold = threshold
+        self.pyramid_levels = pyramid_levels
+        self.check_interval = check_interval
+        self.name = name or os.path.splitext(os.path.basename(template_path))[0]
+
+        self.templates = None  # [full resolution, pyrDown x1, ...]
+        self._mtime = None
+        self._last_check = None
+        self.last_confidence = 0.0
+        self.last_location = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.template_path).st_mtime
+        except OSError:
+            self.templates, self._mtime = None, None
+            return
+        if mtime == self._mtime:
+            return
+        template = cv2.imread(self.template_path, cv2.IMREAD_COLOR)
+        self._mtime = mtime
+        if template is None:
+            self.templates = None
+            return
+        self.templates = [template]
+        for _ in range(self.pyramid_levels):
+            self.templates.append(cv2.pyrDown(self.templates[-1]))
+
+    @property
+    def template_mtime(self):
+        """mtime of the loaded template, changes whenever it is reloaded"""
+        return self._mtime
+
+    @property
+    def available(self):
+        self._refresh()
+        return self.templates is not None
+
+    def _search_window(self, frame_shape):
+        height, width = frame_shape[:2]
+        if self.search_region is None:
+            return 0, 0, width, height
+        left, top, right, bottom = expand_region(self.search_region, self.search_margin, width, height)
+        template_h, template_w = self.templates[0].shape[:2]
+        if right - left < template_w or bottom - top < template_h:
+            return 0, 0, width, height
+        return left, top, right, bottom
+
+    def match(self, image):
+        """Best match confidence and top-left location (frame coordinates), or None without a template"""
+        self._refresh()
+        if self.templates is None:
+            return None
+        if not isinstance(image, FrameContext):
+            image = FrameContext(image)
+        left, top, right, bottom = self._search_window(image.shape)
+        window = image.bgr_region(left, top, right, bottom)
+        template = self.templates[0]
+
+        level = min(self.pyramid_levels, len(self.templates) - 1)
+        while level > 0 and min(self.templates[level].shape[:2]) < 8:
+            level -= 1
+        if level > 0:
+            coarse = window
+            for _ in range(level):
+                coarse = cv2.pyrDown(coarse)
+            result = cv2.matchTemplate(coarse, self.templates[level], cv2.TM_CCOEFF_NORMED)
+            _, _, _, coarse_loc = cv2.minMaxLoc(result)
+            # Refine at full resolution around the upscaled coarse hit
+            scale = 2 ** level
+            pad = 2 * scale
+            th, tw = template.shape[:2]
+            x0 = max(0, coarse_loc[0] * scale - pad)
+            y0 = max(0, coarse_loc[1] * scale - pad)
+            x1 = min(window.shape[1], coarse_loc[0] * scale + tw + pad)
+            y1 = min(window.shape[0], coarse_loc[1] * scale + th + pad)
+            if x1 - x0 >= tw and y1 - y0 >= th:
+                left, top = left + x0, top + y0
+                window = window[y0:y1, x0:x1]
+
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        self.last_confidence = max_val
+        self.last_location = (left + max_loc[0], top + max_loc[1])
+        return max_val, self.last_location
+
+    def detect(self, image):
+        """True if the template is found above threshold; None if no template is available"""
+        result = self.match(image)
+        if result is None:
+            return None
+        return result[0] >= self.threshold
@@ -0,0 +1,141 @@
+# test_allocations.py - Checks that the capture + analysis pipeline stops allocating large arrays once warm
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+import cv2
+import numpy as np
+from capture_backends import FileCapture
+from frame_grabber import FrameGrabber
+from screen_analyzer import ScreenAnalyzer
+from game_state import GameStateClassifier
+from tracker import TrackedDetector
+from decision_maker_enhanced import DecisionMakerEnhanced
+from test_helpers import synthetic_frame
+
+WARMUP_FRAMES = 60
+MEASURED_FRAMES = 120
+# Per-frame peak of new Python-tracked memory. A single 1080p mask is ~2 MB,
+# so anything under this is small bookkeeping (tuples, lists, tiny arrays).
+LARGE_ALLOCATION = 256 * 1024
+# Peak while a frame is taken and its game state classified. Every image in
+# that stage is pooled, so even the 1/16 state thumbnail (~20 KB) exceeds it.
+FRAME_ALLOCATION = 8 * 1024
+
+
+def write_session(directory, frame_count=8):
+    """Write a short synthetic session (a scene scrolling sideways) as PNG files"""
+    rng = np.random.default_rng(0)
+    base = synthetic_frame(rng, enemies=150, shards=50)
+    for i in range(frame_count):
+        cv2.imwrite(os.path.join(directory, f'frame_{i:03d}.png'), np.roll(base, 3 * i, axis=1))
+
+
+def next_frame(grabber, analyzer, state_classifier):
+    """Take the newest frame from the grabber and classify its game state"""
+    captured = grabber.get_latest(timeout=1.0)
+    if captured is None:
+        raise RuntimeError("Frame grabber delivered no frame")
+    context = analyzer.begin_frame(captured.image, grabber.channel_order)
+    state_classifier.update(context)
+    return context, captured.timestamp
+
+
+def analyze_frame(context, timestamp, tracked_detector, decision_maker):
+    """Detect, track and decide on one frame"""
+    result = tracked_detector.process(context, timestamp)
+    decision_maker.decide_movement(result.player, result.enemies, result.shards, result.enemies.velocities)
+
+
+def run_pipeline(grabber, analyzer, state_classifier, tracked_detector, decision_maker, frames):
+    """Push frames from the grabber through classification, detection and decision making"""
+    for _ in range(frames):
+        analyze_frame(*next_frame(grabber, analyzer, state_classifier), tracked_detector, decision_maker)
+
+
+def measure_steady_state():
+    """Warm the pipeline up, then measure per-frame allocation peaks with tracemalloc.
+
+    Returns (arrays the buffer pool allocated after warmup, per-frame peaks of
+    taking and classifying the frame, per-frame peaks of the whole pipeline),
+    peaks in bytes.
+    """
+    directory = tempfile.mkdtemp(prefix='allocations_')
+    grabber = None
+    try:
+        write_session(directory)
+        # Wired up like main.py: the grabber runs the analyzer's backend
+        analyzer = ScreenAnalyzer(FileCapture(directory, loop=True))
+        grabber = FrameGrabber(analyzer.get_capture_backend(), max_fps=60)
+        state_classifier = GameStateClassifier(analyzer.screen_library)
+        tracked_detector = TrackedDetector(analyzer)
+        decision_maker = DecisionMakerEnhanced()
+        grabber.start()
+
+        pipeline = (grabber, analyzer, state_classifier, tracked_detector, decision_maker)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline(*pipeline, WARMUP_FRAMES)
+        pool = analyzer.frame_context.pool
+        warm_allocations = pool.allocations
+
+        tracemalloc.start()
+        frame_peaks, peaks = [], []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(MEASURED_FRAMES):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                context, timestamp = next_frame(grabber, analyzer, state_classifier)
+                frame_peaks.append(tracemalloc.get_traced_memory()[1] - before)
+                analyze_frame(context, timestamp, tracked_detector, decision_maker)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+    finally:
+        if grabber is not None:
+            grabber.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return pool.allocations - warm_allocations, frame_peaks, peaks
+
+
+def test_steady_state_allocations():
+    """A warm pipeline takes no new pooled arrays and allocates less than the budgets per frame"""
+    new_arrays, frame_peaks, peaks = measure_steady_state()
+    assert new_arrays == 0, f"Buffer pool allocated {new_arrays} new arrays after warmup"
+    assert max(frame_peaks) <= FRAME_ALLOCATION, (
+        f"Taking and classifying a frame allocated {max(frame_peaks) / 1024:.0f} KB "
+        f"(budget {FRAME_ALLOCATION // 1024} KB)")
+    large = sum(peak > LARGE_ALLOCATION for peak in peaks)
+    assert max(peaks) <= LARGE_ALLOCATION, (
+        f"{large} frames allocated more than {LARGE_ALLOCATION // 1024} KB (max {max(peaks) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    print("🧪 Allocation Test")
+    print("=" * 30)
+    print("Testing steady-state allocations...")
+    new_arrays, frame_peaks, peaks = measure_steady_state()
+    print(f"   Frame + game state peak: max {max(frame_peaks) / 1024:.1f} KB (budget {FRAME_ALLOCATION // 1024} KB)")
+    print(f"   Per-frame allocation peak: max {max(peaks) / 1024:.0f} KB, "
+          f"median {np.median(peaks) / 1024:.0f} KB (budget {LARGE_ALLOCATION // 1024} KB)")
+    passed = True
+    if new_arrays:
+        print(f"❌ Buffer pool allocated {new_arrays} new arrays after warmup")
+        passed = False
+    else:
+        print("✅ Buffer pool allocated nothing after warmup")
+    if max(frame_peaks) > FRAME_ALLOCATION:
+        print(f"❌ {sum(peak > FRAME_ALLOCATION for peak in frame_peaks)} frames allocated more than the "
+              f"frame budget while being taken and classified")
+        passed = False
+    else:
+        print("✅ Taking and classifying frames allocates no images")
+    if max(peaks) > LARGE_ALLOCATION:
+        print(f"❌ {sum(peak > LARGE_ALLOCATION for peak in peaks)} frames allocated more than the budget")
+        passed = False
+    else:
+        print("✅ No large allocations after warmup")
+    print("\n🎉 Steady state is allocation-free!" if passed else "\n⚠️ Large allocations remain in the frame loop")
+    raise SystemExit(0 if passed else 1)
@@ -0,0 +1,56 @@
+# test_change_detector.py - Checks that tile change detection sees colour changes, not just brightness changes
+
+import cv2
+import numpy as np
+from change_detector import ChangeDetector
+from frame_context import FrameContext
+
+WIDTH, HEIGHT = 256, 128
+REGIONS = [(0, 0, 128, 128), (128, 0, 256, 128)]
+# Green and red of (almost) the same luminance: equal in grayscale, far apart in hue
+GREEN = (0, 100, 0)
+RED = (0, 0, 196)
+
+
+def detector_after(first, second):
+    """Dirty flags of a ChangeDetector that saw first and then second"""
+    detector = ChangeDetector(REGIONS)
+    context = FrameContext(first)
+    detector.update(context)
+    return detector.update(context.reset(second))
+
+
+def test_isoluminant_colour_change_is_dirty():
+    """A blob changing between two colours of equal brightness marks its tile dirty"""
+    first = np.full((HEIGHT, WIDTH, 3), GREEN, dtype=np.uint8)
+    second = first.copy()
+    second[40:80, 160:200] = RED
+    gray = cv2.cvtColor(np.array([[GREEN, RED]], dtype=np.uint8), cv2.COLOR_BGR2GRAY)
+    assert abs(int(gray[0, 0]) - int(gray[0, 1])) <= 1, "test colours are not isoluminant"
+    assert detector_after(first, second).tolist() == [False, True]
+
+
+def test_unchanged_frame_is_clean():
+    """The same pixels again leave every tile clean"""
+    frame = np.full((HEIGHT, WIDTH, 3), GREEN, dtype=np.uint8)
+    assert not detector_after(frame, frame.copy()).any()
+
+
+def test_four_channel_frames():
+    """BGRA frames (as xshm and mss deliver them) are compared on every channel too"""
+    first = np.full((HEIGHT, WIDTH, 4), GREEN + (255,), dtype=np.uint8)
+    second = first.copy()
+    second[40:80, 20:60] = RED + (255,)
+    detector = ChangeDetector(REGIONS)
+    context = FrameContext(first, channel_order='BGRA')
+    detector.update(context)
+    assert detector.update(context.reset(second)).tolist() == [True, False]
+
+
+if __name__ == "__main__":
+    print("🧪 Change Detector Test")
+    print("=" * 30)
+    for test in (test_isoluminant_colour_change_is_dirty, test_unchanged_frame_is_clean, test_four_channel_frames):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 Change detection sees colour changes!")
@@ -0,0 +1,52 @@
+# test_decision_maker.py - Regression checks for DecisionMakerEnhanced on small hand-built scenes
+
+import numpy as np
+from decision_cache import DecisionCache
+from decision_maker_enhanced import DecisionMakerEnhanced
+from detections import Detections
+
+PLAYER = (500, 400, 20, 20)  # Centre (510, 410)
+
+
+def test_far_enemy_near_shard_without_danger_field():
+    """Every enemy out of reach of the shard paths: the shard is safe, not a crash"""
+    maker = DecisionMakerEnhanced(use_danger_field=False, use_path_planning=False, use_route_planning=False)
+    decision = maker.decide_movement(PLAYER, [(1500, 50, 20, 20)], [(560, 400, 6, 6)])
+    assert decision == (53, -7)
+    # Same scene with the path and route planners left at their defaults
+    maker = DecisionMakerEnhanced(use_danger_field=False)
+    assert maker.decide_movement(PLAYER, [(1500, 50, 20, 20)], [(560, 400, 6, 6)]) == (53, -7)
+
+
+
+def test_cache_sees_enemy_moving_onto_shard_path():
+    """An enemy 300-550 px away stepping onto the path to a shard must change the cached decision"""
+    for planners in ({'use_path_planning': False, 'use_route_planning': False}, {}):
+        maker = DecisionMakerEnhanced(use_decision_cache=True, **planners)
+        shard = [(890, 405, 8, 8)]  # 384 px right of the player
+        to_shard = maker.decide_movement(PLAYER, [(1400, 800, 20, 20)], shard)
+        assert to_shard == maker.decide_movement(PLAYER, [(1400, 800, 20, 20)], shard)
+        assert maker.decision_cache.hits == 1
+        # 342 px from the player, right on the way to the shard
+        blocked = maker.decide_movement(PLAYER, [(840, 430, 20, 20)], shard)
+        assert blocked != to_shard, planners
+
+
+def test_cache_key_includes_detection_ages():
+    """The same enemy seen now and 0.2 s ago gets different signatures"""
+    cache = DecisionCache()
+    fresh = Detections.from_boxes([(600, 400, 20, 20)])
+    stale = Detections.from_boxes([(600, 400, 20, 20)], ages=0.2)
+    shards = Detections()
+    assert cache.signature((510, 410), fresh, shards) != cache.signature((510, 410), stale, shards)
+    assert np.all(stale.ages > 0)
+
+
+if __name__ == "__main__":
+    print("🧪 Decision Maker Test")
+    print("=" * 30)
+    for test in (test_far_enemy_near_shard_without_danger_field, test_cache_sees_enemy_moving_onto_shard_path,
+                 test_cache_key_includes_detection_ages):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 Decision maker checks passed!")
@@ -0,0 +1,28 @@
+# test_helpers.py - Synthetic gameplay frames shared by the tests and benchmarks
+
+import cv2
+import numpy as np
+from config import GAME_REGION, PLAYER_COLOR_RANGE, ENEMY_COLOR_RANGES, XP_GEM_COLOR_RANGE
+
+
+def range_color(color_range):
+    """BGR colour in the middle of an HSV range"""
+    hsv = ((np.asarray(color_range['lower']) + np.asarray(color_range['upper'])) // 2).astype(np.uint8)
+    return tuple(int(v) for v in cv2.cvtColor(hsv.reshape(1, 1, 3), cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def synthetic_frame(rng, enemies=300, shards=100, width=GAME_REGION['width'], height=GAME_REGION['height']):
+    """Gameplay-like BGR frame: grey background, a player in the centre, coloured enemies and shards"""
+    frame = np.full((height, width, 3), (90, 110, 100), dtype=np.uint8)
+    enemy_colors = [range_color(color_range) for color_range in ENEMY_COLOR_RANGES.values()]
+    for _ in range(enemies):
+        x, y = int(rng.integers(0, width - 30)), int(rng.integers(0, height - 30))
+        size = int(rng.integers(12, 28))
+        color = enemy_colors[int(rng.integers(0, len(enemy_colors)))]
+        cv2.rectangle(frame, (x, y), (x + size, y + size), color, -1)
+    for _ in range(shards):
+        x, y = int(rng.integers(0, width - 10)), int(rng.integers(0, height - 10))
+        cv2.rectangle(frame, (x, y), (x + 8, y + 8), range_color(XP_GEM_COLOR_RANGE), -1)
+    cx, cy = width // 2, height // 2
+    cv2.rectangle(frame, (cx - 15, cy - 15), (cx + 15, cy + 15), range_color(PLAYER_COLOR_RANGE), -1)
+    return frame
@@ -0,0 +1,77 @@
+# test_ocr_worker.py - Checks the OCR pool's dHash cache: recency on near matches and no duplicate reads
+
+import threading
+
+import numpy as np
+from ocr_worker import OCRWorkerPool
+
+CARD = {'left': 0, 'top': 0, 'width': 64, 'height': 32}
+
+
+class CountingEngine:
+    """Stands in for tesseract: counts reads and can hold them until released"""
+
+    def __init__(self, release=None):
+        self.reads = 0
+        self.release = release
+
+    def read(self, binary):
+        self.reads += 1
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        return "Might"
+
+    def close(self):
+        pass
+
+
+def pool_with(engine, **kwargs):
+    pool = OCRWorkerPool(**kwargs)
+    pool._engine = lambda: engine
+    return pool
+
+
+def card_image(seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (CARD['height'], CARD['width'], 3), dtype=np.uint8)
+
+
+def test_duplicate_card_waits_for_running_read():
+    """The same card asked for again while its OCR runs shares that read"""
+    release = threading.Event()
+    engine = CountingEngine(release)
+    pool = pool_with(engine, max_workers=2)
+    try:
+        image = card_image(0)
+        first = pool.read_cards(image, [CARD])[0]
+        second = pool.read_cards(image, [CARD])[0]
+        release.set()
+        assert first.result(timeout=5) == second.result(timeout=5) == "Might"
+        assert engine.reads == 1
+        assert (pool.cache_hits, pool.cache_misses) == (1, 1)
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_near_match_refreshes_recency():
+    """A hit within the hash tolerance keeps its entry from being evicted first"""
+    pool = pool_with(CountingEngine(), cache_size=2, hash_tolerance=2)
+    try:
+        pool._store(0b0000, "old")
+        pool._store(0b1111 << 8, "newer")
+        near = pool._card_future(None, 0b0001)  # One bit from the oldest entry
+        assert near.result() == "old"
+        pool._store(0b1111 << 16, "newest")
+        assert list(pool._cache) == [0b0000, 0b1111 << 16]
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    print("🧪 OCR Worker Cache Test")
+    print("=" * 30)
+    for test in (test_duplicate_card_waits_for_running_read, test_near_match_refreshes_recency):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 Cards are read once and near matches stay cached!")
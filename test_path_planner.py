@@ -0,0 +1,43 @@
+# test_path_planner.py - Checks that planned shard routes never pass next to an enemy
+
+import numpy as np
+from danger_field import DangerField
+from path_planner import PathPlanner, INF
+
+START = (100, 300)
+TARGET = (700, 300)
+
+
+def planner_for(enemy_centers, budget_ms=1000.0):
+    field = DangerField(width=800, height=600).update(np.asarray(enemy_centers, dtype=np.float64).reshape(-1, 2))
+    planner = PathPlanner(budget_ms=budget_ms)
+    planner.begin_frame(field)
+    return planner
+
+
+def test_clear_route_gives_waypoint():
+    assert planner_for([(400, 580)]).path_waypoint(START, TARGET) is not None
+
+
+def test_route_through_enemies_is_refused():
+    """A wall of enemies across the whole area: shard routes get None, escapes still get a way through"""
+    wall = [(400, y) for y in range(-240, 840, 20)]  # Covers the field margin too
+    planner = planner_for(wall)
+    assert planner.path_waypoint(START, TARGET) is None
+    assert planner.path_waypoint(START, TARGET, through_danger=True) is not None
+
+
+def test_route_cut_short_is_refused():
+    """A search stopped by the deadline is no route, not the partial path"""
+    planner = planner_for([(400, 580)])
+    planner.deadline = -INF
+    assert planner.path_waypoint(START, TARGET) is None
+
+
+if __name__ == "__main__":
+    print("🧪 Path Planner Test")
+    print("=" * 30)
+    for test in (test_clear_route_gives_waypoint, test_route_through_enemies_is_refused, test_route_cut_short_is_refused):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 Shard routes stay clear of enemies!")
@@ -0,0 +1,56 @@
+# test_tracker.py - Checks that aged detections update tracks where the object is now, not where it was
+
+import numpy as np
+from detections import Detections
+from tracker import ObjectTracker
+
+SPEED = 200.0  # Pixels per second along x
+SIZE = 20
+
+
+def moving_track():
+    """Tracker with one track moving at SPEED, measured every 0.1 s until t=1.0"""
+    tracker = ObjectTracker()
+    for step in range(11):
+        t = step / 10
+        tracker.update([(100 + SPEED * t - SIZE / 2, 300, SIZE, SIZE)], t)
+    return tracker
+
+
+def aged(x, age):
+    return Detections.from_boxes([(x - SIZE / 2, 300, SIZE, SIZE)], ages=age)
+
+
+def test_aged_detection_is_moved_forward():
+    """A measurement 0.2 s old of where the object was then agrees with the track now"""
+    tracker = moving_track()
+    tracker.update(aged(100 + SPEED * 0.9, 0.2), 1.1)
+    assert abs(tracker.state[0, 0] - (100 + SPEED * 1.1)) < 5
+    assert tracker.state[0, 2] > 0.9 * SPEED
+
+
+def test_detection_older_than_track_is_ignored():
+    """A detection from before the track's last measurement leaves the track alone"""
+    tracker = moving_track()
+    tracker.predict(1.05)
+    before = tracker.state.copy()
+    tracker.update(aged(100 + SPEED * 0.9, 0.15), 1.05)
+    assert np.array_equal(tracker.state, before)
+    assert len(tracker) == 1
+
+
+def test_ages_follow_frame_timestamps():
+    """Ages are measured on the frames' clock, not the wall clock"""
+    tracker = moving_track()
+    tracker.predict(1.25)
+    assert np.allclose(tracker.detections().ages, 0.25)
+
+
+if __name__ == "__main__":
+    print("🧪 Tracker Test")
+    print("=" * 30)
+    for test in (test_aged_detection_is_moved_forward, test_detection_older_than_track_is_ignored,
+                 test_ages_follow_frame_timestamps):
+        test()
+        print(f"✅ {test.__name__}")
+    print("\n🎉 Aged detections land where their objects are now!")
@@ -0,0 +1,136 @@
+# tiled_detector.py - Colour segmentation and blob extraction split over frame tiles on a thread pool
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from config import TILED_WORKERS, TILE_GRID, TILE_OVERLAP
+from blob_extractor import Blobs, EMPTY_BLOBS, extract_blobs
+from change_detector import ChangeDetector
+
+
+def make_tiles(frame_shape, grid=TILE_GRID, overlap=TILE_OVERLAP):
+    """Split a frame into rows x cols tiles.
+
+    Returns (tile, core) rectangle pairs as (left, top, right, bottom): the
+    core tiles the frame exactly, the tile is the core grown by overlap
+    pixels on every inner side.
+    """
+    height, width = frame_shape
+    rows, cols = grid
+    row_edges = [height * r // rows for r in range(rows + 1)]
+    col_edges = [width * c // cols for c in range(cols + 1)]
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            core = (col_edges[c], row_edges[r], col_edges[c + 1], row_edges[r + 1])
+            tile = (max(0, core[0] - overlap), max(0, core[1] - overlap),
+                    min(width, core[2] + overlap), min(height, core[3] + overlap))
+            tiles.append((tile, core))
+    return tiles
+
+
+class TiledDetector:
+    """Labels colour classes and extracts their blobs tile by tile on worker threads.
+
+    OpenCV releases the GIL, so the per-tile HSV conversion, lookup-table
+    labelling and connected components run in parallel. Each tile owns the
+    blobs whose centre lies in its core rectangle; an object smaller than the
+    overlap is therefore seen whole by the tile that owns it and reported
+    exactly once. (Larger objects crossing a tile edge can come back in
+    pieces.) A tile's label image is computed once per frame; blobs are
+    extracted per class on first request and served with the caller's
+    minimum area.
+
+    With ``incremental`` set, a ChangeDetector over the tiles decides which
+    tiles changed since their results were computed; only those are
+    re-detected and the others reuse their cached blobs.
+    """
+
+    def __init__(self, color_classifier, workers=TILED_WORKERS, grid=TILE_GRID, overlap=TILE_OVERLAP,
+                 incremental=False):
+        self.color_classifier = color_classifier
+        self.grid = grid
+        self.overlap = overlap
+        self.incremental = incremental
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TileWorker")
+        self.change_detector = None
+        self._tiles = None
+        self._tile_shape = None
+        self._tile_labels = []   # Label image per tile for the current frame (or None)
+        self._tile_results = []  # {class name: Blobs} per tile, still valid for the current frame
+        self._frame_key = None
+        self._blobs = {}         # Merged Blobs per class for the current frame
+        self.tiles_detected = 0
+        self.tiles_reused = 0
+
+    def prepare(self, frame_shape):
+        """Build the tiles (and their change detector) for a frame size"""
+        if self._tile_shape == frame_shape:
+            return
+        self._tiles = make_tiles(frame_shape, self.grid, self.overlap)
+        self._tile_shape = frame_shape
+        self._tile_labels = [None] * len(self._tiles)
+        self._tile_results = [{} for _ in self._tiles]
+        if self.incremental:
+            self.change_detector = ChangeDetector([tile for tile, _ in self._tiles])
+
+    def _start_frame(self, context):
+        self.prepare(context.shape)
+        if self.change_detector is not None:
+            self.change_detector.update(context)
+            refresh = self.change_detector.take_pending()
+        else:
+            refresh = [True] * len(self._tiles)
+        for index in range(len(self._tiles)):
+            self._tile_labels[index] = None
+            if refresh[index]:
+                self._tile_results[index] = {}
+        self._blobs = {}
+        self._frame_key = (id(context), context.frame_id)
+
+    def _detect_tile(self, context, index, name):
+        (left, top, right, bottom), core = self._tiles[index]
+        labels = self._tile_labels[index]
+        if labels is None:
+            labels = self.color_classifier.region_labels(context, left, top, right, bottom)
+            self._tile_labels[index] = labels
+        mask = self.color_classifier.class_mask(context, labels, self.color_classifier.bit(name))
+        blobs = extract_blobs(mask, labels=context.scratch(mask.shape, np.int32))
+        if len(blobs.areas) == 0:
+            return EMPTY_BLOBS
+        centroids = blobs.centroids + (left, top)
+        owned = ((centroids[:, 0] >= core[0]) & (centroids[:, 0] < core[2]) &
+                 (centroids[:, 1] >= core[1]) & (centroids[:, 1] < core[3]))
+        boxes = blobs.boxes[owned].copy()
+        boxes[:, :2] += (left, top)
+        return Blobs(boxes, blobs.areas[owned], centroids[owned])
+
+    def _merged_blobs(self, context, name):
+        futures = {}
+        for index, results in enumerate(self._tile_results):
+            if name not in results:
+                futures[index] = self.executor.submit(self._detect_tile, context, index, name)
+        for index, future in futures.items():
+            self._tile_results[index][name] = future.result()
+        self.tiles_detected += len(futures)
+        self.tiles_reused += len(self._tiles) - len(futures)
+
+        parts = [results[name] for results in self._tile_results]
+        boxes = np.concatenate([part.boxes for part in parts])
+        # Same top-to-bottom, left-to-right order as a single full-frame pass
+        order = np.lexsort((boxes[:, 0], boxes[:, 1]))
+        return Blobs(boxes[order], np.concatenate([part.areas for part in parts])[order],
+                     np.concatenate([part.centroids for part in parts])[order])
+
+    def blobs(self, context, name, min_area=0):
+        """Blobs of one colour class larger than min_area, like extract_blobs on its full-frame mask"""
+        if self._frame_key != (id(context), context.frame_id) or self._tile_shape != context.shape:
+            self._start_frame(context)
+        if name not in self._blobs:
+            self._blobs[name] = self._merged_blobs(context, name)
+        blobs = self._blobs[name]
+        keep = blobs.areas > min_area
+        return Blobs(blobs.boxes[keep], blobs.areas[keep], blobs.centroids[keep])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,281 @@
+# tracker.py - Kalman multi-object tracking so full detection only runs every Nth frame
+
+from collections import namedtuple
+
+import numpy as np
+from config import (FULL_DETECTION_STRIDE, TRACKER_MAX_DISTANCE, TRACKER_MAX_MISSES, TRACKER_REFINE_MARGIN,
+                    TRACKER_REFINE_MAX_AREA, TRACKER_PROCESS_NOISE, TRACKER_MEASUREMENT_NOISE,
+                    TRACKER_INITIAL_VELOCITY_VARIANCE, ENEMY_COLOR_RANGES, MIN_CONTOUR_AREA)
+from blob_extractor import extract_blobs
+from spatial_index import GridIndex
+from detections import Detections
+
+# player: (x, y, w, h) or None; enemies/shards: Detections carrying track ids
+# and velocities (track_ids and velocities columns); full_detection: whether
+# the detectors ran this frame
+TrackedFrame = namedtuple('TrackedFrame', ['player', 'enemies', 'shards', 'full_detection'])
+
+
+class ObjectTracker:
+    """Constant-velocity Kalman tracker with greedy nearest-centre association.
+
+    All tracks live in parallel numpy arrays and are predicted and corrected
+    in one vectorized step. x and y share the same motion model and noise, so
+    a single 2x2 (position, velocity) covariance per track serves both axes.
+    Detections are matched to the nearest predicted centre within
+    ``max_distance`` pixels, with a grid index keeping the candidate pairs
+    near-linear in the number of objects.
+    """
+
+    def __init__(self, max_distance=TRACKER_MAX_DISTANCE, max_misses=TRACKER_MAX_MISSES,
+                 process_noise=TRACKER_PROCESS_NOISE, measurement_noise=TRACKER_MEASUREMENT_NOISE,
+                 initial_velocity_variance=TRACKER_INITIAL_VELOCITY_VARIANCE):
+        self.max_distance = max_distance
+        self.max_misses = max_misses
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.initial_velocity_variance = initial_velocity_variance
+        self.next_id = 1
+        self.last_timestamp = None
+        self.clear()
+
+    def clear(self):
+        """Drop every track"""
+        self.ids = np.empty(0, dtype=np.int64)
+        self.state = np.empty((0, 4))       # cx, cy, vx, vy
+        self.covariance = np.empty((0, 3))  # per axis: var(pos), cov(pos, vel), var(vel)
+        self.sizes = np.empty((0, 2))       # w, h
+        self.misses = np.empty(0, dtype=np.int64)
+        self.class_ids = np.empty(0, dtype=np.int16)
+        self.measured_at = np.empty(0)      # Timestamp of each track's last measurement
+
+    def __len__(self):
+        return len(self.ids)
+
+    def predict(self, timestamp):
+        """Move every track forward to timestamp (seconds)"""
+        dt = 0.0 if self.last_timestamp is None else max(0.0, timestamp - self.last_timestamp)
+        self.last_timestamp = timestamp
+        if dt == 0.0 or len(self) == 0:
+            return
+        self.state[:, :2] += self.state[:, 2:] * dt
+        pp, pv, vv = self.covariance.T
+        q = self.process_noise
+        self.covariance = np.column_stack((
+            pp + 2 * dt * pv + dt * dt * vv + q * dt ** 3 / 3,
+            pv + dt * vv + q * dt * dt / 2,
+            vv + q * dt,
+        ))
+
+    def correct(self, indices, centers, sizes, ages=0.0):
+        """Fold measured centres and sizes (taken ages seconds before the last prediction) into the given tracks.
+
+        An aged measurement is moved forward by the track's velocity times
+        its age and weighted less (the velocity variance grows the noise by
+        age squared); one older than the track's last measurement is ignored.
+        """
+        if len(indices) == 0:
+            return
+        indices = np.asarray(indices)
+        ages = np.broadcast_to(np.asarray(ages, dtype=float), len(indices))
+        measured_at = self.last_timestamp - ages
+        newer = measured_at >= self.measured_at[indices]
+        if not newer.all():
+            indices, ages, measured_at = indices[newer], ages[newer], measured_at[newer]
+            centers, sizes = np.asarray(centers, dtype=float)[newer], np.asarray(sizes, dtype=float)[newer]
+        self.measured_at[indices] = measured_at
+        pp, pv, vv = self.covariance[indices].T
+        innovation_var = pp + self.measurement_noise + vv * ages * ages
+        gain_pos = pp / innovation_var
+        gain_vel = pv / innovation_var
+        residual = np.asarray(centers, dtype=float) + self.state[indices, 2:] * ages[:, None] - self.state[indices, :2]
+        self.state[indices, :2] += gain_pos[:, None] * residual
+        self.state[indices, 2:] += gain_vel[:, None] * residual
+        self.covariance[indices] = np.column_stack(((1 - gain_pos) * pp, (1 - gain_pos) * pv, vv - gain_vel * pv))
+        self.sizes[indices] = sizes
+        self.misses[indices] = 0
+
+    def spawn(self, centers, sizes, class_ids=-1, ages=0.0):
+        """Start new tracks at rest for unmatched detections"""
+        count = len(centers)
+        if count == 0:
+            return
+        self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + count)))
+        self.next_id += count
+        self.state = np.vstack((self.state, np.column_stack((centers, np.zeros((count, 2))))))
+        initial = [self.measurement_noise, 0.0, self.initial_velocity_variance]
+        self.covariance = np.vstack((self.covariance, np.tile(initial, (count, 1))))
+        self.sizes = np.vstack((self.sizes, np.asarray(sizes, dtype=float)))
+        self.misses = np.concatenate((self.misses, np.zeros(count, dtype=np.int64)))
+        self.class_ids = np.concatenate((self.class_ids, np.broadcast_to(class_ids, count).astype(np.int16)))
+        measured_at = self.last_timestamp - np.broadcast_to(np.asarray(ages, dtype=float), count)
+        self.measured_at = np.concatenate((self.measured_at, measured_at))
+
+    def keep(self, mask):
+        """Retain only the tracks where mask is True"""
+        self.ids = self.ids[mask]
+        self.state = self.state[mask]
+        self.covariance = self.covariance[mask]
+        self.sizes = self.sizes[mask]
+        self.misses = self.misses[mask]
+        self.class_ids = self.class_ids[mask]
+        self.measured_at = self.measured_at[mask]
+
+    def associate(self, centers):
+        """Greedy nearest-first matching; returns (track indices, detection indices, unmatched detections)"""
+        gate = self.max_distance
+        index = GridIndex(gate)
+        predicted = self.state[:, :2].tolist()
+        for i, (x, y) in enumerate(predicted):
+            index.insert_point(i, x, y)
+
+        pairs = []
+        for j, (x, y) in enumerate(centers.tolist()):
+            for i in index.query(x - gate, y - gate, x + gate, y + gate):
+                px, py = predicted[i]
+                distance_sq = (px - x) ** 2 + (py - y) ** 2
+                if distance_sq <= gate * gate:
+                    pairs.append((distance_sq, i, j))
+        pairs.sort()
+
+        used_tracks, used_detections = set(), set()
+        track_indices, detection_indices = [], []
+        for _, i, j in pairs:
+            if i in used_tracks or j in used_detections:
+                continue
+            used_tracks.add(i)
+            used_detections.add(j)
+            track_indices.append(i)
+            detection_indices.append(j)
+        unmatched = [j for j in range(len(centers)) if j not in used_detections]
+        return track_indices, detection_indices, unmatched
+
+    def update(self, detections, timestamp):
+        """Full-detection step: match Detections (or box tuples), start tracks for new ones, drop unseen ones"""
+        self.predict(timestamp)
+        detections = Detections.coerce(detections)
+        boxes = detections.boxes.astype(float)
+        centers = boxes[:, :2] + boxes[:, 2:] / 2
+        track_indices, detection_indices, unmatched = self.associate(centers)
+        ages = detections.ages.astype(float)
+        self.correct(track_indices, centers[detection_indices], boxes[detection_indices, 2:], ages[detection_indices])
+
+        # Detection is authoritative on full frames: tracks it no longer sees are gone
+        seen = np.zeros(len(self), dtype=bool)
+        seen[track_indices] = True
+        self.keep(seen)
+        self.spawn(centers[unmatched], boxes[unmatched, 2:], detections.class_ids[unmatched], ages[unmatched])
+
+    def mark_missed(self, indices):
+        """Count a frame without a measurement; tracks missed too often are dropped"""
+        if len(indices) == 0:
+            return
+        self.misses[np.asarray(indices)] += 1
+        self.keep(self.misses <= self.max_misses)
+
+    def boxes(self):
+        """Current (x, y, w, h) boxes of every track as an (N, 4) int array"""
+        corners = np.rint(self.state[:, :2] - self.sizes / 2)
+        return np.hstack((corners, np.rint(self.sizes))).astype(np.int32)
+
+    def detections(self):
+        """Every track as Detections; confidence falls with each frame the track went unmeasured"""
+        confidence = 1.0 - self.misses / (self.max_misses + 1)
+        ages = self.last_timestamp - self.measured_at if self.last_timestamp is not None else 0.0
+        return Detections.from_boxes(self.boxes(), self.class_ids, confidence=confidence, track_ids=self.ids,
+                                     velocities=self.state[:, 2:], ages=ages)
+
+
+class TrackedDetector:
+    """Runs the full detectors every ``stride`` frames and tracks objects in between.
+
+    On full-detection frames the ScreenAnalyzer results update the enemy and
+    shard trackers. On the frames in between every track is predicted forward
+    and re-measured by searching only a small window around its predicted
+    box in the colour label image. If the windows would together cover more
+    than TRACKER_REFINE_MAX_AREA of the frame, full detection runs instead.
+    """
+
+    ENEMY_CLASSES = [f'enemy_{name}' for name in ENEMY_COLOR_RANGES]
+    SHARD_CLASSES = ['xp_gem']
+
+    def __init__(self, screen_analyzer, stride=FULL_DETECTION_STRIDE, refine_margin=TRACKER_REFINE_MARGIN,
+                 refine_max_area=TRACKER_REFINE_MAX_AREA):
+        self.screen_analyzer = screen_analyzer
+        self.stride = max(1, stride)
+        self.refine_margin = refine_margin
+        self.refine_max_area = refine_max_area
+        self.enemy_tracker = ObjectTracker()
+        self.shard_tracker = ObjectTracker()
+        self.frames_since_detection = None
+        self.full_detections = 0
+        self.tracked_frames = 0
+
+    def reset(self):
+        """Forget all tracks, e.g. after a level-up or any break in gameplay"""
+        self.enemy_tracker.clear()
+        self.shard_tracker.clear()
+        self.enemy_tracker.last_timestamp = self.shard_tracker.last_timestamp = None
+        self.frames_since_detection = None
+
+    def _refine_windows(self, tracker, frame_shape):
+        height, width = frame_shape
+        margin = self.refine_margin
+        windows = []
+        for x, y, w, h in tracker.boxes().tolist():
+            windows.append((max(0, x - margin), max(0, y - margin),
+                            min(width, x + w + margin), min(height, y + h + margin)))
+        return windows
+
+    def _refine(self, context, tracker, windows, class_names, min_area):
+        """Re-measure each predicted track inside its window; tracks not found count a miss"""
+        predicted = tracker.state[:, :2].tolist()
+        found, centers, sizes, missed = [], [], [], []
+        for i, (left, top, right, bottom) in enumerate(windows):
+            if right <= left or bottom <= top:
+                missed.append(i)
+                continue
+            mask = self.screen_analyzer.color_classifier.region_mask(context, class_names, left, top, right, bottom)
+            blobs = extract_blobs(mask, min_area, labels=context.scratch(mask.shape, np.int32))
+            if len(blobs.areas) == 0:
+                missed.append(i)
+                continue
+            offsets = blobs.centroids + (left, top) - predicted[i]
+            nearest = int(np.argmin((offsets * offsets).sum(axis=1)))
+            x, y, w, h = blobs.boxes[nearest].tolist()
+            found.append(i)
+            centers.append((left + x + w / 2, top + y + h / 2))
+            sizes.append((w, h))
+        tracker.correct(found, centers, sizes)
+        tracker.mark_missed(missed)
+
+    def _full_detection(self, context, timestamp):
+        player, enemies = self.screen_analyzer.analyze_screen(context, timestamp)
+        shards = self.screen_analyzer.detect_experience_shards(context)
+        self.enemy_tracker.update(enemies, timestamp)
+        self.shard_tracker.update(shards, timestamp)
+        self.frames_since_detection = 0
+        self.full_detections += 1
+        return player
+
+    def process(self, context, timestamp):
+        """Player, enemies and shards for one frame as a TrackedFrame"""
+        full = self.frames_since_detection is None or self.frames_since_detection + 1 >= self.stride
+        if not full:
+            for tracker in (self.enemy_tracker, self.shard_tracker):
+                tracker.predict(timestamp)
+            enemy_windows = self._refine_windows(self.enemy_tracker, context.shape)
+            shard_windows = self._refine_windows(self.shard_tracker, context.shape)
+            area = sum((r - l) * (b - t) for l, t, r, b in enemy_windows + shard_windows)
+            full = area > self.refine_max_area * context.shape[0] * context.shape[1]
+
+        if full:
+            player = self._full_detection(context, timestamp)
+        else:
+            player = self.screen_analyzer._detect_player(context)
+            self._refine(context, self.enemy_tracker, enemy_windows, self.ENEMY_CLASSES, MIN_CONTOUR_AREA)
+            self._refine(context, self.shard_tracker, shard_windows, self.SHARD_CLASSES, MIN_CONTOUR_AREA // 4)
+            self.frames_since_detection += 1
+            self.tracked_frames += 1
+
+        return TrackedFrame(player, self.enemy_tracker.detections(), self.shard_tracker.detections(), full)
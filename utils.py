@@ -4,6 +4,7 @@ import math
 import time
 import cv2
 import numpy as np
+from frame_context import FrameContext
 
 def calculate_distance(point1, point2):
     """Calculate Euclidean distance between two points"""
@@ -20,23 +21,25 @@ def is_point_in_circle(point, center, radius):
     """Check if a point is within a circular area"""
     return calculate_distance(point, center) <= radius
 
+def dark_pixel_fraction(gray, threshold=50, dst=None):
+    """Fraction of pixels in a grayscale image darker than threshold (dst: optional mask buffer)"""
+    dark_areas = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV, dst=dst)[1]
+    return cv2.countNonZero(dark_areas) / (gray.shape[0] * gray.shape[1])
+
 def detect_level_up_screen(image):
     """
     Detect if the level up screen is currently showing
+    Accepts a BGR image or a FrameContext (reuses its grayscale image)
     Returns True if level up screen is detected
     """
     # Convert to grayscale for easier detection
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Look for dark areas typical of level up overlay
-    dark_areas = cv2.threshold(gray, 50, 255, cv2.THRESH_BINARY)[1]
-    
-    # Count the number of dark pixels
-    dark_pixel_count = cv2.countNonZero(dark_areas)
-    total_pixels = gray.shape[0] * gray.shape[1]
+    if isinstance(image, FrameContext):
+        gray = image.gray
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # If more than 40% of screen is dark, likely a level up screen
-    return (dark_pixel_count / total_pixels) > 0.4
+    return dark_pixel_fraction(gray) > 0.4
 
 def wait_for_game_start(timeout=30):
     """